@@ -3,36 +3,78 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
+from flask import current_app, stream_template, stream_with_context, session, make_response
 from flask_moment import Moment
+from werkzeug.http import is_resource_modified
 from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
-import sys
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from search import NgramIndex, PrefixIndex
+from page_cache import PageCache
+from json_encoding import OrjsonProvider, dumps, iter_json_array
+import sql_stats
+import replicas
+import pubsub
+import booking
+import transactions
+import template_cache
+import log_queue
+import ical
+import formatting
+import os
+import sqlite3
 import datetime
+import itertools
+import functools
+import collections
+import time
+import click
+# forms (WTForms and its choice lists), dateutil, babel, Flask-Migrate/alembic,
+# the bulk loader and numpy (genre matching) are imported where they are used,
+# so that building the app in a fresh worker does not pay for them
+
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# extensions are bound to an app in create_app()
+moment = Moment()
+db = SQLAlchemy(session_options={'class_': replicas.RoutingSession})
+# the write handlers commit through unit_of_work.run(), which rolls back on
+# any failure and retries deadlocks; its retries are set in create_app()
+unit_of_work = transactions.UnitOfWork(db.session)
 
 # TODO: connect to a local postgresql database
 
+@db.event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+  # SQLite only enforces foreign keys (and ON DELETE CASCADE) when asked to
+  if isinstance(dbapi_connection, sqlite3.Connection):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+# Postgres stores genres as a native ARRAY; SQLite (local dev) falls back to JSON.
+GENRES_TYPE = postgresql.ARRAY(db.String).with_variant(db.JSON, 'sqlite')
+
+def utcnow():
+  # naive UTC, like CURRENT_TIMESTAMP on SQLite and now() on a UTC Postgres
+  return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -44,17 +86,30 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GENRES_TYPE)
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
-    #past_shows
-    #upcoming_shows
-    #past_shows_count
-    #upcoming_shows_count
+    # maintained by create/delete show handlers, see refresh_upcoming_counts()
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+    # set whenever a show is added to or removed from the venue, see
+    # touch_calendars(); validates the venue's calendar feed
+    shows_changed_at = db.Column(db.DateTime, nullable=False, default=utcnow,
+                                 server_default=db.func.now())
+    # set by every UPDATE of the row (onupdate), bulk ones included, except
+    # the counter and calendar UPDATEs, which keep it; with shows_changed_at
+    # it validates the venue page, see page_validators()
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow,
+                           onupdate=utcnow, server_default=db.func.now())
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -66,20 +121,68 @@ class Artist(db.Model):
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
     seeking_venues = db.Column(db.Boolean, nullable=False, default=False)
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GENRES_TYPE)
+    # see Venue.shows_changed_at and Venue.updated_at
+    shows_changed_at = db.Column(db.DateTime, nullable=False, default=utcnow,
+                                 server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow,
+                           onupdate=utcnow, server_default=db.func.now())
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        # serves /shows keyset pagination and every upcoming-only range scan;
+        # the included columns let the per-venue/artist upcoming counts be
+        # answered from the index alone
+        db.Index('ix_show_upcoming', 'start_time', 'id',
+                 postgresql_include=['venue_id', 'artist_id']),
+        # a venue's or artist's shows, optionally limited to a time range
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        # no two shows at a venue may overlap (needs btree_gist); other
+        # databases rely on the in-process check in create_show_submission
+        ExcludeConstraint(
+            ('venue_id', '='),
+            (db.text("tsrange(start_time, start_time + duration_minutes * interval '1 minute')"), '&&'),
+            name='ex_show_venue_overlap', using='gist').ddl_if(dialect='postgresql'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-    artist = db.relationship('Artist', backref=db.backref('shows', cascade="all,delete"))
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    venue = db.relationship('Venue', backref=db.backref('shows', cascade="all,delete"))
+    # the show occupies its venue for [start_time, end_time)
+    duration_minutes = db.Column(db.Integer, nullable=False,
+                                 default=booking.DEFAULT_SHOW_MINUTES,
+                                 server_default=str(booking.DEFAULT_SHOW_MINUTES))
+    # shows are removed by ON DELETE CASCADE in the database, never loaded
+    # into the session just to be deleted (passive_deletes)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'),
+                          nullable=False)
+    artist = db.relationship('Artist', backref=db.backref('shows',
+                             cascade="all,delete", passive_deletes=True))
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'),
+                         nullable=False)
+    venue = db.relationship('Venue', backref=db.backref('shows',
+                            cascade="all,delete", passive_deletes=True))
+    # a change to a show must also touch_calendars() its venue and artist,
+    # whose pages list it
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow,
+                           onupdate=utcnow, server_default=db.func.now())
+
+    @property
+    def end_time(self):
+        return booking.show_end(self.start_time, self.duration_minutes)
     
 
 
+class GenreFacet(db.Model):
+    __tablename__ = 'GenreFacet'
+
+    # number of venues/artists listing each genre, maintained by the write
+    # handlers so facet counts never scan the genres arrays
+    kind = db.Column(db.String(20), primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
 #----------------------------------------------------------------------------#
@@ -87,590 +190,1693 @@ class Show(db.Model):
 #----------------------------------------------------------------------------#
 
 def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
-
-app.jinja_env.filters['datetime'] = format_datetime
-
-#----------------------------------------------------------------------------#
-# Controllers.
-#----------------------------------------------------------------------------#
-
-@app.route('/')
-def index():
-  return render_template('pages/home.html')
-
-
-#  Venues
-#  ----------------------------------------------------------------
-
-@app.route('/venues')
-def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  # data=[{
-  #   "city": "San Francisco",
-  #   "state": "CA",
-  #   "venues": [{
-  #     "id": 1,
-  #     "name": "The Musical Hop",
-  #     "num_upcoming_shows": 0,
-  #   }, {
-  #     "id": 3,
-  #     "name": "Park Square Live Music & Coffee",
-  #     "num_upcoming_shows": 1,
-  #   }]
-  # }, {
-  #   "city": "New York",
-  #   "state": "NY",
-  #   "venues": [{
-  #     "id": 2,
-  #     "name": "The Dueling Pianos Bar",
-  #     "num_upcoming_shows": 0,
-  #   }]
-  # }]
-
-  venue_query = Venue.query.all()
-  data_step1 = {}
-  for v in venue_query:
-    citystate = "{}_{}".format(v.city, v.state)
-    if citystate not in data_step1:
-      data_step1[citystate] = {"city": v.city, "state": v.state,
-        "venues" : []}
-    coming_shows = Show.query.filter(
-      Show.venue_id == v.id,
-      Show.start_time > datetime.datetime.now()).count()
-    venue_dict = {"id": v.id, "name": v.name, "num_upcoming_shows": coming_shows}
-    data_step1[citystate]['venues'].append(venue_dict) 
-  data = [data_step1[citystate] for citystate in data_step1]
-
-  return render_template('pages/venues.html', areas=data)
-
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for Hop should return "The Musical Hop".
-  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  # response={
-  #   "count": 1,
-  #   "data": [{
-  #     "id": 2,
-  #     "name": "The Dueling Pianos Bar",
-  #     "num_upcoming_shows": 0,
-  #   }]
-  # }
-  search_term = request.form.get('search_term')
-  venues = Venue.query.filter(Venue.name.ilike('%{}%'.format(search_term)))
+  return formatting.format_datetime(value, format,
+                                    locale=current_app.config['DATETIME_LOCALE'],
+                                    timezone=current_app.config['DATETIME_TIMEZONE'])
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue.upcoming_shows_count is bumped as shows are created and deleted, so
+# listing pages never have to count shows per venue. Shows also drop out of
+# the "upcoming" window as time passes; whenever shows have started since the
+# last refresh, the counters of just their venues are re-derived with a single
+# grouped UPDATE. Re-deriving rather than decrementing keeps the refresh
+# idempotent, so workers refreshing the same window cannot count a show twice.
+_counts_refreshed_at = None
+
+def bump_upcoming_count(venue_id, start_times, delta):
+  """Adds delta to the venue's counter for each upcoming one of start_times."""
+  # the same UPDATE marks the venue's calendar feed changed, upcoming or not
+  values = {Venue.shows_changed_at: utcnow(), Venue.updated_at: Venue.updated_at}
   now = datetime.datetime.now()
-  data = [{
-    "id": v.id, "name": v.name, 
-    "num_upcoming_shows": Show.query.filter(Show.venue_id == v.id,
-                          Show.start_time > now).count()
-  } for v in venues]
-  response = {"count": len(data), "data": data}
-  
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # shows the venue page with the given venue_id
-  # data1={
-  #   "id": 1,
-  #   "name": "The Musical Hop",
-  #   "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
-  #   "address": "1015 Folsom Street",
-  #   "city": "San Francisco",
-  #   "state": "CA",
-  #   "phone": "123-123-1234",
-  #   "website": "https://www.themusicalhop.com",
-  #   "facebook_link": "https://www.facebook.com/TheMusicalHop",
-  #   "seeking_talent": True,
-  #   "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
-  #   "image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60",
-  #   "past_shows": [{
-  #     "artist_id": 4,
-  #     "artist_name": "Guns N Petals",
-  #     "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
-  #     "start_time": "2019-05-21T21:30:00.000Z"
-  #   }],
-  #   "upcoming_shows": [],
-  #   "past_shows_count": 1,
-  #   "upcoming_shows_count": 0,
-  # }
-  # data2={
-  #   "id": 2,
-  #   "name": "The Dueling Pianos Bar",
-  #   "genres": ["Classical", "R&B", "Hip-Hop"],
-  #   "address": "335 Delancey Street",
-  #   "city": "New York",
-  #   "state": "NY",
-  #   "phone": "914-003-1132",
-  #   "website": "https://www.theduelingpianos.com",
-  #   "facebook_link": "https://www.facebook.com/theduelingpianos",
-  #   "seeking_talent": False,
-  #   "image_link": "https://images.unsplash.com/photo-1497032205916-ac775f0649ae?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=750&q=80",
-  #   "past_shows": [],
-  #   "upcoming_shows": [],
-  #   "past_shows_count": 0,
-  #   "upcoming_shows_count": 0,
-  # }
-  # data3={
-  #   "id": 3,
-  #   "name": "Park Square Live Music & Coffee",
-  #   "genres": ["Rock n Roll", "Jazz", "Classical", "Folk"],
-  #   "address": "34 Whiskey Moore Ave",
-  #   "city": "San Francisco",
-  #   "state": "CA",
-  #   "phone": "415-000-1234",
-  #   "website": "https://www.parksquarelivemusicandcoffee.com",
-  #   "facebook_link": "https://www.facebook.com/ParkSquareLiveMusicAndCoffee",
-  #   "seeking_talent": False,
-  #   "image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-  #   "past_shows": [{
-  #     "artist_id": 5,
-  #     "artist_name": "Matt Quevedo",
-  #     "artist_image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
-  #     "start_time": "2019-06-15T23:00:00.000Z"
-  #   }],
-  #   "upcoming_shows": [{
-  #     "artist_id": 6,
-  #     "artist_name": "The Wild Sax Band",
-  #     "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-  #     "start_time": "2035-04-01T20:00:00.000Z"
-  #   }, {
-  #     "artist_id": 6,
-  #     "artist_name": "The Wild Sax Band",
-  #     "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-  #     "start_time": "2035-04-08T20:00:00.000Z"
-  #   }, {
-  #     "artist_id": 6,
-  #     "artist_name": "The Wild Sax Band",
-  #     "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-  #     "start_time": "2035-04-15T20:00:00.000Z"
-  #   }],
-  #   "past_shows_count": 1,
-  #   "upcoming_shows_count": 1,
-  # }
-  # data = list(filter(lambda d: d['id'] == venue_id, [data1, data2, data3]))[0]
-
-  v = Venue.query.get(venue_id)
-  data = {'id': v.id, 'name': v.name, 'genres': v.genres,'city': v.city,
-    'state': v.state, 'address': v.address, 'phone': v.phone,
-    'seeking_venues': v.seeking_talent, 'facebook_link': v.facebook_link,
-    'image_link': v.image_link
-  }
-  past_shows = Show.query.filter(Show.venue_id == data['id'],
-      Show.start_time < datetime.datetime.now()).\
-        join(Artist, Show.artist_id == Artist.id).\
-        order_by(db.desc(Show.start_time))
-  data['past_shows'] = [{"artist_id" : ps.artist_id,
-    "artist_name": ps.artist.name, 
-    "artist_image_link": ps.artist.image_link,
-    "start_time": str(ps.start_time)} for ps in past_shows]
-  data["past_shows_count"] = len(data['past_shows'])
-
-  upcoming_shows = Show.query.filter(Show.venue_id == data['id'],
-      Show.start_time >= datetime.datetime.now()).\
-        join(Artist, Show.artist_id == Artist.id).\
-        order_by(Show.start_time)
-  data['upcoming_shows'] = [{"artist_id" : ps.artist_id,
-    "artist_name": ps.artist.name, 
-    "artist_image_link": ps.artist.image_link,
-    "start_time": str(ps.start_time)} for ps in upcoming_shows]
-  data["upcoming_shows_count"] = len(data['upcoming_shows'])
-  
-  return render_template('pages/show_venue.html', venue=data)
-
-#  Create Venue
-#  ----------------------------------------------------------------
-
-@app.route('/venues/create', methods=['GET'])
-def create_venue_form():
-  form = VenueForm()
-  return render_template('forms/new_venue.html', form=form)
-
-@app.route('/venues/create', methods=['POST'])
-def create_venue_submission():
-  vform = request.form
-  
-  try:
-    venue = Venue(
-      name = vform['name'],
-      city = vform['city'],
-      state = vform['state'],
-      address = vform['address'],
-      genres = vform.getlist('genres'),
-      phone = vform['phone'],
-      facebook_link = vform['facebook_link'],
-      image_link = vform['image_link']
-    )
-    db.session.add(venue)
-    db.session.commit()
-    flash('Venue ' + vform['name'] + ' was successfully listed!')
-  except:
-    e = sys.exc_info()
-    print('Error: {}'.format(e))
-    flash('An error occurred. Venue ' + vform['name'] + ' could not be listed.')
-    
-  return render_template('pages/home.html')
-
-@app.route('/venues/<venue_id>', methods=['DELETE'])
-def delete_venue(venue_id):
-  # TODO: Complete this endpoint for taking a venue_id, and using
-  # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
-
-  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-  # clicking that button delete it from the db then redirect the user to the homepage
-  return None
-
-#  Artists
-#  ----------------------------------------------------------------
-@app.route('/artists')
-def artists():
-  # TODO: replace with real data returned from querying the database
-  # data=[{
-  #   "id": 4,
-  #   "name": "Guns N Petals",
-  # }, {
-  #   "id": 5,
-  #   "name": "Matt Quevedo",
-  # }, {
-  #   "id": 6,
-  #   "name": "The Wild Sax Band",
-  # }]
-
-  artist_query = Artist.query.all()
-
-  data = [{'id': a.id, 'name': a.name} for a in artist_query]
-
-  return render_template('pages/artists.html', artists=data)
-
-@app.route('/artists/search', methods=['POST'])
-def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-  # search for "band" should return "The Wild Sax Band".
-  # response={
-  #   "count": 1,
-  #   "data": [{
-  #     "id": 4,
-  #     "name": "Guns N Petals",
-  #     "num_upcoming_shows": 0,
-  #   }]
-  # }
-
-  search_term = request.form.get('search_term')
-  artists = Artist.query.filter(Artist.name.ilike('%{}%'.format(search_term)))
+  upcoming = sum(1 for start_time in start_times if start_time > now)
+  if upcoming:
+    values[Venue.upcoming_shows_count] = Venue.upcoming_shows_count + upcoming * delta
+  Venue.query.filter(Venue.id == venue_id).update(values, synchronize_session=False)
+
+def release_artist_upcoming_counts(artist_id):
+  """Takes an artist's upcoming shows off their venues' counters."""
   now = datetime.datetime.now()
-  data = [{
-    "id": a.id, "name": a.name, 
-    "num_upcoming_shows": Show.query.filter(Show.artist_id == a.id,
-                          Show.start_time > now).count()
-  } for a in artists]
-  response = {"count": len(data), "data": data}
-  
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-
-  # data1={
-  #   "id": 4,
-  #   "name": "Guns N Petals",
-  #   "genres": ["Rock n Roll"],
-  #   "city": "San Francisco",
-  #   "state": "CA",
-  #   "phone": "326-123-5000",
-  #   "website": "https://www.gunsnpetalsband.com",
-  #   "facebook_link": "https://www.facebook.com/GunsNPetals",
-  #   "seeking_venue": True,
-  #   "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
-  #   "image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
-  #   "past_shows": [{
-  #     "venue_id": 1,
-  #     "venue_name": "The Musical Hop",
-  #     "venue_image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60",
-  #     "start_time": "2019-05-21T21:30:00.000Z"
-  #   }],
-  #   "upcoming_shows": [],
-  #   "past_shows_count": 1,
-  #   "upcoming_shows_count": 0,
-  # }
-  # data2={
-  #   "id": 5,
-  #   "name": "Matt Quevedo",
-  #   "genres": ["Jazz"],
-  #   "city": "New York",
-  #   "state": "NY",
-  #   "phone": "300-400-5000",
-  #   "facebook_link": "https://www.facebook.com/mattquevedo923251523",
-  #   "seeking_venue": False,
-  #   "image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
-  #   "past_shows": [{
-  #     "venue_id": 3,
-  #     "venue_name": "Park Square Live Music & Coffee",
-  #     "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-  #     "start_time": "2019-06-15T23:00:00.000Z"
-  #   }],
-  #   "upcoming_shows": [],
-  #   "past_shows_count": 1,
-  #   "upcoming_shows_count": 0,
-  # }
-  # data3={
-  #   "id": 6,
-  #   "name": "The Wild Sax Band",
-  #   "genres": ["Jazz", "Classical"],
-  #   "city": "San Francisco",
-  #   "state": "CA",
-  #   "phone": "432-325-5432",
-  #   "seeking_venue": False,
-  #   "image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-  #   "past_shows": [],
-  #   "upcoming_shows": [{
-  #     "venue_id": 3,
-  #     "venue_name": "Park Square Live Music & Coffee",
-  #     "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-  #     "start_time": "2035-04-01T20:00:00.000Z"
-  #   }, {
-  #     "venue_id": 3,
-  #     "venue_name": "Park Square Live Music & Coffee",
-  #     "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-  #     "start_time": "2035-04-08T20:00:00.000Z"
-  #   }, {
-  #     "venue_id": 3,
-  #     "venue_name": "Park Square Live Music & Coffee",
-  #     "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
-  #     "start_time": "2035-04-15T20:00:00.000Z"
-  #   }],
-  #   "past_shows_count": 0,
-  #   "upcoming_shows_count": 3,
-  # }
-  #data = list(filter(lambda d: d['id'] == artist_id, [data1, data2, data3]))[0]
-  a = Artist.query.get(artist_id)
-  data = {'id': a.id, 'name': a.name, 'genres': a.genres,'city': a.city,
-    'state': a.state, 'phone': a.phone, 'seeking_venues': a.seeking_venues,
-    'facebook_link': a.facebook_link, 'image_link': a.image_link
-  }
-  
-  past_shows = Show.query.filter(Show.artist_id == data['id'],
-      Show.start_time < datetime.datetime.now()).\
-        join(Venue, Show.venue_id == Venue.id).\
-        order_by(db.desc(Show.start_time))
-  data['past_shows'] = [{"venue_id" : ps.venue_id,
-    "venue_name": ps.venue.name, 
-    "venue_image_link": ps.venue.image_link,
-    "start_time": str(ps.start_time)} for ps in past_shows]
-  data["past_shows_count"] = len(data['past_shows'])
-
-  upcoming_shows = Show.query.filter(Show.artist_id == data['id'],
-      Show.start_time >= datetime.datetime.now()).\
-        join(Venue, Show.venue_id == Venue.id).\
-        order_by(Show.start_time)
-  data['upcoming_shows'] = [{"venue_id" : ps.venue_id,
-    "venue_name": ps.venue.name, 
-    "venue_image_link": ps.venue.image_link,
-    "start_time": str(ps.start_time)} for ps in upcoming_shows]
-  data["upcoming_shows_count"] = len(data['upcoming_shows'])
-  
-  return render_template('pages/show_artist.html', artist=data)
-
-#  Update
-#  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
-def edit_artist(artist_id):
-  form = ArtistForm()
-  artist={
-    "id": 4,
-    "name": "Guns N Petals",
-    "genres": ["Rock n Roll"],
-    "city": "San Francisco",
-    "state": "CA",
-    "phone": "326-123-5000",
-    "website": "https://www.gunsnpetalsband.com",
-    "facebook_link": "https://www.facebook.com/GunsNPetals",
-    "seeking_venue": True,
-    "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
-    "image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80"
-  }
-  # TODO: populate form with fields from artist with ID <artist_id>
-  return render_template('forms/edit_artist.html', form=form, artist=artist)
-
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
-def edit_artist_submission(artist_id):
-  # TODO: take values from the form submitted, and update existing
-  # artist record with ID <artist_id> using the new attributes
-
-  return redirect(url_for('show_artist', artist_id=artist_id))
-
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
-def edit_venue(venue_id):
-  form = VenueForm()
-  venue={
-    "id": 1,
-    "name": "The Musical Hop",
-    "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
-    "address": "1015 Folsom Street",
-    "city": "San Francisco",
-    "state": "CA",
-    "phone": "123-123-1234",
-    "website": "https://www.themusicalhop.com",
-    "facebook_link": "https://www.facebook.com/TheMusicalHop",
-    "seeking_talent": True,
-    "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
-    "image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60"
-  }
-  # TODO: populate form with values from venue with ID <venue_id>
-  return render_template('forms/edit_venue.html', form=form, venue=venue)
-
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
-def edit_venue_submission(venue_id):
-  # TODO: take values from the form submitted, and update existing
-  # venue record with ID <venue_id> using the new attributes
-  return redirect(url_for('show_venue', venue_id=venue_id))
-
-#  Create Artist
-#  ----------------------------------------------------------------
-
-@app.route('/artists/create', methods=['GET'])
-def create_artist_form():
-  form = ArtistForm()
-  return render_template('forms/new_artist.html', form=form)
-
-@app.route('/artists/create', methods=['POST'])
-def create_artist_submission():
-  # called upon submitting the new artist listing form
-
-  aform = request.form
-
-  try: 
-    artist = Artist(
-      name = aform['name'],
-      city = aform['city'],
-      state = aform['state'],
-      genres = aform.getlist('genres'),
-      phone = aform['phone'],
-      facebook_link = aform['facebook_link'],
-      image_link = aform['image_link']
-    )
-    db.session.add(artist)
-    db.session.commit()
-    # on successful db insert, flash success
-    flash('Artist ' + aform['name'] + ' was successfully listed!')
-  except:
-    e = sys.exc_info()
-    print('Error: {}'.format(e))
-    flash('An error occurred. Artist ' + aform['name'] + ' could not be listed.')
-  return render_template('pages/home.html')
-
-
-#  Shows
-#  ----------------------------------------------------------------
-
-@app.route('/shows')
-def shows():
-  #displays list of shows at /shows
-  # data=[{
-  #   "venue_id": 1,
-  #   "venue_name": "The Musical Hop",
-  #   "artist_id": 4,
-  #   "artist_name": "Guns N Petals",
-  #   "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
-  #   "start_time": "2019-05-21T21:30:00.000Z"
-  # }, {
-  #   "venue_id": 3,
-  #   "venue_name": "Park Square Live Music & Coffee",
-  #   "artist_id": 5,
-  #   "artist_name": "Matt Quevedo",
-  #   "artist_image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
-  #   "start_time": "2019-06-15T23:00:00.000Z"
-  # }, {
-  #   "venue_id": 3,
-  #   "venue_name": "Park Square Live Music & Coffee",
-  #   "artist_id": 6,
-  #   "artist_name": "The Wild Sax Band",
-  #   "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-  #   "start_time": "2035-04-01T20:00:00.000Z"
-  # }, {
-  #   "venue_id": 3,
-  #   "venue_name": "Park Square Live Music & Coffee",
-  #   "artist_id": 6,
-  #   "artist_name": "The Wild Sax Band",
-  #   "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-  #   "start_time": "2035-04-08T20:00:00.000Z"
-  # }, {
-  #   "venue_id": 3,
-  #   "venue_name": "Park Square Live Music & Coffee",
-  #   "artist_id": 6,
-  #   "artist_name": "The Wild Sax Band",
-  #   "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
-  #   "start_time": "2035-04-15T20:00:00.000Z"
-  # }]
-
-  shows = Show.query.join(Venue, Show.venue_id == Venue.id).\
+  booked = db.session.query(db.func.count(Show.id)).\
+    filter(Show.venue_id == Venue.id, Show.artist_id == artist_id,
+           Show.start_time > now).\
+    correlate(Venue).scalar_subquery()
+  venue_ids = db.session.query(Show.venue_id).\
+    filter(Show.artist_id == artist_id, Show.start_time > now)
+  Venue.query.filter(Venue.id.in_(venue_ids.scalar_subquery())).update(
+    {Venue.upcoming_shows_count: Venue.upcoming_shows_count - booked,
+     Venue.updated_at: Venue.updated_at},
+    synchronize_session=False)
+
+def refresh_upcoming_counts(now=None, since=None):
+  """Re-derives the counters of the venues with a show that started in
+  (since, now], or of every venue without since."""
+  global _counts_refreshed_at
+  now = now or datetime.datetime.now()
+  upcoming = db.session.query(db.func.count(Show.id)).\
+    filter(Show.venue_id == Venue.id, Show.start_time > now).\
+    correlate(Venue).scalar_subquery()
+  venues = Venue.query
+  if since is not None:
+    started = db.session.query(Show.venue_id).\
+      filter(Show.start_time > since, Show.start_time <= now)
+    venues = venues.filter(Venue.id.in_(started.scalar_subquery()))
+  # the counter is not on the venue page; keeping updated_at keeps the
+  # pages' validators
+  venues.update({Venue.upcoming_shows_count: upcoming,
+                 Venue.updated_at: Venue.updated_at},
+                synchronize_session=False)
+  db.session.commit()
+  _counts_refreshed_at = now
+
+def refresh_upcoming_counts_if_stale():
+  now = datetime.datetime.now()
+  since = _counts_refreshed_at
+  if since is not None:
+    started = db.session.query(Show.id).filter(
+      Show.start_time > since, Show.start_time <= now).first()
+    if started is None:
+      return
+  refresh_upcoming_counts(now, since)
+
+def upcoming_counts_by_artist(artist_ids):
+  if not artist_ids:
+    return {}
+  counts = db.session.query(Show.artist_id, db.func.count(Show.id)).\
+    filter(Show.artist_id.in_(artist_ids),
+           Show.start_time > datetime.datetime.now()).\
+    group_by(Show.artist_id)
+  return dict(counts)
+
+#----------------------------------------------------------------------------#
+# Detail loaders.
+#----------------------------------------------------------------------------#
+
+def load_with_shows(model, entity_id, counterpart):
+  """Loads a venue/artist, its shows and each show's counterpart in one query."""
+  return model.query.\
+    options(db.joinedload(model.shows).joinedload(counterpart)).\
+    filter(model.id == entity_id).\
+    one_or_none()
+
+def split_shows(shows, now):
+  """Returns (past shows newest first, upcoming shows soonest first)."""
+  past, upcoming = [], []
+  for show in sorted(shows, key=lambda s: (s.start_time, s.id)):
+    (upcoming if show.start_time >= now else past).append(show)
+  past.reverse()
+  return past, upcoming
+
+# the Show column pointing at the entity of a venue or artist page
+SHOW_OWNER_COLUMNS = {Venue: Show.venue_id, Artist: Show.artist_id}
+
+def page_validators(entity_id, updated_at, shows_changed_at, last_started):
+  """Returns the (etag, last_modified) of a venue/artist page.
+
+  The page changes with the row (updated_at), with its list of shows
+  (shows_changed_at), and whenever one of its shows starts and moves from
+  upcoming to past (last_started, the latest start before now), so the
+  validator is the latest of the three.
+  """
+  stamps = [updated_at, shows_changed_at]
+  if last_started is not None:
+    # show times are local, like datetime.now(); the row's stamps are UTC
+    stamps.append(last_started.astimezone(datetime.timezone.utc).replace(tzinfo=None))
+  changed_at = max(stamps)
+  etag = '{}-{}-{}'.format(request.endpoint, entity_id,
+                           changed_at.strftime('%Y%m%d%H%M%S%f'))
+  return etag, changed_at
+
+def last_modified_dates(changed_at):
+  """Returns (Last-Modified to send, date If-Modified-Since must reach) for
+  a change at changed_at, naive UTC.
+
+  HTTP dates have whole seconds. A client's copy only counts as current if
+  its date is at least changed_at rounded up, so a change made later in the
+  same second as the copy is not missed. The rounded-up date is sent once
+  that second is over, when nothing can change within it any more (and it
+  is no longer in the future); until then the date is rounded down.
+  """
+  floor = changed_at.replace(microsecond=0)
+  ceiling = floor + datetime.timedelta(seconds=1) if changed_at.microsecond else floor
+  return (ceiling if ceiling <= utcnow() else floor), ceiling
+
+def is_modified(etag, changed_at):
+  """False if the request's If-None-Match (which takes precedence) or
+  If-Modified-Since shows the client's copy is current."""
+  return is_resource_modified(request.environ, etag=etag,
+                              last_modified=last_modified_dates(changed_at)[1])
+
+def set_validators(response, validators):
+  response.set_etag(validators[0])
+  response.last_modified = last_modified_dates(validators[1])[0]
+  # browsers revalidate on every visit instead of guessing a lifetime
+  response.headers['Cache-Control'] = 'no-cache'
+  return response
+
+def not_modified(model, entity_id, now):
+  """Returns a 304 response if the client's copy of the page is current.
+
+  Only conditional requests pay for the check: one statement, a primary key
+  lookup plus one seek of the (venue_id/artist_id, start_time) index.
+  """
+  # a flashed message waiting to be shown is part of the page
+  if '_flashes' in session or not (
+      'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers):
+    return None
+  last_started = db.session.query(db.func.max(Show.start_time)).\
+    filter(SHOW_OWNER_COLUMNS[model] == model.id, Show.start_time < now).\
+    correlate(model).scalar_subquery()
+  row = db.session.query(model.updated_at, model.shows_changed_at, last_started).\
+    filter(model.id == entity_id).one_or_none()
+  if row is None:
+    return None
+  validators = page_validators(entity_id, *row)
+  if is_modified(*validators):
+    return None
+  return set_validators(Response(status=304), validators)
+
+def page_response(html, entity, past_shows):
+  """The rendered page of a venue/artist, with its validators."""
+  validators = page_validators(
+    entity.id, entity.updated_at, entity.shows_changed_at,
+    past_shows[0].start_time if past_shows else None)
+  return set_validators(make_response(html), validators)
+
+#----------------------------------------------------------------------------#
+# Show listing.
+#----------------------------------------------------------------------------#
+
+def stream_rows(query, batch_size):
+  """Yields query's rows batch_size at a time, for a streamed response body.
+
+  The view's session is removed as soon as the view returns, before the body
+  is iterated; a query still holding that session would reopen it and keep a
+  pooled connection until garbage collection. The rows are read through the
+  streaming context's own session instead, which is removed when the stream
+  ends.
+  """
+  yield from query.with_session(db.session()).yield_per(batch_size)
+
+def show_row(s):
+  return {"venue_id": s.venue_id, "venue_name": s.venue_name,
+          "artist_id": s.artist_id, "artist_name": s.artist_name,
+          "artist_image_link": s.artist_image_link,
+          "start_time" : s.start_time}
+
+def encode_show_cursor(show):
+  return '{}_{}'.format(show.start_time.isoformat(), show.id)
+
+def decode_show_cursor(cursor):
+  start_time, _, show_id = cursor.rpartition('_')
+  return datetime.datetime.fromisoformat(start_time), int(show_id)
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Postgres serves name searches from the pg_trgm GIN indexes declared on the
+# models. Other databases (SQLite in local dev) use an in-process n-gram index
+# per model, built on first search and kept current by the write handlers.
+# Names written by other workers show up once the index is rebuilt, after
+# SEARCH_INDEX_MAX_AGE seconds.
+_name_indexes = {}   # model -> (built at, NgramIndex)
+
+def name_index(model):
+  entry = _name_indexes.get(model)
+  now = time.monotonic()
+  if entry is None or now - entry[0] > current_app.config['SEARCH_INDEX_MAX_AGE']:
+    index = NgramIndex()
+    for doc_id, name in db.session.query(model.id, model.name):
+      index.add(doc_id, name)
+    entry = _name_indexes[model] = (now, index)
+  return entry[1]
+
+def index_name(model, doc_id, name):
+  entry = _name_indexes.get(model)
+  if entry is not None:
+    entry[1].add(doc_id, name)
+  if _autocomplete is not None:
+    _autocomplete.add(autocomplete_entry(model, doc_id), name)
+
+def unindex_name(model, doc_id):
+  entry = _name_indexes.get(model)
+  if entry is not None:
+    entry[1].remove(doc_id)
+  if _autocomplete is not None:
+    _autocomplete.remove(autocomplete_entry(model, doc_id))
+    # the deleted row's shows no longer count for its counterparts
+    expire_autocomplete_scores()
+
+def search_names(model, term, page, per_page):
+  """Returns (total hits, ids on the requested page), best matches first."""
+  term = (term or '').strip()
+  offset = (max(page, 1) - 1) * per_page
+  if db.engine.dialect.name != 'postgresql':
+    hits = name_index(model).search(term)
+    return len(hits), hits[offset:offset + per_page]
+
+  pattern = '%{}%'.format(
+    term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+  matches = db.session.query(model.id).\
+    filter(model.name.ilike(pattern, escape='\\'))
+  total = matches.count()
+  page_ids = matches.\
+    order_by(db.func.similarity(model.name, term).desc(), model.name, model.id).\
+    limit(per_page).offset(offset)
+  return total, [row.id for row in page_ids]
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# /autocomplete serves venue and artist name completions from an in-memory
+# prefix index ranked by upcoming shows. It is built on first use per worker
+# and kept current by the write handlers. Ranks go stale as shows start, so
+# the index remembers when the next show starts and re-reads every score
+# then; until that moment a lookup does not touch the database. Names added
+# or deleted by other workers only show up when the index is rebuilt, every
+# AUTOCOMPLETE_MAX_AGE seconds.
+_autocomplete = None
+_autocomplete_built_at = None
+_autocomplete_expires_at = None
+
+def autocomplete_entry(model, doc_id):
+  return (model.__name__.lower(), doc_id)
+
+def autocomplete_rows():
+  """Yields (entry, name, upcoming shows) for every venue and artist."""
+  refresh_upcoming_counts_if_stale()
+  for v in db.session.query(Venue.id, Venue.name, Venue.upcoming_shows_count):
+    yield autocomplete_entry(Venue, v.id), v.name, v.upcoming_shows_count
+  upcoming = dict(db.session.query(Show.artist_id, db.func.count(Show.id)).\
+    filter(Show.start_time > datetime.datetime.now()).\
+    group_by(Show.artist_id))
+  for a in db.session.query(Artist.id, Artist.name):
+    yield autocomplete_entry(Artist, a.id), a.name, upcoming.get(a.id, 0)
+
+def autocomplete_index():
+  global _autocomplete, _autocomplete_built_at, _autocomplete_expires_at
+  now = datetime.datetime.now()
+  if (_autocomplete is None or time.monotonic() - _autocomplete_built_at >
+      current_app.config['AUTOCOMPLETE_MAX_AGE']):
+    index = PrefixIndex(k=current_app.config['AUTOCOMPLETE_MAX_RESULTS'])
+    _autocomplete_built_at = time.monotonic()
+    for entry, name, score in autocomplete_rows():
+      index.add(entry, name, score)
+    _autocomplete = index
+  elif _autocomplete_expires_at is not None and _autocomplete_expires_at <= now:
+    for entry, name, score in autocomplete_rows():
+      _autocomplete.set_score(entry, score)
+  else:
+    return _autocomplete
+  _autocomplete_expires_at = db.session.query(db.func.min(Show.start_time)).\
+    filter(Show.start_time > now).scalar()
+  return _autocomplete
+
+def expire_autocomplete_scores():
+  global _autocomplete_expires_at
+  _autocomplete_expires_at = datetime.datetime.now()
+
+def drop_autocomplete_index():
+  global _autocomplete
+  _autocomplete = None
+
+def bump_autocomplete_scores(venue_id, artist_id, start_time, delta):
+  """Moves a show's venue and artist up (or down) the completions."""
+  global _autocomplete_expires_at
+  if _autocomplete is None or start_time <= datetime.datetime.now():
+    return
+  _autocomplete.bump_score(autocomplete_entry(Venue, venue_id), delta)
+  _autocomplete.bump_score(autocomplete_entry(Artist, artist_id), delta)
+  if delta > 0 and (_autocomplete_expires_at is None or
+                    start_time < _autocomplete_expires_at):
+    _autocomplete_expires_at = start_time
+
+#----------------------------------------------------------------------------#
+# Genre facets.
+#----------------------------------------------------------------------------#
+
+FACET_KINDS = {Venue: 'venue', Artist: 'artist'}
+
+def genres_filter(model, genres):
+  """Matches rows listing every one of genres."""
+  if db.engine.dialect.name == 'postgresql':
+    # array containment (@>), answered from the GIN index on genres
+    return model.genres.contains(genres)
+  clauses = []
+  for genre in genres:
+    listed = db.func.json_each(model.genres).table_valued('value')
+    clauses.append(db.exists().where(listed.c.value == genre))
+  return db.and_(*clauses)
+
+def bump_genre_facets(model, genres, delta):
+  kind = FACET_KINDS[model]
+  for genre in set(genres or ()):
+    updated = GenreFacet.query.\
+      filter(GenreFacet.kind == kind, GenreFacet.genre == genre).\
+      update({GenreFacet.count: GenreFacet.count + delta},
+             synchronize_session=False)
+    if not updated and delta > 0:
+      try:
+        with unit_of_work.savepoint():
+          db.session.add(GenreFacet(kind=kind, genre=genre, count=delta))
+      except IntegrityError:
+        # a concurrent writer added the genre first; only the savepoint is lost
+        GenreFacet.query.\
+          filter(GenreFacet.kind == kind, GenreFacet.genre == genre).\
+          update({GenreFacet.count: GenreFacet.count + delta},
+                 synchronize_session=False)
+
+def rebuild_genre_facets(model):
+  kind = FACET_KINDS[model]
+  counts = collections.Counter()
+  for (genres,) in db.session.query(model.genres).yield_per(5000):
+    counts.update(set(genres or ()))
+  GenreFacet.query.filter(GenreFacet.kind == kind).delete()
+  db.session.add_all(GenreFacet(kind=kind, genre=genre, count=count)
+                     for genre, count in counts.items())
+  db.session.commit()
+
+def genre_facets(model):
+  return GenreFacet.query.\
+    filter(GenreFacet.kind == FACET_KINDS[model], GenreFacet.count > 0).\
+    order_by(GenreFacet.genre).all()
+
+#----------------------------------------------------------------------------#
+# Genre matching.
+#----------------------------------------------------------------------------#
+
+# Artists suggested for a venue (and venues for an artist) are scored by a
+# GenreMatcher per model, built on first use and kept current by the write
+# handlers, like the name indexes, and reloaded after GENRE_MATCHER_MAX_AGE
+# seconds to pick up other workers' writes. Only candidates seeking a match
+# are suggested unless ?seeking=0 is passed.
+SEEKING_COLUMNS = {Venue: Venue.seeking_talent, Artist: Artist.seeking_venues}
+_genre_matchers = {}   # model -> (loaded at, GenreMatcher)
+
+def genre_matcher(model):
+  entry = _genre_matchers.get(model)
+  now = time.monotonic()
+  if entry is None or now - entry[0] > current_app.config['GENRE_MATCHER_MAX_AGE']:
+    from matching import GenreMatcher
+    rows = db.session.query(model.id, model.genres, SEEKING_COLUMNS[model],
+                            model.city, model.state).yield_per(5000)
+    entry = _genre_matchers[model] = (now, GenreMatcher.load(rows))
+  return entry[1]
+
+def match_entity(model, entity):
+  entry = _genre_matchers.get(model)
+  if entry is not None:
+    entry[1].set(entity.id, entity.genres,
+                 getattr(entity, SEEKING_COLUMNS[model].key),
+                 entity.city, entity.state)
+
+def unmatch_entity(model, entity_id):
+  entry = _genre_matchers.get(model)
+  if entry is not None:
+    entry[1].remove(entity_id)
+
+def suggestions(model, genres):
+  """The model rows best matching genres, filtered by the request args."""
+  limit = request.args.get('limit', current_app.config['SUGGESTIONS_MAX_RESULTS'],
+                           type=int)
+  matches = genre_matcher(model).match(
+    genres, max(limit, 1),
+    seeking_only=bool(request.args.get('seeking', 1, type=int)),
+    city=request.args.get('city'), state=request.args.get('state'))
+  if not matches:
+    return []
+  rows = {row.id: row for row in
+          db.session.query(model.id, model.name, model.city, model.state).
+          filter(model.id.in_([entity_id for entity_id, _ in matches]))}
+  return [{
+    "id": entity_id,
+    "name": rows[entity_id].name,
+    "city": rows[entity_id].city,
+    "state": rows[entity_id].state,
+    "score": round(score, 4)
+  } for entity_id, score in matches if entity_id in rows]
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# Rendered listing pages, keyed by path and query string and tagged with the
+# entity types they show. Write handlers invalidate the matching tags after
+# committing; pages that split shows into upcoming/past also expire when the
+# next show starts.
+# sized from the app config in create_app()
+page_cache = PageCache()
+
+def seconds_until_next_show():
+  now = datetime.datetime.now()
+  next_start = db.session.query(db.func.min(Show.start_time)).\
+    filter(Show.start_time > now).scalar()
+  if next_start is None:
+    return None
+  return (next_start - now).total_seconds()
+
+def cached_page(*tags, time_sensitive=False):
+  def decorator(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+      # flashed messages are rendered into the layout, so pages are neither
+      # served from nor stored in the cache while any are pending; nor while
+      # a writer reads the primary, as a page cached from a lagging replica
+      # would hide its own write
+      if (not current_app.config['PAGE_CACHE_ENABLED'] or session.get('_flashes')
+          or replicas.is_sticky()):
+        return view(*args, **kwargs)
+      key = request.full_path
+      page = page_cache.get(key)
+      if page is None:
+        page = view(*args, **kwargs)
+        if not isinstance(page, str):
+          return page
+        ttl = seconds_until_next_show() if time_sensitive else None
+        if replicas.reading_replica():
+          # the replica may not have caught up with the last write yet; keep
+          # the page no longer than writers are kept on the primary
+          ttl = min(ttl or page_cache.default_ttl,
+                    current_app.config['REPLICA_STICKY_SECONDS'])
+        page_cache.set(key, page, tags=tags, ttl=ttl)
+      return page
+    return wrapper
+  return decorator
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+
+# Every venue's bookings are held in a sorted schedule (see booking.py), so a
+# new show is checked against its two neighbours instead of the venue's whole
+# history, and free slots come from the same structure. Schedules are loaded
+# per venue on first use and reloaded after BOOKING_SCHEDULE_MAX_AGE seconds.
+
+def load_venue_bookings(venue_id):
+  rows = db.session.query(Show.start_time, Show.duration_minutes).\
+    filter(Show.venue_id == venue_id).\
+    order_by(Show.start_time)
+  return [(start, booking.show_end(start, minutes)) for start, minutes in rows]
+
+# sized from the app config in create_app()
+bookings = booking.Bookings(load_venue_bookings)
+
+def load_all_venue_schedules():
+  """VenueSchedules of every venue with shows, by venue id."""
+  rows = db.session.query(Show.venue_id, Show.start_time, Show.duration_minutes).\
+    order_by(Show.venue_id, Show.start_time)
+  schedules = collections.defaultdict(booking.VenueSchedule)
+  for venue_id, shows in itertools.groupby(rows, key=lambda row: row[0]):
+    schedules[venue_id] = booking.VenueSchedule(
+      (start, booking.show_end(start, minutes)) for _, start, minutes in shows)
+  return schedules
+
+def fits_schedule(schedules, row):
+  """Books an imported show row into its venue's schedule; False if it
+  overlaps a booking (which ex_show_venue_overlap would reject)."""
+  start = row.get('start_time')
+  if start is None:
+    return True
+  minutes = row.get('duration_minutes') or booking.DEFAULT_SHOW_MINUTES
+  try:
+    schedules[row['venue_id']].add_many([(start, booking.show_end(start, minutes))])
+  except booking.BookingConflict:
+    return False
+  return True
+
+def is_booking_violation(error):
+  """True for the Postgres exclusion_violation raised by ex_show_venue_overlap."""
+  return transactions.sqlstate(error) == '23P01'
+
+#----------------------------------------------------------------------------#
+# Live show feed.
+#----------------------------------------------------------------------------#
+
+# /shows/events pushes every show created in this process to its subscribers
+# as server-sent events, so front-ends no longer poll /shows. Each show is
+# encoded once and the bytes are shared by all subscriber queues; the view
+# never touches the database, so an open stream holds no connection.
+# sized from the app config in create_app()
+show_feed = pubsub.Hub()
+
+def publish_shows(show_ids):
+  # even with no one listening, the events go into the history, for clients
+  # that reconnect with Last-Event-ID after a drop
+  if not show_ids or (not show_feed and show_feed.history_size == 0):
+    return
+  rows = db.session.query(
+      Show.id, Show.venue_id, Venue.name.label('venue_name'),
+      Show.artist_id, Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link'), Show.start_time).\
+    join(Venue, Show.venue_id == Venue.id).\
     join(Artist, Show.artist_id == Artist.id).\
-    order_by(Show.start_time).\
-    all()
-  data = [{"venue_id": s.venue_id, "venue_name": s.venue.name,
-          "artist_id": s.artist_id, "artist_name": s.artist.name,
-          "artist_image_link": s.artist.image_link,
-          "start_time" : str(s.start_time)} for s in shows]
-
-  return render_template('pages/shows.html', shows=data)
-
-@app.route('/shows/create')
-def create_shows():
-  # renders form. do not touch.
-  form = ShowForm()
-  return render_template('forms/new_show.html', form=form)
-
-@app.route('/shows/create', methods=['POST'])
-def create_show_submission():
-  # called to create new shows in the db, upon submitting new show listing form
-  # TODO: insert form data as a new Show record in the db, instead
-
-  sform = request.form
-
-  try:     
-    show = Show(
-      artist_id = sform['artist_id'],
-      venue_id = sform['venue_id'],
-      start_time = sform['start_time']
-    )
+    filter(Show.id.in_(show_ids)).\
+    order_by(Show.start_time, Show.id)
+  for row in rows:
+    show_feed.publish(dumps(dict(row._mapping)))
+
+def iter_show_events(subscription, heartbeat):
+  """Yields the subscription's events in text/event-stream format."""
+  # sent at once, so the headers go out before the first event
+  yield b': subscribed\n\n'
+  while True:
+    events = subscription.get(timeout=heartbeat)
+    if not events:
+      # lets proxies keep the connection open and surfaces dead clients
+      yield b': keepalive\n\n'
+      continue
+    yield b''.join(b'id: %d\nevent: show\ndata: %s\n\n' % event for event in events)
+
+#----------------------------------------------------------------------------#
+# Calendar feeds.
+#----------------------------------------------------------------------------#
+
+# /venues/<id>/calendar.ics and /artists/<id>/calendar.ics are validated by
+# the owner's shows_changed_at alone, so the conditional GET that calendar
+# clients repeat every few minutes costs one primary-key lookup. Every write
+# that adds or removes shows (including the cascades of venue and artist
+# deletes) must touch the calendars of both sides.
+
+def touch_calendars(model, ids=None):
+  """Marks the feeds of model rows with id in ids (all rows if None) changed."""
+  query = model.query
+  if ids is not None:
+    query = query.filter(model.id.in_(ids))
+  query.update({model.shows_changed_at: utcnow(), model.updated_at: model.updated_at},
+               synchronize_session=False)
+
+def calendar_response(owner, title, query, make_event):
+  """Streams query's shows as an .ics feed, or answers 304 if unchanged.
+
+  owner is a row with id and shows_changed_at; make_event turns a show row
+  into an ical event dict.
+  """
+  etag = '{}-{}-{}'.format(request.endpoint, owner.id,
+                           owner.shows_changed_at.strftime('%Y%m%d%H%M%S%f'))
+  headers = {'Cache-Control': 'no-cache'}
+  if not is_modified(etag, owner.shows_changed_at):
+    response = Response(status=304, headers=headers)
+  else:
+    rows = stream_rows(query, current_app.config['CALENDAR_STREAM_BATCH_SIZE'])
+    body = ical.iter_calendar(title, (make_event(row) for row in rows),
+                              owner.shows_changed_at)
+    response = Response(stream_with_context(body), headers=headers,
+                        mimetype='text/calendar')
+  response.set_etag(etag)
+  response.last_modified = last_modified_dates(owner.shows_changed_at)[0]
+  return response
+
+def calendar_shows_query():
+  return db.session.query(
+      Show.id, Show.start_time, Show.duration_minutes, Show.venue_id, Show.artist_id,
+      Venue.name.label('venue_name'), Venue.address, Venue.city, Venue.state,
+      Artist.name.label('artist_name')).\
+    join(Venue, Show.venue_id == Venue.id).\
+    join(Artist, Show.artist_id == Artist.id).\
+    order_by(Show.start_time, Show.id)
+
+def show_event(row, url):
+  location = ', '.join(part for part in (row.venue_name, row.address, row.city,
+                                         row.state) if part)
+  return {'uid': 'show-{}@fyyur'.format(row.id), 'start': row.start_time,
+          'end': booking.show_end(row.start_time, row.duration_minutes),
+          'summary': '{} at {}'.format(row.artist_name, row.venue_name),
+          'location': location, 'url': url}
 
-    db.session.add(show)
+#----------------------------------------------------------------------------#
+# API helpers.
+#----------------------------------------------------------------------------#
+
+# Read-only JSON views of venues, artists and shows. ?fields=a,b selects the
+# returned keys and only those columns are put in the SELECT list; listings
+# are streamed as a JSON array, fetching API_STREAM_BATCH_SIZE rows at a time.
+
+# show fields that live on the joined venue/artist rows
+SHOW_JOINED_FIELDS = {
+  'venue_name': (Venue, Show.venue_id == Venue.id, Venue.name),
+  'artist_name': (Artist, Show.artist_id == Artist.id, Artist.name),
+  'artist_image_link': (Artist, Show.artist_id == Artist.id, Artist.image_link),
+}
+
+def api_error(status, message):
+  return jsonify({
+    "success": False,
+    "error": status,
+    "message": message
+  }), status
+
+def api_query(model, joined_fields=None):
+  """Builds a query selecting just the ?fields= columns of model."""
+  joined_fields = joined_fields or {}
+  available = list(model.__table__.columns.keys()) + list(joined_fields)
+  requested = request.args.get('fields')
+  if requested:
+    names = list(dict.fromkeys(f.strip() for f in requested.split(',') if f.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+      abort(400, 'unknown fields: {}'.format(', '.join(unknown)))
+    if not names:
+      abort(400, 'no fields requested')
+  else:
+    names = available
+
+  columns, joins = [], {}
+  for name in names:
+    if name in joined_fields:
+      target, onclause, column = joined_fields[name]
+      joins[target] = onclause
+    else:
+      column = model.__table__.columns[name]
+    columns.append(column.label(name))
+  query = db.session.query(*columns).select_from(model)
+  for target, onclause in joins.items():
+    query = query.join(target, onclause)
+  return query
+
+def api_list(query):
+  rows = stream_rows(query, current_app.config['API_STREAM_BATCH_SIZE'])
+  body = iter_json_array(dict(row._mapping) for row in rows)
+  return Response(stream_with_context(body), mimetype='application/json')
+
+def api_detail(query, model, entity_id):
+  row = query.filter(model.id == entity_id).one_or_none()
+  if row is None:
+    abort(404)
+  return jsonify(dict(row._mapping))
+
+#----------------------------------------------------------------------------#
+# App Factory.
+#----------------------------------------------------------------------------#
+
+def create_app(test_config=None):
+  app = Flask(__name__)
+  app.config.from_object('config')
+  if test_config:
+    app.config.update(test_config)
+  app.json = OrjsonProvider(app)
+  template_cache.init_app(app)
+  moment.init_app(app)
+  db.init_app(app)
+  replicas.init_app(app)
+  if not app.config['SECRET_KEY']:
+    # good for one process only: other workers could not read its sessions
+    app.config['SECRET_KEY'] = os.urandom(32)
+  sql_stats.init_app(app)
+  page_cache.max_entries = app.config['PAGE_CACHE_MAX_ENTRIES']
+  page_cache.default_ttl = app.config['PAGE_CACHE_TTL']
+  show_feed.queue_size = app.config['SHOW_EVENTS_QUEUE_SIZE']
+  bookings.max_age = app.config['BOOKING_SCHEDULE_MAX_AGE']
+  unit_of_work.max_attempts = app.config['TRANSACTION_MAX_ATTEMPTS']
+  unit_of_work.base_delay = app.config['TRANSACTION_RETRY_BASE_DELAY']
+  unit_of_work.max_delay = app.config['TRANSACTION_RETRY_MAX_DELAY']
+  unit_of_work.logger = app.logger
+  show_feed.history_size = app.config['SHOW_EVENTS_HISTORY_SIZE']
+  app.jinja_env.filters['datetime'] = format_datetime
+
+  if os.environ.get('FLASK_RUN_FROM_CLI'):
+    # only the `flask db` commands need Flask-Migrate (and alembic), so
+    # web workers never import it
+    from flask_migrate import Migrate
+    Migrate(app, db)
+
+  if not app.debug:
+    # written by a background thread; see log_queue.py
+    log_queue.init_app(app)
+
+  #  Controllers
+  #  ----------------------------------------------------------------
+
+  @app.route('/')
+  def index():
+    return render_template('pages/home.html')
+
+
+  #  Venues
+  #  ----------------------------------------------------------------
+
+  @app.route('/venues')
+  @cached_page('venue', 'show', time_sensitive=True)
+  def venues():
+    # TODO: replace with real venues data.
+    #       num_shows should be aggregated based on number of upcoming shows per venue.
+    # data=[{
+    #   "city": "San Francisco",
+    #   "state": "CA",
+    #   "venues": [{
+    #     "id": 1,
+    #     "name": "The Musical Hop",
+    #     "num_upcoming_shows": 0,
+    #   }, {
+    #     "id": 3,
+    #     "name": "Park Square Live Music & Coffee",
+    #     "num_upcoming_shows": 1,
+    #   }]
+    # }, {
+    #   "city": "New York",
+    #   "state": "NY",
+    #   "venues": [{
+    #     "id": 2,
+    #     "name": "The Dueling Pianos Bar",
+    #     "num_upcoming_shows": 0,
+    #   }]
+    # }]
+
+    refresh_upcoming_counts_if_stale()
+    selected_genres = request.args.getlist('genre')
+    venue_rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+        Venue.upcoming_shows_count).\
+      order_by(Venue.state, Venue.city, Venue.id)
+    if selected_genres:
+      venue_rows = venue_rows.filter(genres_filter(Venue, selected_genres))
+    data = []
+    for (city, state), rows in itertools.groupby(venue_rows,
+                                                 key=lambda v: (v.city, v.state)):
+      data.append({"city": city, "state": state, "venues": [
+        {"id": v.id, "name": v.name, "num_upcoming_shows": v.upcoming_shows_count}
+        for v in rows]})
+
+    return render_template('pages/venues.html', areas=data,
+                           facets=genre_facets(Venue),
+                           selected_genres=selected_genres)
+
+  @app.route('/venues/search', methods=['POST'])
+  def search_venues():
+    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # seach for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+    # response={
+    #   "count": 1,
+    #   "data": [{
+    #     "id": 2,
+    #     "name": "The Dueling Pianos Bar",
+    #     "num_upcoming_shows": 0,
+    #   }]
+    # }
+    search_term = request.form.get('search_term', '')
+    page = request.values.get('page', 1, type=int)
+    refresh_upcoming_counts_if_stale()
+    per_page = app.config['SEARCH_RESULTS_PER_PAGE']
+    total, ids = search_names(Venue, search_term, page, per_page)
+    venues = {v.id: v for v in db.session.query(
+      Venue.id, Venue.name, Venue.upcoming_shows_count).filter(Venue.id.in_(ids))}
+    data = [{
+      "id": venues[i].id, "name": venues[i].name,
+      "num_upcoming_shows": venues[i].upcoming_shows_count
+    } for i in ids if i in venues]
+    response = {"count": total, "data": data, "page": page,
+                "next_page": page + 1 if page * per_page < total else None}
+
+    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+
+  @app.route('/venues/<int:venue_id>')
+  def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    # data1={
+    #   "id": 1,
+    #   "name": "The Musical Hop",
+    #   "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
+    #   "address": "1015 Folsom Street",
+    #   "city": "San Francisco",
+    #   "state": "CA",
+    #   "phone": "123-123-1234",
+    #   "website": "https://www.themusicalhop.com",
+    #   "facebook_link": "https://www.facebook.com/TheMusicalHop",
+    #   "seeking_talent": True,
+    #   "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
+    #   "image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60",
+    #   "past_shows": [{
+    #     "artist_id": 4,
+    #     "artist_name": "Guns N Petals",
+    #     "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
+    #     "start_time": "2019-05-21T21:30:00.000Z"
+    #   }],
+    #   "upcoming_shows": [],
+    #   "past_shows_count": 1,
+    #   "upcoming_shows_count": 0,
+    # }
+    # data2={
+    #   "id": 2,
+    #   "name": "The Dueling Pianos Bar",
+    #   "genres": ["Classical", "R&B", "Hip-Hop"],
+    #   "address": "335 Delancey Street",
+    #   "city": "New York",
+    #   "state": "NY",
+    #   "phone": "914-003-1132",
+    #   "website": "https://www.theduelingpianos.com",
+    #   "facebook_link": "https://www.facebook.com/theduelingpianos",
+    #   "seeking_talent": False,
+    #   "image_link": "https://images.unsplash.com/photo-1497032205916-ac775f0649ae?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=750&q=80",
+    #   "past_shows": [],
+    #   "upcoming_shows": [],
+    #   "past_shows_count": 0,
+    #   "upcoming_shows_count": 0,
+    # }
+    # data3={
+    #   "id": 3,
+    #   "name": "Park Square Live Music & Coffee",
+    #   "genres": ["Rock n Roll", "Jazz", "Classical", "Folk"],
+    #   "address": "34 Whiskey Moore Ave",
+    #   "city": "San Francisco",
+    #   "state": "CA",
+    #   "phone": "415-000-1234",
+    #   "website": "https://www.parksquarelivemusicandcoffee.com",
+    #   "facebook_link": "https://www.facebook.com/ParkSquareLiveMusicAndCoffee",
+    #   "seeking_talent": False,
+    #   "image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
+    #   "past_shows": [{
+    #     "artist_id": 5,
+    #     "artist_name": "Matt Quevedo",
+    #     "artist_image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
+    #     "start_time": "2019-06-15T23:00:00.000Z"
+    #   }],
+    #   "upcoming_shows": [{
+    #     "artist_id": 6,
+    #     "artist_name": "The Wild Sax Band",
+    #     "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #     "start_time": "2035-04-01T20:00:00.000Z"
+    #   }, {
+    #     "artist_id": 6,
+    #     "artist_name": "The Wild Sax Band",
+    #     "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #     "start_time": "2035-04-08T20:00:00.000Z"
+    #   }, {
+    #     "artist_id": 6,
+    #     "artist_name": "The Wild Sax Band",
+    #     "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #     "start_time": "2035-04-15T20:00:00.000Z"
+    #   }],
+    #   "past_shows_count": 1,
+    #   "upcoming_shows_count": 1,
+    # }
+    # data = list(filter(lambda d: d['id'] == venue_id, [data1, data2, data3]))[0]
+
+    now = datetime.datetime.now()
+    response = not_modified(Venue, venue_id, now)
+    if response is not None:
+      return response
+
+    v = load_with_shows(Venue, venue_id, Show.artist)
+    if v is None:
+      abort(404)
+    data = {'id': v.id, 'name': v.name, 'genres': v.genres,'city': v.city,
+      'state': v.state, 'address': v.address, 'phone': v.phone,
+      'website': v.website, 'seeking_talent': v.seeking_talent,
+      'seeking_description': v.seeking_description,
+      'facebook_link': v.facebook_link, 'image_link': v.image_link
+    }
+    past_shows, upcoming_shows = split_shows(v.shows, now)
+    data['past_shows'] = [{"artist_id" : ps.artist_id,
+      "artist_name": ps.artist.name,
+      "artist_image_link": ps.artist.image_link,
+      "start_time": ps.start_time} for ps in past_shows]
+    data["past_shows_count"] = len(data['past_shows'])
+    data['upcoming_shows'] = [{"artist_id" : ps.artist_id,
+      "artist_name": ps.artist.name,
+      "artist_image_link": ps.artist.image_link,
+      "start_time": ps.start_time} for ps in upcoming_shows]
+    data["upcoming_shows_count"] = len(data['upcoming_shows'])
+
+    return page_response(render_template('pages/show_venue.html', venue=data),
+                         v, past_shows)
+
+  @app.route('/venues/<int:venue_id>/calendar.ics')
+  def venue_calendar(venue_id):
+    venue = db.session.query(Venue.id, Venue.name, Venue.shows_changed_at).\
+      filter(Venue.id == venue_id).one_or_none()
+    if venue is None:
+      abort(404)
+    query = calendar_shows_query().filter(Show.venue_id == venue_id)
+    return calendar_response(venue, venue.name, query, lambda row: show_event(
+      row, url_for('show_artist', artist_id=row.artist_id, _external=True)))
+
+  @app.route('/venues/<int:venue_id>/free-slots')
+  def venue_free_slots(venue_id):
+    # ?start=<ISO datetime, default now>&days=7&duration=<minutes>
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).first() is None:
+      abort(404)
+    try:
+      start = booking.naive_local(datetime.datetime.fromisoformat(request.args['start']))
+    except KeyError:
+      start = datetime.datetime.now().replace(second=0, microsecond=0)
+    except ValueError:
+      abort(400, 'start must be an ISO date or datetime')
+    days = request.args.get('days', 7, type=int)
+    duration = request.args.get('duration', booking.DEFAULT_SHOW_MINUTES, type=int)
+    if not 1 <= days <= app.config['FREE_SLOTS_MAX_DAYS'] or duration < 1:
+      abort(400, 'days must be 1-{} and duration positive'.format(
+        app.config['FREE_SLOTS_MAX_DAYS']))
+    end = start + datetime.timedelta(days=days)
+    slots = bookings.schedule(venue_id).free_slots(
+      start, end, datetime.timedelta(minutes=duration))
+    return jsonify({
+      "venue_id": venue_id,
+      "start": start,
+      "end": end,
+      "duration_minutes": duration,
+      "slots": [{"start": slot_start, "end": slot_end} for slot_start, slot_end in slots]
+    })
+
+  @app.route('/venues/<int:venue_id>/suggested-artists')
+  def suggested_artists(venue_id):
+    genres = db.session.query(Venue.genres).filter(Venue.id == venue_id).one_or_none()
+    if genres is None:
+      abort(404)
+    return jsonify({"venue_id": venue_id,
+                    "results": suggestions(Artist, genres.genres)})
+
+  #  Create Venue
+  #  ----------------------------------------------------------------
+
+  @app.route('/venues/create', methods=['GET'])
+  def create_venue_form():
+    from forms import VenueForm
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+  @app.route('/venues/create', methods=['POST'])
+  def create_venue_submission():
+    vform = request.form
+
+    def add_venue():
+      venue = Venue(
+        name = vform['name'],
+        city = vform['city'],
+        state = vform['state'],
+        address = vform['address'],
+        genres = vform.getlist('genres'),
+        phone = vform['phone'],
+        facebook_link = vform['facebook_link'],
+        image_link = vform['image_link']
+      )
+      db.session.add(venue)
+      bump_genre_facets(Venue, venue.genres, 1)
+      return venue
+
+    try:
+      venue = unit_of_work.run('create_venue', add_venue)
+      index_name(Venue, venue.id, venue.name)
+      match_entity(Venue, venue)
+      page_cache.invalidate('venue')
+      flash('Venue ' + vform['name'] + ' was successfully listed!')
+    except:
+      app.logger.exception('Venue %r could not be listed', vform.get('name'))
+      flash('An error occurred. Venue ' + vform['name'] + ' could not be listed.')
+
+    return render_template('pages/home.html')
+
+  @app.route('/venues/<int:venue_id>', methods=['DELETE'])
+  def delete_venue(venue_id):
+    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+    # clicking that button delete it from the db then redirect the user to the homepage
+    venue = db.session.query(Venue.id, Venue.genres).\
+      filter(Venue.id == venue_id).one_or_none()
+    if venue is None:
+      abort(404)
+
+    def remove_venue():
+      touch_calendars(Artist, db.session.query(Show.artist_id).
+                      filter(Show.venue_id == venue_id).scalar_subquery())
+      # a single DELETE; the venue's shows go with it via ON DELETE CASCADE
+      Venue.query.filter(Venue.id == venue_id).delete(synchronize_session=False)
+      bump_genre_facets(Venue, venue.genres, -1)
+
+    try:
+      unit_of_work.run('delete_venue', remove_venue)
+    except:
+      app.logger.exception('Could not delete venue %s', venue_id)
+      abort(422)
+    unindex_name(Venue, venue_id)
+    unmatch_entity(Venue, venue_id)
+    bookings.drop(venue_id)
+    page_cache.invalidate('venue', 'show')
+    return jsonify({'success': True, 'deleted': venue_id})
+
+  #  Artists
+  #  ----------------------------------------------------------------
+  @app.route('/artists')
+  @cached_page('artist')
+  def artists():
+    # TODO: replace with real data returned from querying the database
+    # data=[{
+    #   "id": 4,
+    #   "name": "Guns N Petals",
+    # }, {
+    #   "id": 5,
+    #   "name": "Matt Quevedo",
+    # }, {
+    #   "id": 6,
+    #   "name": "The Wild Sax Band",
+    # }]
+
+    selected_genres = request.args.getlist('genre')
+    artist_query = db.session.query(Artist.id, Artist.name).order_by(Artist.id)
+    if selected_genres:
+      artist_query = artist_query.filter(genres_filter(Artist, selected_genres))
+
+    data = [{'id': a.id, 'name': a.name} for a in artist_query]
+
+    return render_template('pages/artists.html', artists=data,
+                           facets=genre_facets(Artist),
+                           selected_genres=selected_genres)
+
+  @app.route('/artists/search', methods=['POST'])
+  def search_artists():
+    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+    # search for "band" should return "The Wild Sax Band".
+    # response={
+    #   "count": 1,
+    #   "data": [{
+    #     "id": 4,
+    #     "name": "Guns N Petals",
+    #     "num_upcoming_shows": 0,
+    #   }]
+    # }
+
+    search_term = request.form.get('search_term', '')
+    page = request.values.get('page', 1, type=int)
+    per_page = app.config['SEARCH_RESULTS_PER_PAGE']
+    total, ids = search_names(Artist, search_term, page, per_page)
+    artists = {a.id: a for a in db.session.query(Artist.id, Artist.name).\
+      filter(Artist.id.in_(ids))}
+    counts = upcoming_counts_by_artist(ids)
+    data = [{
+      "id": artists[i].id, "name": artists[i].name,
+      "num_upcoming_shows": counts.get(i, 0)
+    } for i in ids if i in artists]
+    response = {"count": total, "data": data, "page": page,
+                "next_page": page + 1 if page * per_page < total else None}
+
+    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+
+  @app.route('/artists/<int:artist_id>')
+  def show_artist(artist_id):
+
+    # data1={
+    #   "id": 4,
+    #   "name": "Guns N Petals",
+    #   "genres": ["Rock n Roll"],
+    #   "city": "San Francisco",
+    #   "state": "CA",
+    #   "phone": "326-123-5000",
+    #   "website": "https://www.gunsnpetalsband.com",
+    #   "facebook_link": "https://www.facebook.com/GunsNPetals",
+    #   "seeking_venue": True,
+    #   "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
+    #   "image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
+    #   "past_shows": [{
+    #     "venue_id": 1,
+    #     "venue_name": "The Musical Hop",
+    #     "venue_image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60",
+    #     "start_time": "2019-05-21T21:30:00.000Z"
+    #   }],
+    #   "upcoming_shows": [],
+    #   "past_shows_count": 1,
+    #   "upcoming_shows_count": 0,
+    # }
+    # data2={
+    #   "id": 5,
+    #   "name": "Matt Quevedo",
+    #   "genres": ["Jazz"],
+    #   "city": "New York",
+    #   "state": "NY",
+    #   "phone": "300-400-5000",
+    #   "facebook_link": "https://www.facebook.com/mattquevedo923251523",
+    #   "seeking_venue": False,
+    #   "image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
+    #   "past_shows": [{
+    #     "venue_id": 3,
+    #     "venue_name": "Park Square Live Music & Coffee",
+    #     "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
+    #     "start_time": "2019-06-15T23:00:00.000Z"
+    #   }],
+    #   "upcoming_shows": [],
+    #   "past_shows_count": 1,
+    #   "upcoming_shows_count": 0,
+    # }
+    # data3={
+    #   "id": 6,
+    #   "name": "The Wild Sax Band",
+    #   "genres": ["Jazz", "Classical"],
+    #   "city": "San Francisco",
+    #   "state": "CA",
+    #   "phone": "432-325-5432",
+    #   "seeking_venue": False,
+    #   "image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #   "past_shows": [],
+    #   "upcoming_shows": [{
+    #     "venue_id": 3,
+    #     "venue_name": "Park Square Live Music & Coffee",
+    #     "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
+    #     "start_time": "2035-04-01T20:00:00.000Z"
+    #   }, {
+    #     "venue_id": 3,
+    #     "venue_name": "Park Square Live Music & Coffee",
+    #     "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
+    #     "start_time": "2035-04-08T20:00:00.000Z"
+    #   }, {
+    #     "venue_id": 3,
+    #     "venue_name": "Park Square Live Music & Coffee",
+    #     "venue_image_link": "https://images.unsplash.com/photo-1485686531765-ba63b07845a7?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=747&q=80",
+    #     "start_time": "2035-04-15T20:00:00.000Z"
+    #   }],
+    #   "past_shows_count": 0,
+    #   "upcoming_shows_count": 3,
+    # }
+    #data = list(filter(lambda d: d['id'] == artist_id, [data1, data2, data3]))[0]
+    now = datetime.datetime.now()
+    response = not_modified(Artist, artist_id, now)
+    if response is not None:
+      return response
+
+    a = load_with_shows(Artist, artist_id, Show.venue)
+    if a is None:
+      abort(404)
+    data = {'id': a.id, 'name': a.name, 'genres': a.genres,'city': a.city,
+      'state': a.state, 'phone': a.phone, 'seeking_venue': a.seeking_venues,
+      'facebook_link': a.facebook_link, 'image_link': a.image_link
+    }
+    past_shows, upcoming_shows = split_shows(a.shows, now)
+    data['past_shows'] = [{"venue_id" : ps.venue_id,
+      "venue_name": ps.venue.name,
+      "venue_image_link": ps.venue.image_link,
+      "start_time": ps.start_time} for ps in past_shows]
+    data["past_shows_count"] = len(data['past_shows'])
+    data['upcoming_shows'] = [{"venue_id" : ps.venue_id,
+      "venue_name": ps.venue.name,
+      "venue_image_link": ps.venue.image_link,
+      "start_time": ps.start_time} for ps in upcoming_shows]
+    data["upcoming_shows_count"] = len(data['upcoming_shows'])
+
+    return page_response(render_template('pages/show_artist.html', artist=data),
+                         a, past_shows)
+
+  @app.route('/artists/<int:artist_id>/calendar.ics')
+  def artist_calendar(artist_id):
+    artist = db.session.query(Artist.id, Artist.name, Artist.shows_changed_at).\
+      filter(Artist.id == artist_id).one_or_none()
+    if artist is None:
+      abort(404)
+    query = calendar_shows_query().filter(Show.artist_id == artist_id)
+    return calendar_response(artist, artist.name, query, lambda row: show_event(
+      row, url_for('show_venue', venue_id=row.venue_id, _external=True)))
+
+  @app.route('/artists/<int:artist_id>/suggested-venues')
+  def suggested_venues(artist_id):
+    genres = db.session.query(Artist.genres).filter(Artist.id == artist_id).one_or_none()
+    if genres is None:
+      abort(404)
+    return jsonify({"artist_id": artist_id,
+                    "results": suggestions(Venue, genres.genres)})
+
+  @app.route('/artists/<int:artist_id>', methods=['DELETE'])
+  def delete_artist(artist_id):
+    artist = db.session.query(Artist.id, Artist.genres).\
+      filter(Artist.id == artist_id).one_or_none()
+    if artist is None:
+      abort(404)
+
+    def remove_artist():
+      release_artist_upcoming_counts(artist_id)
+      touch_calendars(Venue, db.session.query(Show.venue_id).
+                      filter(Show.artist_id == artist_id).scalar_subquery())
+      # a single DELETE; the artist's shows go with it via ON DELETE CASCADE
+      Artist.query.filter(Artist.id == artist_id).delete(synchronize_session=False)
+      bump_genre_facets(Artist, artist.genres, -1)
+
+    try:
+      unit_of_work.run('delete_artist', remove_artist)
+    except:
+      app.logger.exception('Could not delete artist %s', artist_id)
+      abort(422)
+    unindex_name(Artist, artist_id)
+    unmatch_entity(Artist, artist_id)
+    # the artist's shows were spread over venues we did not look up
+    bookings.drop()
+    page_cache.invalidate('artist', 'show')
+    return jsonify({'success': True, 'deleted': artist_id})
+
+  #  Update
+  #  ----------------------------------------------------------------
+  @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+  def edit_artist(artist_id):
+    from forms import ArtistForm
+    form = ArtistForm()
+    artist={
+      "id": 4,
+      "name": "Guns N Petals",
+      "genres": ["Rock n Roll"],
+      "city": "San Francisco",
+      "state": "CA",
+      "phone": "326-123-5000",
+      "website": "https://www.gunsnpetalsband.com",
+      "facebook_link": "https://www.facebook.com/GunsNPetals",
+      "seeking_venue": True,
+      "seeking_description": "Looking for shows to perform at in the San Francisco Bay Area!",
+      "image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80"
+    }
+    # TODO: populate form with fields from artist with ID <artist_id>
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+  @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+  def edit_artist_submission(artist_id):
+    # TODO: take values from the form submitted, and update existing
+    # artist record with ID <artist_id> using the new attributes
+
+    return redirect(url_for('show_artist', artist_id=artist_id))
+
+  @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+  def edit_venue(venue_id):
+    from forms import VenueForm
+    form = VenueForm()
+    venue={
+      "id": 1,
+      "name": "The Musical Hop",
+      "genres": ["Jazz", "Reggae", "Swing", "Classical", "Folk"],
+      "address": "1015 Folsom Street",
+      "city": "San Francisco",
+      "state": "CA",
+      "phone": "123-123-1234",
+      "website": "https://www.themusicalhop.com",
+      "facebook_link": "https://www.facebook.com/TheMusicalHop",
+      "seeking_talent": True,
+      "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
+      "image_link": "https://images.unsplash.com/photo-1543900694-133f37abaaa5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=400&q=60"
+    }
+    # TODO: populate form with values from venue with ID <venue_id>
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+  @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+  def edit_venue_submission(venue_id):
+    # TODO: take values from the form submitted, and update existing
+    # venue record with ID <venue_id> using the new attributes
+    return redirect(url_for('show_venue', venue_id=venue_id))
+
+  #  Create Artist
+  #  ----------------------------------------------------------------
+
+  @app.route('/artists/create', methods=['GET'])
+  def create_artist_form():
+    from forms import ArtistForm
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+  @app.route('/artists/create', methods=['POST'])
+  def create_artist_submission():
+    # called upon submitting the new artist listing form
+
+    aform = request.form
+
+    def add_artist():
+      artist = Artist(
+        name = aform['name'],
+        city = aform['city'],
+        state = aform['state'],
+        genres = aform.getlist('genres'),
+        phone = aform['phone'],
+        facebook_link = aform['facebook_link'],
+        image_link = aform['image_link']
+      )
+      db.session.add(artist)
+      bump_genre_facets(Artist, artist.genres, 1)
+      return artist
+
+    try:
+      artist = unit_of_work.run('create_artist', add_artist)
+      index_name(Artist, artist.id, artist.name)
+      match_entity(Artist, artist)
+      page_cache.invalidate('artist')
+      # on successful db insert, flash success
+      flash('Artist ' + aform['name'] + ' was successfully listed!')
+    except:
+      app.logger.exception('Artist %r could not be listed', aform.get('name'))
+      flash('An error occurred. Artist ' + aform['name'] + ' could not be listed.')
+    return render_template('pages/home.html')
+
+
+  #  Shows
+  #  ----------------------------------------------------------------
+
+  @app.route('/shows')
+  @cached_page('show', 'venue', 'artist', time_sensitive=True)
+  def shows():
+    #displays list of shows at /shows
+    # data=[{
+    #   "venue_id": 1,
+    #   "venue_name": "The Musical Hop",
+    #   "artist_id": 4,
+    #   "artist_name": "Guns N Petals",
+    #   "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
+    #   "start_time": "2019-05-21T21:30:00.000Z"
+    # }, {
+    #   "venue_id": 3,
+    #   "venue_name": "Park Square Live Music & Coffee",
+    #   "artist_id": 5,
+    #   "artist_name": "Matt Quevedo",
+    #   "artist_image_link": "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80",
+    #   "start_time": "2019-06-15T23:00:00.000Z"
+    # }, {
+    #   "venue_id": 3,
+    #   "venue_name": "Park Square Live Music & Coffee",
+    #   "artist_id": 6,
+    #   "artist_name": "The Wild Sax Band",
+    #   "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #   "start_time": "2035-04-01T20:00:00.000Z"
+    # }, {
+    #   "venue_id": 3,
+    #   "venue_name": "Park Square Live Music & Coffee",
+    #   "artist_id": 6,
+    #   "artist_name": "The Wild Sax Band",
+    #   "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #   "start_time": "2035-04-08T20:00:00.000Z"
+    # }, {
+    #   "venue_id": 3,
+    #   "venue_name": "Park Square Live Music & Coffee",
+    #   "artist_id": 6,
+    #   "artist_name": "The Wild Sax Band",
+    #   "artist_image_link": "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80",
+    #   "start_time": "2035-04-15T20:00:00.000Z"
+    # }]
+
+    # keyset pagination on (start_time, id): ?after=<cursor>&upcoming=1&stream=1
+    per_page = app.config['SHOWS_PER_PAGE']
+    upcoming = request.args.get('upcoming', 0, type=int)
+    query = db.session.query(Show.id, Show.start_time,
+        Show.venue_id, Venue.name.label('venue_name'),
+        Show.artist_id, Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')).\
+      join(Venue, Show.venue_id == Venue.id).\
+      join(Artist, Show.artist_id == Artist.id).\
+      order_by(Show.start_time, Show.id)
+    if upcoming:
+      query = query.filter(Show.start_time >= datetime.datetime.now())
+    after = request.args.get('after')
+    if after:
+      try:
+        after_time, after_id = decode_show_cursor(after)
+      except ValueError:
+        abort(400)
+      query = query.filter(
+        db.tuple_(Show.start_time, Show.id) > db.tuple_(after_time, after_id))
+
+    if request.args.get('stream', 0, type=int):
+      # render every remaining show, reading the rows in per_page batches
+      data = (show_row(s) for s in stream_rows(query, per_page))
+      return stream_template('pages/shows.html', shows=data, next_url=None)
+
+    rows = query.limit(per_page + 1).all()
+    next_url = None
+    if len(rows) > per_page:
+      rows = rows[:per_page]
+      next_url = url_for('shows', after=encode_show_cursor(rows[-1]),
+                         upcoming=upcoming or None)
+    data = [show_row(s) for s in rows]
+
+    return render_template('pages/shows.html', shows=data, next_url=next_url)
+
+  @app.route('/shows/create')
+  def create_shows():
+    # renders form. do not touch.
+    from forms import ShowForm
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+  @app.route('/shows/create', methods=['POST'])
+  def create_show_submission():
+    # called to create new shows in the db, upon submitting new show listing form
+    # TODO: insert form data as a new Show record in the db, instead
+
+    import dateutil.parser
+    sform = request.form
+
+    try:
+      venue_id = int(sform['venue_id'])
+      artist_id = int(sform['artist_id'])
+      duration = int(sform.get('duration_minutes') or booking.DEFAULT_SHOW_MINUTES)
+      # the bounds of ShowForm.duration_minutes
+      if not 1 <= duration <= booking.MAX_SHOW_MINUTES:
+        raise ValueError('duration out of range: {}'.format(duration))
+      # a recurring show is expanded into its occurrences up front; a plain
+      # one is a series of one
+      starts = booking.expand_series(
+        booking.naive_local(dateutil.parser.parse(sform['start_time'])), sform.get('repeat'),
+        until=dateutil.parser.parse(sform['repeat_until']).date()
+          if sform.get('repeat_until') else None,
+        count=int(sform['repeat_count']) if sform.get('repeat_count') else None,
+        limit=app.config['SHOW_SERIES_MAX_SHOWS'])
+      slots = [(start, booking.show_end(start, duration)) for start in starts]
+
+      # every occurrence is checked against the venue's schedule (and the
+      # others) before anything is written, and all of them are held
+      bookings.reserve(venue_id, slots)
+
+      def add_shows():
+        show_ids = db.session.execute(
+          db.insert(Show).values([{
+            'venue_id': venue_id, 'artist_id': artist_id,
+            'start_time': start, 'duration_minutes': duration
+          } for start in starts]).returning(Show.id)).scalars().all()
+        bump_upcoming_count(venue_id, starts, 1)
+        touch_calendars(Artist, [artist_id])
+        return show_ids
+
+      try:
+        show_ids = unit_of_work.run('create_show', add_shows)
+      except Exception as error:
+        bookings.release(venue_id, starts)
+        if is_booking_violation(error):
+          # booked meanwhile by another process; reload the venue's schedule
+          bookings.drop(venue_id)
+          for slot in slots:
+            clash = bookings.schedule(venue_id).conflict(*slot)
+            if clash:
+              raise booking.BookingConflict(*clash)
+        raise
+      for start in starts:
+        bump_autocomplete_scores(venue_id, artist_id, start, 1)
+      page_cache.invalidate('show')
+      publish_shows(show_ids)
+      # on successful db insert, flash success
+      if len(show_ids) == 1:
+        flash('Show was successfully listed!')
+      else:
+        flash('{} shows were successfully listed!'.format(len(show_ids)))
+    except booking.BookingConflict as conflict:
+      flash('The venue is already booked from {:%Y-%m-%d %H:%M} to {:%H:%M}. '
+            'Show could not be listed.'.format(conflict.start, conflict.end))
+    except:
+      app.logger.exception('Show could not be listed')
+      flash('An error occurred. Show could not be listed.')
+
+    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    return render_template('pages/home.html')
+
+  @app.route('/shows/events')
+  def show_events():
+    if len(show_feed) >= app.config['SHOW_EVENTS_MAX_SUBSCRIBERS']:
+      abort(503)
+    # an EventSource reconnecting after a drop resumes where it left off
+    subscription = show_feed.subscribe(request.headers.get('Last-Event-ID', type=int))
+    body = iter_show_events(subscription, app.config['SHOW_EVENTS_HEARTBEAT_SECONDS'])
+    response = Response(body, mimetype='text/event-stream', headers={
+      'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # also runs if the client goes away before the body is started
+    response.call_on_close(subscription.close)
+    return response
+
+  @app.route('/shows/<int:show_id>', methods=['DELETE'])
+  def delete_show(show_id):
+    show = Show.query.get(show_id)
+    if show is None:
+      abort(404)
+    booked = (show.venue_id, show.artist_id, show.start_time)
+
+    def remove_show():
+      bump_upcoming_count(booked[0], [booked[2]], -1)
+      touch_calendars(Artist, [booked[1]])
+      Show.query.filter(Show.id == show_id).delete(synchronize_session=False)
+
+    try:
+      unit_of_work.run('delete_show', remove_show)
+    except:
+      app.logger.exception('Could not delete show %s', show_id)
+      abort(422)
+    bookings.release(booked[0], [booked[2]])
+    bump_autocomplete_scores(*booked, -1)
+    page_cache.invalidate('show')
+    return jsonify({'success': True, 'deleted': show_id})
+
+  #  Autocomplete
+  #  ----------------------------------------------------------------
+
+  @app.route('/autocomplete')
+  def autocomplete():
+    q = request.args.get('q', '')
+    limit = request.args.get('limit', app.config['AUTOCOMPLETE_MAX_RESULTS'], type=int)
+    results = [{
+      "type": kind,
+      "id": entity_id,
+      "name": name,
+      "num_upcoming_shows": score
+    } for (kind, entity_id), name, score in
+      autocomplete_index().completions(q, max(limit, 1))]
+    return jsonify({"q": q, "results": results})
+
+  #  API
+  #  ----------------------------------------------------------------
+
+  @app.route('/api/venues')
+  def api_venues():
+    query = api_query(Venue).order_by(Venue.id)
+    genres = request.args.getlist('genre')
+    if genres:
+      query = query.filter(genres_filter(Venue, genres))
+    return api_list(query)
+
+  @app.route('/api/venues/<int:venue_id>')
+  def api_venue(venue_id):
+    return api_detail(api_query(Venue), Venue, venue_id)
+
+  @app.route('/api/artists')
+  def api_artists():
+    query = api_query(Artist).order_by(Artist.id)
+    genres = request.args.getlist('genre')
+    if genres:
+      query = query.filter(genres_filter(Artist, genres))
+    return api_list(query)
+
+  @app.route('/api/artists/<int:artist_id>')
+  def api_artist(artist_id):
+    return api_detail(api_query(Artist), Artist, artist_id)
+
+  @app.route('/api/shows')
+  def api_shows():
+    query = api_query(Show, SHOW_JOINED_FIELDS).order_by(Show.start_time, Show.id)
+    if request.args.get('upcoming', 0, type=int):
+      query = query.filter(Show.start_time >= datetime.datetime.now())
+    return api_list(query)
+
+  @app.route('/api/shows/<int:show_id>')
+  def api_show(show_id):
+    return api_detail(api_query(Show, SHOW_JOINED_FIELDS), Show, show_id)
+
+  @app.route('/api/stats/transactions')
+  def api_transaction_stats():
+    # runs, retries and failures per write handler in this process, to show
+    # where concurrent writers contend
+    return jsonify(unit_of_work.stats.snapshot())
+
+  @app.errorhandler(400)
+  def bad_request_error(error):
+      if request.path.startswith('/api/'):
+          return api_error(400, error.description)
+      return error
+
+  @app.errorhandler(404)
+  def not_found_error(error):
+      if request.path.startswith('/api/'):
+          return api_error(404, 'resource not found')
+      return render_template('errors/404.html'), 404
+
+  @app.errorhandler(500)
+  def server_error(error):
+      return render_template('errors/500.html'), 500
+
+  #  Commands
+  #  ----------------------------------------------------------------
+
+  IMPORT_MODELS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+  IMPORT_TAGS = {'venues': 'venue', 'artists': 'artist', 'shows': 'show'}
+
+  @app.cli.command('import-data')
+  @click.argument('kind', type=click.Choice(sorted(IMPORT_MODELS)))
+  @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+  @click.option('--batch-size', default=5000, show_default=True)
+  def import_data(kind, path, batch_size):
+    """Bulk-load venues, artists or shows from a CSV or JSON-lines file.
+
+    Shows with an unknown venue or artist, or overlapping another show at
+    their venue, are counted as rejected and skipped.
+    """
+    import bulk_import
+
+    model = IMPORT_MODELS[kind]
+    table = model.__table__
+    coerce = bulk_import.make_coercer(table)
+    if model is Show:
+      # foreign keys are checked against id sets read once per run, and
+      # bookings against every venue's schedule, read in one pass
+      venue_ids = {row.id for row in db.session.query(Venue.id)}
+      artist_ids = {row.id for row in db.session.query(Artist.id)}
+      schedules = load_all_venue_schedules()
+      db.session.commit()
+      # whose feeds and pages the imported shows change
+      touched = {Venue: set(), Artist: set()}
+
+    loaded = rejected = 0
+    started = time.perf_counter()
+    records = (coerce(r) for r in bulk_import.read_records(path))
+    for number, batch in enumerate(bulk_import.batched(records, batch_size), 1):
+      if model is Show:
+        valid = [r for r in batch
+                 if r.get('venue_id') in venue_ids and r.get('artist_id') in artist_ids
+                 and fits_schedule(schedules, r)]
+        rejected += len(batch) - len(valid)
+        batch = valid
+        touched[Venue].update(r['venue_id'] for r in batch)
+        touched[Artist].update(r['artist_id'] for r in batch)
+      batch_started = time.perf_counter()
+      if batch:
+        with db.engine.begin() as connection:
+          bulk_import.insert_batch(connection, table, batch)
+      elapsed = time.perf_counter() - batch_started
+      loaded += len(batch)
+      click.echo('batch {}: {} rows in {:.2f}s ({:,.0f} rows/s)'.format(
+        number, len(batch), elapsed, len(batch) / elapsed if elapsed else 0))
+
+    with db.engine.begin() as connection:
+      bulk_import.reset_id_sequence(connection, table)
+    if model is Show:
+      for owner, ids in touched.items():
+        for chunk in bulk_import.batched(sorted(ids), batch_size):
+          touch_calendars(owner, chunk)
+      refresh_upcoming_counts()
+      bookings.drop()
+    else:
+      _name_indexes.pop(model, None)
+      _genre_matchers.pop(model, None)
+      rebuild_genre_facets(model)
+    drop_autocomplete_index()
+    page_cache.invalidate(IMPORT_TAGS[kind])
+    elapsed = time.perf_counter() - started
+    click.echo('imported {} {} in {:.2f}s ({:,.0f} rows/s), rejected {}'.format(
+      loaded, kind, elapsed, loaded / elapsed if elapsed else 0, rejected))
+
+  @app.cli.command('check-query-plans')
+  def check_query_plans():
+    """EXPLAIN each view's Show queries and check they use the indexes."""
+    import query_plans
+
+    show = db.session.query(Show.id, Show.venue_id, Show.artist_id).\
+      order_by(Show.id).first()
     db.session.commit()
-    # on successful db insert, flash success
-    flash('Show was successfully listed!')
-  except:
-    e = sys.exc_info()
-    print('Error: {}'.format(e))
-    flash('An error occurred. Show could not be listed.')
-  
-  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-  return render_template('pages/home.html')
-
-@app.errorhandler(404)
-def not_found_error(error):
-    return render_template('errors/404.html'), 404
-
-@app.errorhandler(500)
-def server_error(error):
-    return render_template('errors/500.html'), 500
-
-
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+    if show is None:
+      raise click.ClickException('needs at least one show in the database')
+    ids = {'venue_id': show.venue_id, 'artist_id': show.artist_id,
+           'show_id': show.id}
+    failures = query_plans.check_views(app, db, ids, echo=click.echo)
+    if failures:
+      raise click.ClickException('{} queries not served by an index'.format(failures))
+
+  # after the filters are registered: compiling checks that they exist
+  if app.config['TEMPLATE_PRECOMPILE']:
+    template_cache.precompile(app)
+
+  return app
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -678,11 +1884,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
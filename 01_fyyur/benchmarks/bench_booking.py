@@ -0,0 +1,81 @@
+"""Micro-benchmark: booking conflict checks as a venue's history grows.
+
+Builds one venue's schedule of back-to-back shows and times VenueSchedule
+conflict checks and 7-day free-slot searches at increasing history sizes,
+next to the SQL overlap query the in-process check replaces (SQLite, with
+the (venue_id, start_time) index).
+
+Usage: python benchmarks/bench_booking.py [--sizes 1000,10000,100000]
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import booking  # noqa: E402
+
+BASE = datetime.datetime(2020, 1, 1, 18)
+OVERLAP_SQL = ('SELECT 1 FROM show WHERE venue_id = ? AND start_time < ? '
+               "AND datetime(start_time, '+' || duration_minutes || ' minutes') > ? "
+               'LIMIT 1')
+
+
+def history(size, rng):
+    """size shows of 1-3 hours with gaps of up to a day."""
+    start = BASE
+    for _ in range(size):
+        minutes = rng.choice((60, 120, 180))
+        yield start, minutes
+        start += datetime.timedelta(minutes=minutes + rng.randrange(0, 24 * 60, 30))
+
+
+def timed_us(fn, probes):
+    started = time.perf_counter()
+    for probe in probes:
+        fn(*probe)
+    return (time.perf_counter() - started) / len(probes) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--probes', type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    print('{:>8} {:>12} {:>12} {:>12}'.format(
+        'shows', 'check', 'free slots', 'SQL check'))
+    for size in map(int, args.sizes.split(',')):
+        shows = list(history(size, rng))
+        schedule = booking.VenueSchedule(
+            (start, booking.show_end(start, minutes)) for start, minutes in shows)
+        last = shows[-1][0]
+        span = (last - BASE).total_seconds()
+        probes = []
+        for _ in range(args.probes):
+            start = BASE + datetime.timedelta(seconds=rng.uniform(0, span))
+            probes.append((start, start + datetime.timedelta(hours=2)))
+
+        db = sqlite3.connect(':memory:')
+        db.execute('CREATE TABLE show (venue_id INTEGER, start_time TEXT, '
+                   'duration_minutes INTEGER)')
+        db.execute('CREATE INDEX ix_show_venue_id_start_time ON show (venue_id, start_time)')
+        db.executemany('INSERT INTO show VALUES (1, ?, ?)',
+                       ((start.isoformat(' '), minutes) for start, minutes in shows))
+
+        check = timed_us(schedule.conflict, probes)
+        week = datetime.timedelta(days=7)
+        slots = timed_us(lambda start, end: schedule.free_slots(
+            start, start + week, datetime.timedelta(hours=2)), probes)
+        sql = timed_us(lambda start, end: db.execute(
+            OVERLAP_SQL, (1, end.isoformat(' '), start.isoformat(' '))).fetchone(),
+            probes[:200])
+        print('{:>8} {:>10.2f}us {:>10.2f}us {:>10.2f}us'.format(size, check, slots, sql))
+
+
+if __name__ == '__main__':
+    main()
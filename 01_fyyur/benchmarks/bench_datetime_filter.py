@@ -0,0 +1,80 @@
+"""Micro-benchmark: the old `datetime` filter vs formatting.format_datetime.
+
+Formats 100k show times the way a listing page does, once with the original
+filter (str -> dateutil.parser.parse -> babel.dates.format_datetime) and once
+with the memoized formatter fed datetime objects.
+
+Usage: python benchmarks/bench_datetime_filter.py [--rows N] [--distinct N]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import formatting  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en_US')
+
+
+def show_times(rows, distinct):
+    """Shows mostly start on the hour in the evening, spread over a year."""
+    base = datetime.datetime(2035, 1, 1)
+    pool = [base + datetime.timedelta(days=random.randrange(365),
+                                      hours=random.choice((18, 19, 20, 21)),
+                                      minutes=random.choice((0, 30)))
+            for _ in range(distinct)]
+    return [random.choice(pool) for _ in range(rows)]
+
+
+def timed(label, fn, values):
+    start = time.perf_counter()
+    for value in values:
+        fn(value, 'full')
+    elapsed = time.perf_counter() - start
+    print('{:<34} {:8.3f}s  {:8.2f}us/row'.format(
+        label, elapsed, elapsed / len(values) * 1e6))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--distinct', type=int, default=2000,
+                        help='number of distinct show times among the rows')
+    args = parser.parse_args()
+    random.seed(0)
+    values = show_times(args.rows, args.distinct)
+
+    for value in values[:100]:
+        assert legacy_format_datetime(str(value), 'full') == \
+            formatting.format_datetime(value, 'full')
+
+    print('{} rows, {} distinct times'.format(args.rows, args.distinct))
+    legacy = timed('legacy filter (str + dateutil)', legacy_format_datetime,
+                   [str(v) for v in values])
+    formatting._format.cache_clear()
+    current = timed('formatting.format_datetime', formatting.format_datetime,
+                    values)
+    formatting._format.cache_clear()
+    unique = [datetime.datetime(2035, 1, 1) + datetime.timedelta(minutes=i)
+              for i in range(args.rows)]
+    timed('formatting, every value distinct', formatting.format_datetime,
+          unique)
+    print('speedup: {:.1f}x'.format(legacy / current))
+
+
+if __name__ == '__main__':
+    main()
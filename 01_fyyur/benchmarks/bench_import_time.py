@@ -0,0 +1,124 @@
+"""Worker cold-start report based on `python -X importtime`.
+
+Starts fresh interpreters that import app.py and build the app (what every
+gunicorn worker does on boot), and reports the median wall time, the total
+import time and the most expensive top-level imports. Pass --ref to run the
+same measurement against another git revision of 01_fyyur and print the
+difference:
+
+    python benchmarks/bench_import_time.py --ref HEAD~1
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT = os.path.dirname(HERE)
+
+# works for both the app factory and the older module-level `app`
+BOOT = "import app; getattr(app, 'create_app', lambda: app.app)()"
+
+_line = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(stderr):
+    """Returns (total_us, {module: cumulative_us}).
+
+    The total covers every top-level import; the per-module figures are for
+    modules imported at the top level or directly by one (such as app.py's
+    own imports), which is where deferring an import shows up.
+    """
+    total, modules = 0, {}
+    for line in stderr.splitlines():
+        match = _line.match(line)
+        if not match:
+            continue
+        level = (len(match.group(3)) - 1) // 2
+        cumulative = int(match.group(2))
+        if level == 0:
+            total += cumulative
+        if level <= 1 and match.group(4) != 'app':
+            modules[match.group(4)] = cumulative
+    return total, modules
+
+
+def measure(project_dir, runs):
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'fyyur_import_time.db'))
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    walls, totals, imports = [], [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', BOOT],
+                              cwd=project_dir, env=env, capture_output=True,
+                              text=True)
+        walls.append((time.perf_counter() - started) * 1000)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr[-2000:])
+        total, modules = parse_importtime(proc.stderr)
+        totals.append(total)
+        imports.append(modules)
+    names = set().union(*imports)
+    return {
+        'wall_ms': statistics.median(walls),
+        'import_ms': statistics.median(totals) / 1000.0,
+        'modules_ms': {name: statistics.median(run.get(name, 0) for run in imports)
+                       / 1000.0 for name in names},
+    }
+
+
+def export_ref(ref, target):
+    """Extracts 01_fyyur at ref into target; returns the project path."""
+    top = subprocess.run(['git', 'rev-parse', '--show-toplevel'], cwd=PROJECT,
+                         capture_output=True, text=True, check=True).stdout.strip()
+    prefix = os.path.relpath(PROJECT, top)
+    archive = os.path.join(target, 'ref.tar')
+    subprocess.run(['git', 'archive', '-o', archive, ref, prefix], cwd=top,
+                   check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    return os.path.join(target, prefix)
+
+
+def report(label, result, top):
+    print('{}: boot {:.1f}ms (median wall), imports {:.1f}ms'.format(
+        label, result['wall_ms'], result['import_ms']))
+    slowest = sorted(result['modules_ms'].items(), key=lambda kv: -kv[1])[:top]
+    for name, ms in slowest:
+        print('  {:>8.1f}ms  {}'.format(ms, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of top-level imports listed')
+    parser.add_argument('--ref', help='git revision to compare against')
+    args = parser.parse_args()
+
+    current = measure(PROJECT, args.runs)
+    report('working tree', current, args.top)
+    if not args.ref:
+        return
+
+    with tempfile.TemporaryDirectory() as target:
+        baseline = measure(export_ref(args.ref, target), args.runs)
+    report(args.ref, baseline, args.top)
+    print('\nboot {:+.1f}ms ({:+.0%}), imports {:+.1f}ms'.format(
+        current['wall_ms'] - baseline['wall_ms'],
+        (current['wall_ms'] - baseline['wall_ms']) / baseline['wall_ms'],
+        current['import_ms'] - baseline['import_ms']))
+    gone = sorted(set(baseline['modules_ms']) - set(current['modules_ms']))
+    if gone:
+        print('no longer imported at boot: {}'.format(', '.join(gone)))
+
+
+if __name__ == '__main__':
+    main()
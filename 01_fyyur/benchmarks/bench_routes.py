@@ -0,0 +1,312 @@
+"""Latency / SQL / memory benchmark for every Fyyur route.
+
+Builds a synthetic dataset (see generate_data.py), drives each route in app.py
+through the Flask test client and records p50/p95/p99 latency, SQL statements
+per request and peak Python memory per request. Results are written as JSON;
+pass a previous run with --compare to flag regressions:
+
+    python benchmarks/bench_routes.py --output before.json
+    ... change something ...
+    python benchmarks/bench_routes.py --output after.json --compare before.json
+
+Without DATABASE_URL the run uses a fresh SQLite file. With DATABASE_URL set,
+pass --load to (re)create the schema and load the dataset into that database.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from generate_data import NAME_WORDS, GENRES, generate  # noqa: E402
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def load_ids(app, models):
+    """The ids in the database of each {kind: model}, in id order."""
+    with app.app_context():
+        return {kind: [row.id for row in model.query.with_entities(model.id).
+                       order_by(model.id)]
+                for kind, model in models.items()}
+
+
+def build_scenarios(rng, ids):
+    """Returns (label, endpoint, method, make_request) for every route, with
+    ids = {'venues': [...], 'artists': [...], 'shows': [...]} as loaded.
+
+    Destructive routes come last and each call targets a different row.
+    """
+    def venue():
+        return rng.choice(ids['venues'])
+
+    def artist():
+        return rng.choice(ids['artists'])
+
+    def venue_form():
+        return {'name': 'Bench Venue {}'.format(rng.random()), 'city': 'Austin',
+                'state': 'TX', 'address': '1 Main Street', 'phone': '555-000-0000',
+                'genres': rng.sample(GENRES, 2), 'facebook_link': '',
+                'image_link': ''}
+
+    def artist_form():
+        return {'name': 'Bench Artist {}'.format(rng.random()), 'city': 'Austin',
+                'state': 'TX', 'phone': '555-000-0000',
+                'genres': rng.sample(GENRES, 2), 'facebook_link': '',
+                'image_link': ''}
+
+    def show_form():
+        start = datetime.datetime.now() + datetime.timedelta(
+            days=rng.randint(1, 365), hours=rng.randint(0, 23))
+        return {'venue_id': venue(), 'artist_id': artist(),
+                'start_time': start.isoformat(sep=' ')}
+
+    # deleted from the end, clear of the shows api_show reads
+    kept_shows = ids['shows'][:len(ids['shows']) // 2]
+    doomed_shows = iter(ids['shows'][::-1])
+    doomed_artists = iter(ids['artists'][::-1])
+    doomed_venues = iter(ids['venues'][::-1])
+
+    return [
+        ('GET /', 'index', 'GET', lambda: ('/', None)),
+        ('GET /venues', 'venues', 'GET', lambda: ('/venues', None)),
+        ('GET /venues?genre=', 'venues', 'GET',
+         lambda: ('/venues?genre={}'.format(rng.choice(GENRES[:5])), None)),
+        ('POST /venues/search', 'search_venues', 'POST',
+         lambda: ('/venues/search', {'search_term': rng.choice(NAME_WORDS)})),
+        ('GET /venues/<id>', 'show_venue', 'GET',
+         lambda: ('/venues/{}'.format(venue()), None)),
+        ('GET /venues/create', 'create_venue_form', 'GET',
+         lambda: ('/venues/create', None)),
+        ('POST /venues/create', 'create_venue_submission', 'POST',
+         lambda: ('/venues/create', venue_form())),
+        ('GET /venues/<id>/edit', 'edit_venue', 'GET',
+         lambda: ('/venues/{}/edit'.format(venue()), None)),
+        ('POST /venues/<id>/edit', 'edit_venue_submission', 'POST',
+         lambda: ('/venues/{}/edit'.format(venue()), venue_form())),
+        ('GET /artists', 'artists', 'GET', lambda: ('/artists', None)),
+        ('POST /artists/search', 'search_artists', 'POST',
+         lambda: ('/artists/search', {'search_term': rng.choice(NAME_WORDS)})),
+        ('GET /artists/<id>', 'show_artist', 'GET',
+         lambda: ('/artists/{}'.format(artist()), None)),
+        ('GET /artists/create', 'create_artist_form', 'GET',
+         lambda: ('/artists/create', None)),
+        ('POST /artists/create', 'create_artist_submission', 'POST',
+         lambda: ('/artists/create', artist_form())),
+        ('GET /artists/<id>/edit', 'edit_artist', 'GET',
+         lambda: ('/artists/{}/edit'.format(artist()), None)),
+        ('POST /artists/<id>/edit', 'edit_artist_submission', 'POST',
+         lambda: ('/artists/{}/edit'.format(artist()), artist_form())),
+        ('GET /shows', 'shows', 'GET', lambda: ('/shows', None)),
+        ('GET /shows?upcoming=1', 'shows', 'GET', lambda: ('/shows?upcoming=1', None)),
+        ('GET /shows/create', 'create_shows', 'GET', lambda: ('/shows/create', None)),
+        ('POST /shows/create', 'create_show_submission', 'POST',
+         lambda: ('/shows/create', show_form())),
+        ('GET /venues/<id>/calendar.ics', 'venue_calendar', 'GET',
+         lambda: ('/venues/{}/calendar.ics'.format(venue()), None)),
+        ('GET /artists/<id>/calendar.ics', 'artist_calendar', 'GET',
+         lambda: ('/artists/{}/calendar.ics'.format(artist()), None)),
+        ('GET /venues/<id>/free-slots', 'venue_free_slots', 'GET',
+         lambda: ('/venues/{}/free-slots?days=30'.format(venue()), None)),
+        ('GET /venues/<id>/suggested-artists', 'suggested_artists', 'GET',
+         lambda: ('/venues/{}/suggested-artists'.format(venue()), None)),
+        ('GET /artists/<id>/suggested-venues', 'suggested_venues', 'GET',
+         lambda: ('/artists/{}/suggested-venues?seeking=0'.format(artist()), None)),
+        ('GET /autocomplete', 'autocomplete', 'GET',
+         lambda: ('/autocomplete?q={}'.format(
+             rng.choice(NAME_WORDS)[:rng.randint(1, 4)]), None)),
+        ('GET /api/venues', 'api_venues', 'GET', lambda: ('/api/venues', None)),
+        ('GET /api/venues?fields=', 'api_venues', 'GET',
+         lambda: ('/api/venues?fields=id,name,city', None)),
+        ('GET /api/venues/<id>', 'api_venue', 'GET',
+         lambda: ('/api/venues/{}'.format(venue()), None)),
+        ('GET /api/artists', 'api_artists', 'GET', lambda: ('/api/artists', None)),
+        ('GET /api/artists/<id>', 'api_artist', 'GET',
+         lambda: ('/api/artists/{}'.format(artist()), None)),
+        ('GET /api/shows?upcoming=1', 'api_shows', 'GET',
+         lambda: ('/api/shows?upcoming=1', None)),
+        ('GET /api/shows/<id>', 'api_show', 'GET',
+         lambda: ('/api/shows/{}'.format(rng.choice(kept_shows)), None)),
+        ('DELETE /shows/<id>', 'delete_show', 'DELETE',
+         lambda: ('/shows/{}'.format(next(doomed_shows)), None)),
+        ('DELETE /artists/<id>', 'delete_artist', 'DELETE',
+         lambda: ('/artists/{}'.format(next(doomed_artists)), None)),
+        ('DELETE /venues/<id>', 'delete_venue', 'DELETE',
+         lambda: ('/venues/{}'.format(next(doomed_venues)), None)),
+    ]
+
+
+def check_status(method, url, res):
+    # a 404 or 422 is answered in a statement or two; timing it would
+    # measure the error path instead of the route
+    if not 200 <= res.status_code < 400:
+        raise RuntimeError('{} {} returned {}'.format(method, url, res.status_code))
+
+
+def run_scenario(client, count_queries, method, make_request, requests):
+    latencies, statements = [], []
+    url, data = make_request()
+    # warm-up; reading the body lets streamed views release their connection
+    res = client.open(url, method=method, data=data)
+    res.get_data()
+    check_status(method, url, res)
+    for _ in range(requests):
+        url, data = make_request()
+        with count_queries() as stats:
+            started = time.perf_counter()
+            res = client.open(url, method=method, data=data)
+            res.get_data()
+            latencies.append((time.perf_counter() - started) * 1000)
+        check_status(method, url, res)
+        statements.append(stats.count)
+
+    url, data = make_request()
+    tracemalloc.start()
+    try:
+        res = client.open(url, method=method, data=data)
+        res.get_data()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    check_status(method, url, res)
+
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'sql_statements': percentile(statements, 50),
+        'sql_statements_max': max(statements),
+        'peak_memory_kib': round(peak / 1024.0, 1),
+    }
+
+
+def load_dataset(app, db, sizes, seed):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    with tempfile.TemporaryDirectory() as data_dir:
+        paths = generate(data_dir, sizes['venues'], sizes['artists'],
+                         sizes['shows'], seed)
+        runner = app.test_cli_runner()
+        for kind, path in paths.items():
+            result = runner.invoke(args=['import-data', kind, path])
+            if result.exit_code != 0:
+                raise RuntimeError(result.output)
+            print(result.output.strip().splitlines()[-1])
+
+
+def compare(baseline, current, tolerance):
+    """Prints per-route changes; returns the labels that regressed."""
+    regressed = []
+    print('\n{:<28} {:>10} {:>10} {:>8} {:>9}'.format(
+        'route', 'base p95', 'new p95', 'change', 'sql'))
+    for label, new in current['routes'].items():
+        old = baseline['routes'].get(label)
+        if old is None:
+            print('{:<28} {:>10} {:>10.2f}'.format(label, '-', new['p95_ms']))
+            continue
+        change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0
+        flag = ''
+        if change > tolerance or new['sql_statements'] > old['sql_statements']:
+            flag = '  REGRESSION'
+            regressed.append(label)
+        print('{:<28} {:>10.2f} {:>10.2f} {:>+7.0%} {:>4}->{:<4}{}'.format(
+            label, old['p95_ms'], new['p95_ms'], change,
+            old['sql_statements'], new['sql_statements'], flag))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=10000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=50,
+                        help='timed requests per route')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache', action='store_true',
+                        help='leave the page cache on (off by default)')
+    parser.add_argument('--load', action='store_true',
+                        help='load the dataset into DATABASE_URL')
+    parser.add_argument('--output', default='bench_routes.json')
+    parser.add_argument('--compare', metavar='BASELINE_JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative p95 increase before flagging')
+    args = parser.parse_args()
+
+    load = args.load
+    if not os.environ.get('DATABASE_URL'):
+        db_path = os.path.join(tempfile.mkdtemp(), 'fyyur_bench.db')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+        load = True
+
+    import app as fyyur
+    from sql_stats import count_queries
+
+    app, db = fyyur.create_app(), fyyur.db
+    app.config['PAGE_CACHE_ENABLED'] = args.cache
+    sizes = {'venues': args.venues, 'artists': args.artists, 'shows': args.shows}
+    if load:
+        load_dataset(app, db, sizes, args.seed)
+
+    rng = random.Random(args.seed)
+    # the ids actually loaded, not range(sizes[...]): rows import-data
+    # rejected, or an existing database, would leave holes
+    ids = load_ids(app, {'venues': fyyur.Venue, 'artists': fyyur.Artist,
+                         'shows': fyyur.Show})
+    scenarios = build_scenarios(rng, ids)
+    covered = {endpoint for _, endpoint, _, _ in scenarios}
+    uncovered = sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                       if rule.endpoint != 'static' and rule.endpoint not in covered)
+    if uncovered:
+        print('routes without a scenario: {}'.format(', '.join(uncovered)))
+
+    # no cookies: flashed messages from the write routes would pile up
+    client = app.test_client(use_cookies=False)
+    results = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+            'dataset': sizes,
+            'requests_per_route': args.requests,
+            'page_cache': args.cache,
+        },
+        'routes': {},
+    }
+    for label, endpoint, method, make_request in scenarios:
+        stats = run_scenario(client, count_queries, method, make_request, args.requests)
+        results['routes'][label] = stats
+        print('{:<28} p50 {:8.2f}ms  p95 {:8.2f}ms  p99 {:8.2f}ms  '
+              'sql {:>3}  peak {:>8.1f}KiB'.format(
+                  label, stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+                  stats['sql_statements'], stats['peak_memory_kib']))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('\nwrote {}'.format(args.output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
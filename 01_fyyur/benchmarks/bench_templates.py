@@ -0,0 +1,86 @@
+"""Cold template load cost: compiling vs the bytecode cache vs precompiled.
+
+For every template, reports the median time a fresh Jinja environment takes
+to get it ready for its first render:
+
+* compile     - no bytecode cache: parse and compile the source (the first
+                request rendering that page in a new worker, before this
+                change),
+* bytecode    - load the compiled code from a warm FileSystemBytecodeCache
+                (what precompilation costs per template on a restart),
+* precompiled - the template was loaded by create_app(), so the first render
+                only checks that it is up to date.
+
+Usage: python benchmarks/bench_templates.py [--runs N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+import app as fyyur  # noqa: E402
+import template_cache  # noqa: E402
+
+
+def fresh_env(app, bytecode_cache=None):
+    env = app.create_jinja_environment()
+    env.filters.update(app.jinja_env.filters)
+    env.bytecode_cache = bytecode_cache
+    return env
+
+
+def load_ms(env, name):
+    started = time.perf_counter()
+    env.get_template(name)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=15)
+    args = parser.parse_args()
+
+    app = fyyur.create_app({'TEMPLATE_BYTECODE_CACHE': False,
+                            'TEMPLATE_PRECOMPILE': False})
+    names = template_cache.template_names(app.jinja_env)
+    timings = {name: {'compile': [], 'bytecode': [], 'precompiled': []}
+               for name in names}
+
+    with tempfile.TemporaryDirectory() as directory:
+        bytecode_cache = FileSystemBytecodeCache(directory)
+        warm = fresh_env(app, bytecode_cache)
+        for name in names:
+            warm.get_template(name)
+        for _ in range(args.runs):
+            for name in names:
+                timings[name]['compile'].append(load_ms(fresh_env(app), name))
+                timings[name]['bytecode'].append(
+                    load_ms(fresh_env(app, bytecode_cache), name))
+                timings[name]['precompiled'].append(load_ms(warm, name))
+
+    print('{:<28} {:>10} {:>10} {:>12} {:>10}'.format(
+        'template', 'compile', 'bytecode', 'precompiled', 'saved'))
+    totals = dict.fromkeys(('compile', 'bytecode', 'precompiled'), 0.0)
+    for name in names:
+        medians = {kind: statistics.median(values)
+                   for kind, values in timings[name].items()}
+        for kind, value in medians.items():
+            totals[kind] += value
+        print('{:<28} {:>8.2f}ms {:>8.2f}ms {:>10.3f}ms {:>8.2f}ms'.format(
+            name, medians['compile'], medians['bytecode'],
+            medians['precompiled'], medians['compile'] - medians['precompiled']))
+    print('{:<28} {:>8.2f}ms {:>8.2f}ms {:>10.3f}ms {:>8.2f}ms'.format(
+        'total', totals['compile'], totals['bytecode'], totals['precompiled'],
+        totals['compile'] - totals['precompiled']))
+    print('\nstart-up precompile: {:.1f}ms from source, {:.1f}ms from the '
+          'bytecode cache'.format(totals['compile'], totals['bytecode']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Synthetic Fyyur dataset generator.
+
+Writes venues.csv, artists.csv and shows.csv in the format `flask import-data`
+reads, streaming rows to disk so memory stays flat at any size:
+
+    python benchmarks/generate_data.py --out data/ \\
+        --venues 10000 --artists 100000 --shows 1000000
+    flask import-data venues data/venues.csv
+    flask import-data artists data/artists.csv
+    flask import-data shows data/shows.csv
+
+Genres, cities and bookings follow skewed distributions (a few popular genres,
+cities and artists dominate), show dates span three years back to one year
+ahead and cluster on evenings and weekends. No two shows at a venue overlap,
+as import-data rejects those: once a popular venue's evenings are all taken,
+its further shows go to other venues.
+"""
+import argparse
+import bisect
+import csv
+import datetime
+import itertools
+import os
+import random
+
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+          'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+          'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll',
+          'Soul', 'Other']
+CITIES = [('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'),
+          ('Houston', 'TX'), ('Phoenix', 'AZ'), ('Philadelphia', 'PA'),
+          ('San Antonio', 'TX'), ('San Diego', 'CA'), ('Dallas', 'TX'),
+          ('San Francisco', 'CA'), ('Austin', 'TX'), ('Seattle', 'WA'),
+          ('Denver', 'CO'), ('Nashville', 'TN'), ('Portland', 'OR'),
+          ('New Orleans', 'LA'), ('Atlanta', 'GA'), ('Boston', 'MA'),
+          ('Detroit', 'MI'), ('Minneapolis', 'MN')]
+NAME_WORDS = ['The', 'Blue', 'Velvet', 'Electric', 'Midnight', 'Golden',
+              'Wild', 'Sax', 'Lounge', 'Hall', 'Room', 'Garden', 'Stage',
+              'Petals', 'Hop', 'Social', 'Club', 'Echo', 'Neon', 'Harbor',
+              'Union', 'Foundry', 'Static', 'Lantern', 'Copper', 'Fox']
+SPAN_DAYS = 4 * 365
+SHOW_MINUTES = 120
+# show start hours, one show length apart so a venue's shows can follow one
+# another, and how often each is picked
+SLOT_HOURS = (16, 18, 20, 22)
+SLOT_WEIGHTS = (1, 2, 3, 3)
+
+
+class ZipfChoice(object):
+    """Picks items with probability proportional to 1 / rank ** skew."""
+
+    def __init__(self, items, skew=1.1, rng=random):
+        self.items = list(items)
+        self.rng = rng
+        weights = [1.0 / (rank ** skew) for rank in range(1, len(self.items) + 1)]
+        self.cumulative = list(itertools.accumulate(weights))
+
+    def __call__(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return self.items[bisect.bisect(self.cumulative, point)]
+
+
+class VenueSlots(object):
+    """Bitmaps of the (day, start hour) slots taken at each venue.
+
+    Memory grows with the number of venues that have shows, not with the
+    number of shows.
+    """
+
+    def __init__(self, days, per_day):
+        self.size = days * per_day
+        self._taken = {}   # venue id -> bytearray with a bit per slot
+        self._used = {}    # venue id -> number of slots taken
+
+    def is_full(self, venue_id):
+        return self._used.get(venue_id, 0) >= self.size
+
+    def take(self, venue_id, slot):
+        """Takes slot at the venue, or the first free one after it (wrapping
+        around); returns the slot taken. The venue must not be full."""
+        taken = self._taken.get(venue_id)
+        if taken is None:
+            taken = self._taken[venue_id] = bytearray((self.size + 7) // 8)
+        while taken[slot >> 3] & (1 << (slot & 7)):
+            slot = (slot + 1) % self.size
+        taken[slot >> 3] |= 1 << (slot & 7)
+        self._used[venue_id] = self._used.get(venue_id, 0) + 1
+        return slot
+
+
+def entity_name(rng, number):
+    words = rng.sample(NAME_WORDS, rng.randint(2, 3))
+    return '{} {}'.format(' '.join(words), number)
+
+
+def entity_genres(rng, pick_genre):
+    return ';'.join(sorted({pick_genre() for _ in range(rng.randint(1, 3))}))
+
+
+def venue_rows(count, rng):
+    pick_genre, pick_city = ZipfChoice(GENRES, rng=rng), ZipfChoice(CITIES, rng=rng)
+    for venue_id in range(1, count + 1):
+        city, state = pick_city()
+        yield {'id': venue_id, 'name': entity_name(rng, venue_id),
+               'city': city, 'state': state,
+               'address': '{} Main Street'.format(rng.randint(1, 9999)),
+               'phone': '555-{:03d}-{:04d}'.format(rng.randint(0, 999),
+                                                   rng.randint(0, 9999)),
+               'genres': entity_genres(rng, pick_genre),
+               'seeking_talent': rng.random() < 0.3}
+
+
+def artist_rows(count, rng):
+    pick_genre, pick_city = ZipfChoice(GENRES, rng=rng), ZipfChoice(CITIES, rng=rng)
+    for artist_id in range(1, count + 1):
+        city, state = pick_city()
+        yield {'id': artist_id, 'name': entity_name(rng, artist_id),
+               'city': city, 'state': state,
+               'phone': '555-{:03d}-{:04d}'.format(rng.randint(0, 999),
+                                                   rng.randint(0, 9999)),
+               'genres': entity_genres(rng, pick_genre),
+               'seeking_venues': rng.random() < 0.3}
+
+
+def show_rows(count, venues, artists, rng, now=None):
+    now = now or datetime.datetime.now()
+    first_day = (now - datetime.timedelta(days=3 * 365)).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    slots = VenueSlots(SPAN_DAYS, len(SLOT_HOURS))
+    if count > venues * slots.size:
+        raise ValueError('{} shows do not fit at {} venues without overlapping'.format(
+            count, venues))
+    pick_venue = ZipfChoice(range(1, venues + 1), skew=0.8, rng=rng)
+    pick_artist = ZipfChoice(range(1, artists + 1), skew=0.9, rng=rng)
+    hours = range(len(SLOT_HOURS))
+    for _ in range(count):
+        venue_id = pick_venue()
+        while slots.is_full(venue_id):
+            venue_id = pick_venue()
+        day = rng.randrange(SPAN_DAYS)
+        weekday = (first_day + datetime.timedelta(days=day)).weekday()
+        if weekday < 4 and rng.random() < 0.4:
+            # pull some weekday shows onto the following weekend
+            day = min(day + 4 - weekday + rng.randint(0, 2), SPAN_DAYS - 1)
+        slot = day * len(SLOT_HOURS) + rng.choices(hours, SLOT_WEIGHTS)[0]
+        day, hour = divmod(slots.take(venue_id, slot), len(SLOT_HOURS))
+        start = first_day + datetime.timedelta(days=day, hours=SLOT_HOURS[hour])
+        yield {'venue_id': venue_id, 'artist_id': pick_artist(),
+               'start_time': start.isoformat(sep=' '),
+               'duration_minutes': SHOW_MINUTES}
+
+
+def write_csv(path, rows):
+    written = 0
+    with open(path, 'w', newline='') as f:
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+            written += 1
+    return written
+
+
+def generate(out_dir, venues, artists, shows, seed=0):
+    """Writes the three CSV files; returns {kind: path} in load order."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {kind: os.path.join(out_dir, kind + '.csv')
+             for kind in ('venues', 'artists', 'shows')}
+    write_csv(paths['venues'], venue_rows(venues, rng))
+    write_csv(paths['artists'], artist_rows(artists, rng))
+    write_csv(paths['shows'], show_rows(shows, venues, artists, rng))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', default='data')
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    paths = generate(args.out, args.venues, args.artists, args.shows, args.seed)
+    for kind, path in paths.items():
+        print('wrote {}'.format(path))
+
+
+if __name__ == '__main__':
+    main()
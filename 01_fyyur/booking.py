@@ -0,0 +1,175 @@
+"""Per-venue booking schedules: overlap checks and free-slot search.
+
+A show occupies its venue for [start, start + duration). VenueSchedule keeps
+a venue's bookings as two parallel lists sorted by start; because bookings
+never overlap, the ends are sorted too, so whether a new booking collides is
+decided by the two neighbours found with one bisection, and the free slots
+in a window are the gaps between the bookings that bisection leads to.
+
+Bookings holds the schedules of the venues seen so far, loading each on
+first use and reloading it after max_age seconds, so that bookings made by
+other processes are picked up. Checking and reserving happen under one
+lock, so two requests in a process cannot both take the same slot; across
+processes the database has the last word (an exclusion constraint on
+Postgres), after which the venue's schedule should be dropped.
+"""
+import bisect
+import datetime
+import threading
+import time
+
+DEFAULT_SHOW_MINUTES = 120
+# longest show the forms accept
+MAX_SHOW_MINUTES = 24 * 60
+
+# recurrence rule -> days between occurrences
+REPEAT_DAYS = {'weekly': 7, 'biweekly': 14}
+
+
+class BookingConflict(Exception):
+    """The venue is already booked from start to end."""
+
+    def __init__(self, start, end):
+        super().__init__(start, end)
+        self.start = start
+        self.end = end
+
+
+class VenueSchedule(object):
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, bookings=()):
+        """bookings are (start, end) pairs, sorted by start."""
+        self.starts = []
+        self.ends = []
+        for start, end in bookings:
+            self.starts.append(start)
+            self.ends.append(end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def conflict(self, start, end):
+        """Returns the (start, end) of a booking overlapping [start, end)."""
+        i = bisect.bisect_right(self.starts, start)
+        if i and self.ends[i - 1] > start:
+            return self.starts[i - 1], self.ends[i - 1]
+        if i < len(self.starts) and self.starts[i] < end:
+            return self.starts[i], self.ends[i]
+        return None
+
+    def add_many(self, bookings):
+        """Adds (start, end) bookings sorted by start, all of them or none."""
+        previous = None
+        for start, end in bookings:
+            if previous is not None and start < previous[1]:
+                raise BookingConflict(*previous)
+            clash = self.conflict(start, end)
+            if clash:
+                raise BookingConflict(*clash)
+            previous = (start, end)
+        for start, end in bookings:
+            i = bisect.bisect_right(self.starts, start)
+            self.starts.insert(i, start)
+            self.ends.insert(i, end)
+
+    def remove(self, start):
+        i = bisect.bisect_left(self.starts, start)
+        if i < len(self.starts) and self.starts[i] == start:
+            del self.starts[i]
+            del self.ends[i]
+
+    def free_slots(self, window_start, window_end, min_length):
+        """Returns the free (start, end) gaps of at least min_length
+        (a timedelta) within [window_start, window_end)."""
+        slots = []
+        cursor = window_start
+        i = max(bisect.bisect_right(self.starts, window_start) - 1, 0)
+        while i < len(self.starts) and self.starts[i] < window_end:
+            if self.ends[i] > cursor:
+                if self.starts[i] - cursor >= min_length:
+                    slots.append((cursor, self.starts[i]))
+                cursor = self.ends[i]
+            i += 1
+        if window_end - cursor >= min_length:
+            slots.append((cursor, window_end))
+        return slots
+
+
+class Bookings(object):
+    """VenueSchedules by venue id, loaded with loader(venue_id)."""
+
+    def __init__(self, loader, max_age=60, clock=time.monotonic):
+        self.loader = loader
+        self.max_age = max_age
+        self._clock = clock
+        self._schedules = {}   # venue id -> (loaded at, VenueSchedule)
+        self._lock = threading.RLock()
+
+    def schedule(self, venue_id):
+        with self._lock:
+            entry = self._schedules.get(venue_id)
+            now = self._clock()
+            if entry is None or now - entry[0] > self.max_age:
+                entry = self._schedules[venue_id] = (
+                    now, VenueSchedule(self.loader(venue_id)))
+            return entry[1]
+
+    def reserve(self, venue_id, bookings):
+        """Books every (start, end) of bookings (sorted by start) at the
+        venue, or none of them if any conflicts (BookingConflict)."""
+        with self._lock:
+            self.schedule(venue_id).add_many(bookings)
+
+    def release(self, venue_id, starts):
+        with self._lock:
+            entry = self._schedules.get(venue_id)
+            if entry is not None:
+                for start in starts:
+                    entry[1].remove(start)
+
+    def drop(self, venue_id=None):
+        """Forgets one venue's schedule, or every schedule."""
+        with self._lock:
+            if venue_id is None:
+                self._schedules.clear()
+            else:
+                self._schedules.pop(venue_id, None)
+
+
+def naive_local(value):
+    """Show times are naive local times; converts an aware datetime (e.g.
+    one parsed from '2035-04-01T20:00:00.000Z') to one."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def show_end(start, duration_minutes):
+    return start + datetime.timedelta(minutes=duration_minutes)
+
+
+def expand_series(start, repeat=None, until=None, count=None, limit=52):
+    """Returns the start times of a show repeated weekly or biweekly.
+
+    The series ends after count occurrences or on the until date, whichever
+    comes first; without a repeat rule it is just start. Raises ValueError
+    for an unknown rule, an open-ended series or one longer than limit.
+    """
+    if not repeat:
+        return [start]
+    if repeat not in REPEAT_DAYS:
+        raise ValueError('unknown repeat rule: {}'.format(repeat))
+    if until is None and count is None:
+        raise ValueError('a repeating show needs an end date or a count')
+    step = datetime.timedelta(days=REPEAT_DAYS[repeat])
+    starts = []
+    while ((count is None or len(starts) < count) and
+           (until is None or start.date() <= until)):
+        if len(starts) == limit:
+            raise ValueError('a series may have at most {} shows'.format(limit))
+        starts.append(start)
+        start += step
+    if not starts:
+        raise ValueError('the series ends before it starts')
+    return starts
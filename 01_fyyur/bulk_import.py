@@ -0,0 +1,154 @@
+"""Streaming bulk loader used by the `flask import-data` command.
+
+Records are read lazily from CSV or JSON-lines files, coerced to the column
+types of the target table and written in batches: COPY ... FROM STDIN on
+Postgres (psycopg2), a single executemany INSERT everywhere else.
+"""
+import csv
+import datetime
+import io
+import itertools
+import json
+import os
+
+import dateutil.parser
+import sqlalchemy as sa
+
+
+def read_records(path):
+    """Yields one dict per CSV row or JSON line, without loading the file."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline='') as f:
+        if ext == '.csv':
+            for record in csv.DictReader(f):
+                yield record
+        elif ext in ('.jsonl', '.ndjson', '.json'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            raise ValueError('unsupported file type: {}'.format(path))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 't', 'yes', 'y')
+
+
+def _to_list(value):
+    if isinstance(value, list):
+        return value
+    value = value.strip()
+    if value.startswith('['):
+        return json.loads(value)
+    return [v.strip() for v in value.split(';') if v.strip()]
+
+
+def _to_datetime(value):
+    if not isinstance(value, str):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+
+
+def _converter(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = None
+    if isinstance(column.type, (sa.ARRAY, sa.JSON)) or python_type is list:
+        return _to_list
+    if python_type is bool:
+        return _to_bool
+    if python_type is int:
+        return int
+    if python_type is not None and issubclass(python_type, (str,)):
+        return str
+    if isinstance(column.type, sa.DateTime):
+        return _to_datetime
+    return lambda value: value
+
+
+def make_coercer(table):
+    """Returns a function that turns a raw record into a row for table.
+
+    Keys that are not columns of the table are ignored; empty strings (as
+    CSV has no NULL) become None, and columns left out fall back to their
+    Python-side defaults.
+    """
+    converters = {c.name: _converter(c) for c in table.columns}
+    defaults = {c.name: c.default.arg for c in table.columns
+                if c.default is not None and c.default.is_scalar}
+
+    def coerce(record):
+        row = {}
+        for name, convert in converters.items():
+            value = record.get(name)
+            if value is None or value == '':
+                if name in defaults:
+                    row[name] = defaults[name]
+                continue
+            row[name] = convert(value)
+        return row
+
+    return coerce
+
+
+def _copy_field(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, list):
+        value = '{' + ','.join(
+            '"{}"'.format(str(v).replace('\\', '\\\\').replace('"', '\\"'))
+            for v in value) + '}'
+    return '"{}"'.format(str(value).replace('"', '""'))
+
+
+def copy_rows(connection, table, rows):
+    """Loads rows with COPY FROM STDIN; returns False if the driver can't."""
+    cursor = connection.connection.cursor()
+    if not hasattr(cursor, 'copy_expert'):
+        return False
+    names = list(rows[0])
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(','.join(_copy_field(row[name]) for name in names))
+        buf.write('\n')
+    buf.seek(0)
+    cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        table.name, ', '.join('"{}"'.format(n) for n in names)), buf)
+    return True
+
+
+def insert_batch(connection, table, rows):
+    # every row needs the same keys for one executemany/COPY column list
+    names = sorted({name for row in rows for name in row})
+    rows = [{name: row.get(name) for name in names} for row in rows]
+    if connection.dialect.name == 'postgresql' and copy_rows(connection, table, rows):
+        return
+    connection.execute(table.insert(), rows)
+
+
+def reset_id_sequence(connection, table):
+    """Moves a Postgres serial past explicitly imported ids."""
+    if connection.dialect.name == 'postgresql':
+        connection.execute(sa.text(
+            "SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), "
+            "coalesce(max(id), 1)) FROM \"{0}\"".format(table.name)))
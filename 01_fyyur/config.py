@@ -1,5 +1,8 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Signs the session cookie, which carries flashed messages and read-replica
+# stickiness, so every worker must use the same key. Without one, create_app()
+# makes a random key for its process, which is refused when replicas are used.
+SECRET_KEY = os.environ.get('SECRET_KEY')
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -10,4 +13,107 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://tylerbyers@localhost:5432/fyyur'
+# DATABASE_URL overrides the default, e.g. sqlite:///fyyur.db for local dev.
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgresql://tylerbyers@localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Read replicas, e.g. DATABASE_REPLICA_URLS=postgresql://replica1/fyyur,...
+# GET requests read from one of them (see replicas.py); writes, and reads by
+# a session for REPLICA_STICKY_SECONDS after it wrote, use the primary.
+DATABASE_REPLICA_URLS = [url.strip() for url in
+                         os.environ.get('DATABASE_REPLICA_URLS', '').split(',')
+                         if url.strip()]
+SQLALCHEMY_BINDS = {'replica_{}'.format(i): url
+                    for i, url in enumerate(DATABASE_REPLICA_URLS)}
+REPLICA_STICKY_SECONDS = 10
+
+# Number of venue/artist search results rendered per page, and seconds before
+# a worker rebuilds its in-process name index (non-Postgres databases only) to
+# pick up other workers' names
+SEARCH_RESULTS_PER_PAGE = 20
+SEARCH_INDEX_MAX_AGE = 300
+
+# Number of shows rendered per /shows page
+SHOWS_PER_PAGE = 50
+
+# Locale and timezone used by the templates' datetime filter
+DATETIME_LOCALE = 'en_US'
+DATETIME_TIMEZONE = 'UTC'
+
+# Rendered /venues, /artists and /shows pages kept per worker process. A write
+# only invalidates the pages cached by the worker that handled it; the other
+# workers keep serving their copies until the TTL runs out, so PAGE_CACHE_TTL
+# is how stale a page may be after a write. With a single worker process the
+# TTL can be raised freely.
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_MAX_ENTRIES = 256
+PAGE_CACHE_TTL = 30
+
+# Log a possible N+1 warning when one statement shape runs more often than
+# this within a single request
+SQL_REPEATED_STATEMENT_LIMIT = 10
+
+# Rows fetched per round trip while streaming /api listings
+API_STREAM_BATCH_SIZE = 500
+
+# Completions returned (and kept per prefix) by /autocomplete, and seconds
+# before a worker rebuilds its index to pick up other workers' names
+AUTOCOMPLETE_MAX_RESULTS = 10
+AUTOCOMPLETE_MAX_AGE = 300
+
+# Compiled templates are kept on disk across restarts; None uses Jinja's
+# per-user directory under the system temp dir
+TEMPLATE_BYTECODE_CACHE = True
+TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR')
+# Load every template while the app is created instead of on first render
+TEMPLATE_PRECOMPILE = True
+
+# Shows fetched per round trip while streaming a calendar feed
+CALENDAR_STREAM_BATCH_SIZE = 500
+
+# Suggestions returned by /venues/<id>/suggested-artists and
+# /artists/<id>/suggested-venues, and seconds before a worker reloads the genre
+# matchers behind them to pick up other workers' writes
+SUGGESTIONS_MAX_RESULTS = 10
+GENRE_MATCHER_MAX_AGE = 300
+
+# Server-sent show events (/shows/events): events queued per subscriber before
+# the oldest are dropped, events kept for clients resuming with Last-Event-ID,
+# seconds between keepalive comments, and open streams allowed per process
+SHOW_EVENTS_QUEUE_SIZE = 100
+SHOW_EVENTS_HISTORY_SIZE = 1000
+SHOW_EVENTS_HEARTBEAT_SECONDS = 15
+SHOW_EVENTS_MAX_SUBSCRIBERS = 5000
+
+# Seconds a venue's booking schedule is trusted before it is reloaded, which
+# picks up shows booked by other processes; and the widest free-slots window
+BOOKING_SCHEDULE_MAX_AGE = 60
+FREE_SLOTS_MAX_DAYS = 92
+
+# Longest recurring series a single show submission may create
+SHOW_SERIES_MAX_SHOWS = 52
+
+# Error and request log, written as JSON lines by a background thread when not
+# in debug mode (see log_queue.py). It is rotated every LOG_ROTATE_WHEN if set
+# (a TimedRotatingFileHandler interval such as 'midnight'), otherwise when it
+# reaches LOG_MAX_BYTES.
+LOG_FILE = os.environ.get('LOG_FILE', os.path.join(basedir, 'error.log'))
+LOG_LEVEL = 'INFO'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN')
+LOG_BACKUP_COUNT = 5
+# Records waiting for the writer thread; once full, new ones are dropped
+LOG_QUEUE_SIZE = 10000
+# Fraction of the records of a level that are written; unlisted levels are
+# written in full. One INFO line is logged per request when LOG_REQUESTS is set.
+LOG_SAMPLE_RATES = {'DEBUG': 0.01, 'INFO': 0.1}
+LOG_REQUESTS = True
+
+# A write handler's transaction is run up to TRANSACTION_MAX_ATTEMPTS times
+# when it hits a serialization failure or deadlock. Before retry n it sleeps a
+# random time of up to TRANSACTION_RETRY_BASE_DELAY * 2**(n-1) seconds, capped
+# at TRANSACTION_RETRY_MAX_DELAY (see transactions.py).
+TRANSACTION_MAX_ATTEMPTS = 3
+TRANSACTION_RETRY_BASE_DELAY = 0.02
+TRANSACTION_RETRY_MAX_DELAY = 0.5
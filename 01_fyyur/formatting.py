@@ -0,0 +1,50 @@
+"""Datetime formatting behind the templates' `datetime` filter.
+
+Views hand the filter `datetime` objects straight from the database, so no
+string parsing happens per row. The Babel pattern, locale and timezone for
+each (format, locale, timezone) combination are resolved once, and recently
+formatted values are memoized, since listing pages repeat the same show times
+over and over.
+
+Babel and dateutil are imported on first use rather than with this module, so
+importing the app does not pay for them until a page is rendered.
+"""
+import datetime
+import functools
+
+NAMED_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+# number of recently formatted (value, format, locale, timezone) results kept
+RESULT_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=64)
+def compiled_format(format, locale, timezone):
+    """Returns the parsed Babel pattern, Locale and tzinfo for a format."""
+    from babel.core import Locale
+    from babel.dates import get_timezone, parse_pattern
+
+    pattern = parse_pattern(NAMED_FORMATS.get(format, format))
+    return pattern, Locale.parse(locale), get_timezone(timezone)
+
+
+@functools.lru_cache(maxsize=RESULT_CACHE_SIZE)
+def _format(value, format, locale, timezone):
+    pattern, locale, tzinfo = compiled_format(format, locale, timezone)
+    # naive datetimes are stored as UTC, matching babel.dates.format_datetime
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return pattern.apply(value.astimezone(tzinfo), locale)
+
+
+def format_datetime(value, format='medium', locale='en_US', timezone='UTC'):
+    """Formats a datetime (or, for old callers, a datetime string)."""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return _format(value, format, locale, timezone)
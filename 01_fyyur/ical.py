@@ -0,0 +1,88 @@
+"""iCalendar (RFC 5545) encoding for the venue and artist show feeds.
+
+iter_calendar() encodes an iterator of events as a VCALENDAR, chunk_size
+events per yielded byte chunk, so a feed can be streamed straight from a
+database cursor. Show times are naive local times at the venue and are
+written as floating times (no TZID, no Z), which calendar clients show
+unchanged.
+"""
+
+# content lines longer than this many octets are folded (RFC 5545 3.1)
+MAX_LINE_OCTETS = 75
+PRODID = '-//Fyyur//Show Calendar//EN'
+
+
+def escape_text(value):
+    """Escapes a TEXT property value (RFC 5545 3.3.11)."""
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Splits a content line into CRLF-terminated lines of at most 75 octets."""
+    data = line.encode('utf-8')
+    if len(data) <= MAX_LINE_OCTETS:
+        return data + b'\r\n'
+    parts = []
+    start, limit = 0, MAX_LINE_OCTETS
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # never split a multi-byte character
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end])
+        start, limit = end, MAX_LINE_OCTETS - 1  # continuation lines start with a space
+    return b'\r\n '.join(parts) + b'\r\n'
+
+
+def format_local(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def format_utc(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def event_lines(event, stamp):
+    """event is a dict with uid, start and summary, optionally end, location
+    and url."""
+    lines = [
+        'BEGIN:VEVENT',
+        'UID:' + event['uid'],
+        'DTSTAMP:' + format_utc(stamp),
+        'DTSTART:' + format_local(event['start']),
+        'SUMMARY:' + escape_text(event['summary']),
+    ]
+    if event.get('end'):
+        lines.append('DTEND:' + format_local(event['end']))
+    if event.get('location'):
+        lines.append('LOCATION:' + escape_text(event['location']))
+    if event.get('url'):
+        lines.append('URL:' + event['url'])
+    lines.append('END:VEVENT')
+    return b''.join(fold(line) for line in lines)
+
+
+def iter_calendar(name, events, stamp, chunk_size=100):
+    """Yields a VCALENDAR holding events as byte chunks.
+
+    stamp (naive UTC) is written as every event's DTSTAMP; passing the time
+    the feed last changed keeps the output identical until it changes again.
+    """
+    yield b''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:' + PRODID,
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:' + escape_text(name),
+    ))
+    chunk = []
+    for event in events:
+        chunk.append(event_lines(event, stamp))
+        if len(chunk) >= chunk_size:
+            yield b''.join(chunk)
+            chunk = []
+    if chunk:
+        yield b''.join(chunk)
+    yield fold('END:VCALENDAR')
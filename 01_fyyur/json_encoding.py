@@ -0,0 +1,75 @@
+"""JSON encoding for API responses.
+
+orjson is used when it is installed (it serializes datetimes, dates and UUIDs
+natively and is several times faster than the standard library); otherwise
+everything falls back to json with an equivalent default() hook. The same
+dumps() backs Flask's jsonify through OrjsonProvider, and iter_json_array()
+encodes a row iterator as a JSON array chunk by chunk so long listings can be
+streamed without building the whole document in memory.
+"""
+import datetime
+import decimal
+import json
+import uuid
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError('Object of type {} is not JSON serializable'.format(
+        type(value).__name__))
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value):
+        """Encodes value as UTF-8 JSON bytes."""
+        return orjson.dumps(value, default=_default, option=_OPTIONS)
+else:
+    def dumps(value):
+        """Encodes value as UTF-8 JSON bytes."""
+        return json.dumps(value, default=_default, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+
+def iter_json_array(items, chunk_size=100):
+    """Yields a JSON array of items as byte chunks of chunk_size elements."""
+    yield b'['
+    chunk = []
+    first = True
+    for item in items:
+        chunk.append(dumps(item))
+        if len(chunk) >= chunk_size:
+            yield (b'' if first else b',') + b','.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield (b'' if first else b',') + b','.join(chunk)
+    yield b']'
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Routes jsonify() and app.json through dumps()."""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
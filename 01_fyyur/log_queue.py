@@ -0,0 +1,187 @@
+"""Queued, structured logging for the error and request logs.
+
+Request threads only sample a record and put it on an in-memory queue
+(QueueHandler); a QueueListener thread formats the records as JSON lines and
+writes them to a rotating file, so disk latency never reaches a request. When
+the queue is full, records are counted and dropped rather than waited for.
+Tracebacks and message arguments are rendered before a record is queued, so
+nothing belonging to the request outlives it on the queue.
+"""
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import time
+
+from flask import g, request
+from flask.logging import default_handler
+
+from json_encoding import dumps
+
+# attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord(
+    '', logging.INFO, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object, with its extra= fields."""
+
+    def format(self, record):
+        entry = {
+            'time': '{}.{:03d}Z'.format(
+                time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)),
+                int(record.msecs)),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'path': record.pathname,
+            'line': record.lineno,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        try:
+            return dumps(entry).decode('utf-8')
+        except TypeError:
+            return dumps({key: value if isinstance(value, (str, int, float))
+                          else repr(value) for key, value in entry.items()}).decode('utf-8')
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records of each level.
+
+    rates maps level names or numbers to the fraction kept, e.g. {'INFO': 0.1}
+    keeps every tenth INFO record; levels not listed are always kept. Sampling
+    is by count rather than at random, so the kept records are evenly spread.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {}
+        for level, rate in rates.items():
+            if isinstance(level, str):
+                level = logging.getLevelName(level.upper())
+            self.rates[level] = min(max(float(rate), 0.0), 1.0)
+        # accumulated fraction of a record per level; concurrent updates can
+        # lose an increment, which only makes the sampling approximate
+        self._credit = dict.fromkeys(self.rates, 0.0)
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        if rate is None or rate >= 1.0:
+            return True
+        credit = self._credit[record.levelno] + rate
+        if credit >= 1.0:
+            self._credit[record.levelno] = credit - 1.0
+            return True
+        self._credit[record.levelno] = credit
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queues records without ever waiting; dropped counts what did not fit."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class Listener(logging.handlers.QueueListener):
+    """A QueueListener that may be stopped more than once (e.g. at exit)."""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def rotating_file_handler(path, max_bytes=0, when=None, backup_count=5):
+    """Returns a handler rotating path every when (a TimedRotatingFileHandler
+    interval such as 'midnight') if given, else when it reaches max_bytes."""
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=when, backupCount=backup_count, encoding='utf-8', delay=True)
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+
+
+def start(handlers, queue_size=10000, sample_rates=None):
+    """Starts a listener writing to handlers; returns (queue handler, listener).
+
+    Attach the queue handler to the loggers and call listener.stop() to flush
+    what is still queued.
+    """
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+    listener = Listener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return queue_handler, listener
+
+
+def init_app(app):
+    """Sends app.logger, and a line per request when LOG_REQUESTS is set, to
+    LOG_FILE through the queue."""
+    file_handler = rotating_file_handler(
+        app.config['LOG_FILE'], max_bytes=app.config['LOG_MAX_BYTES'],
+        when=app.config['LOG_ROTATE_WHEN'],
+        backup_count=app.config['LOG_BACKUP_COUNT'])
+    file_handler.setFormatter(JsonFormatter())
+    queue_handler, listener = start(
+        [file_handler], queue_size=app.config['LOG_QUEUE_SIZE'],
+        sample_rates=app.config['LOG_SAMPLE_RATES'])
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+    # Flask's stderr handler would write every record on the request thread,
+    # unsampled
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(queue_handler)
+    app.extensions['log_queue'] = listener
+    atexit.register(listener.stop)
+
+    if not app.config['LOG_REQUESTS']:
+        return listener
+    request_log = app.logger.getChild('requests')
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        started = g.pop('request_started', None)
+        if started is not None and request_log.isEnabledFor(logging.INFO):
+            request_log.info('%s %s %s', request.method, request.path,
+                             response.status_code, extra={
+                                 'method': request.method,
+                                 'url': request.full_path.rstrip('?'),
+                                 'status': response.status_code,
+                                 'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                                 'remote_addr': request.remote_addr,
+                             })
+        return response
+
+    return listener
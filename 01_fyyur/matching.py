@@ -0,0 +1,186 @@
+"""Genre-similarity matching between venues and artists.
+
+GenreMatcher keeps one side (all venues or all artists) as a matrix of genre
+bitsets, one row per entity, with the seeking flag and city/state codes in
+parallel arrays. match() scores every row against a genre list at once:
+Jaccard similarity |a & b| / |a | b|, where the intersection is a popcount of
+the AND of the bitsets and the union follows from the cached per-row genre
+counts. Rows are set and removed in place as entities change, so the matrix
+never has to be rebuilt; a lock keeps request threads from matching against
+arrays another thread is changing.
+"""
+import threading
+
+import numpy as np
+
+WORD_BITS = 64
+
+
+def normalize(value):
+    return (value or '').strip().casefold()
+
+
+class GenreMatcher(object):
+
+    def __init__(self, capacity=1024):
+        self._genres = {}    # normalized genre -> bit number
+        self._places = {}    # normalized city or state -> code, 0 is none
+        self._rows = {}      # entity id -> row
+        self._size = 0
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._bits = np.zeros((capacity, 1), dtype=np.uint64)
+        self._counts = np.zeros(capacity, dtype=np.int32)
+        self._seeking = np.zeros(capacity, dtype=bool)
+        self._city = np.zeros(capacity, dtype=np.int32)
+        self._state = np.zeros(capacity, dtype=np.int32)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, entity_id):
+        return entity_id in self._rows
+
+    def _grow(self):
+        capacity = 2 * len(self._ids)
+        for name in ('_ids', '_bits', '_counts', '_seeking', '_city', '_state'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _bit(self, genre):
+        bit = self._genres.get(genre)
+        if bit is None:
+            bit = self._genres[genre] = len(self._genres)
+            if bit >= self._bits.shape[1] * WORD_BITS:
+                self._bits = np.hstack(
+                    [self._bits, np.zeros((len(self._bits), 1), dtype=np.uint64)])
+        return bit
+
+    def _place(self, value, add=True):
+        value = normalize(value)
+        if not value:
+            return 0
+        code = self._places.get(value)
+        if code is None and add:
+            code = self._places[value] = len(self._places) + 1
+        return code
+
+    def encode(self, genres, add=False):
+        """Returns (bitset row, number of distinct genres).
+
+        Unless add is set, genres no row has are left out of the bitset but
+        still counted, as they still belong to the union.
+        """
+        names = {normalize(genre) for genre in genres or () if normalize(genre)}
+        bits = [self._bit(name) if add else self._genres.get(name) for name in names]
+        row = np.zeros(self._bits.shape[1], dtype=np.uint64)
+        for bit in bits:
+            if bit is not None:
+                row[bit // WORD_BITS] |= np.uint64(1 << (bit % WORD_BITS))
+        return row, len(names)
+
+    def set(self, entity_id, genres, seeking=False, city=None, state=None):
+        """Adds or replaces the row of entity_id."""
+        with self._lock:
+            bits, count = self.encode(genres, add=True)
+            row = self._rows.get(entity_id)
+            if row is None:
+                if self._size == len(self._ids):
+                    self._grow()
+                row = self._rows[entity_id] = self._size
+                self._size += 1
+            self._ids[row] = entity_id
+            self._bits[row] = bits
+            self._counts[row] = count
+            self._seeking[row] = bool(seeking)
+            self._city[row] = self._place(city)
+            self._state[row] = self._place(state)
+
+    @classmethod
+    def load(cls, rows):
+        """Builds a matcher from (id, genres, seeking, city, state) rows."""
+        matcher = cls()
+        ids, bits, counts, seeking, cities, states = [], [], [], [], [], []
+        for entity_id, genres, is_seeking, city, state in rows:
+            names = {normalize(genre) for genre in genres or () if normalize(genre)}
+            ids.append(entity_id)
+            bits.append([matcher._bit(name) for name in names])
+            counts.append(len(names))
+            seeking.append(bool(is_seeking))
+            cities.append(matcher._place(city))
+            states.append(matcher._place(state))
+        size = len(ids)
+        capacity = max(size, 1024)
+        matcher._ids = np.zeros(capacity, dtype=np.int64)
+        matcher._ids[:size] = ids
+        words = matcher._bits.shape[1]
+        flat = np.zeros((capacity, words * WORD_BITS), dtype=bool)
+        rows_of = np.repeat(np.arange(size), counts)
+        flat[rows_of, np.fromiter((bit for row in bits for bit in row),
+                                  dtype=np.int64, count=len(rows_of))] = True
+        # little-endian bit order within each 64-bit word, as in encode()
+        matcher._bits = np.packbits(flat, axis=1, bitorder='little').\
+            view('<u8').astype(np.uint64)
+        for name, values in (('_counts', counts), ('_seeking', seeking),
+                             ('_city', cities), ('_state', states)):
+            array = getattr(matcher, name)
+            array = np.zeros(capacity, dtype=array.dtype)
+            array[:size] = values
+            setattr(matcher, name, array)
+        matcher._rows = {entity_id: row for row, entity_id in enumerate(ids)}
+        matcher._size = size
+        return matcher
+
+    def remove(self, entity_id):
+        with self._lock:
+            row = self._rows.pop(entity_id, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                # move the last row into the hole
+                for array in (self._ids, self._bits, self._counts, self._seeking,
+                              self._city, self._state):
+                    array[row] = array[last]
+                self._rows[int(self._ids[row])] = row
+            self._bits[last] = 0
+            self._size = last
+
+    def scores(self, genres):
+        """Jaccard similarity of genres with every row, in row order."""
+        with self._lock:
+            bits, count = self.encode(genres)
+            n = self._size
+            shared = np.bitwise_count(self._bits[:n] & bits).sum(axis=1, dtype=np.int32)
+            union = self._counts[:n] + (count - shared)
+            return np.divide(shared, union, out=np.zeros(n), where=union > 0)
+
+    def match(self, genres, limit=10, seeking_only=True, city=None, state=None):
+        """Returns up to limit (entity id, score) pairs, best match first.
+
+        Only rows sharing at least one genre qualify; seeking_only keeps rows
+        whose seeking flag is set, and city/state (case-insensitive) keep
+        rows in that place. Ties are broken by entity id.
+        """
+        with self._lock:
+            n = self._size
+            scores = self.scores(genres)
+            keep = scores > 0
+            if seeking_only:
+                keep &= self._seeking[:n]
+            for value, codes in ((city, self._city), (state, self._state)):
+                if value:
+                    code = self._place(value, add=False)
+                    if code is None:
+                        return []
+                    keep &= codes[:n] == code
+            rows = np.flatnonzero(keep)
+            if len(rows) > limit:
+                # everything scoring at least the limit-th best score, so that
+                # ties at the cut are decided by id below
+                cut = np.partition(scores[rows], -limit)[-limit]
+                rows = rows[scores[rows] >= cut]
+            rows = rows[np.lexsort((self._ids[rows], -scores[rows]))][:limit]
+            return [(int(self._ids[row]), float(scores[row])) for row in rows]
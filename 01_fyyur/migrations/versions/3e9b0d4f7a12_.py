@@ -0,0 +1,24 @@
+"""index Show(start_time, id) for keyset pagination
+
+Revision ID: 3e9b0d4f7a12
+Revises: c41d7e9b2a58
+Create Date: 2026-10-18 11:26:05.774310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e9b0d4f7a12'
+down_revision = 'c41d7e9b2a58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_start_time_id', 'Show', ['start_time', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time_id', table_name='Show')
@@ -0,0 +1,31 @@
+"""add Venue.upcoming_shows_count
+
+Revision ID: 8f3a2c6d1e47
+Revises: 5179df821629
+Create Date: 2026-10-18 09:12:40.318221
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3a2c6d1e47'
+down_revision = '5179df821629'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('upcoming_shows_count', sa.Integer(),
+                                     server_default='0', nullable=False))
+    # backfill from existing shows
+    op.execute(
+        'UPDATE "Venue" SET upcoming_shows_count = ('
+        'SELECT count(*) FROM "Show" '
+        'WHERE "Show".venue_id = "Venue".id AND "Show".start_time > now())'
+    )
+
+
+def downgrade():
+    op.drop_column('Venue', 'upcoming_shows_count')
@@ -0,0 +1,51 @@
+"""composite and covering indexes for Show lookups
+
+Revision ID: 9c2f6e1b4d70
+Revises: 5a0c8e2b6d91
+Create Date: 2026-10-18 16:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2f6e1b4d70'
+down_revision = '5a0c8e2b6d91'
+branch_labels = None
+depends_on = None
+
+
+# CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction, so each
+# statement runs in an autocommit block; Show stays writable throughout.
+# A partial index on "start_time > now()" is not possible (index predicates
+# must be immutable), so upcoming-show scans get a covering index on
+# (start_time, id) instead. It replaces ix_show_start_time_id, which has
+# the same key.
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_show_venue_id_start_time', 'Show',
+                        ['venue_id', 'start_time'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_show_artist_id_start_time', 'Show',
+                        ['artist_id', 'start_time'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_show_upcoming', 'Show', ['start_time', 'id'],
+                        postgresql_include=['venue_id', 'artist_id'],
+                        postgresql_concurrently=True)
+        op.drop_index('ix_show_start_time_id', table_name='Show',
+                      postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_show_start_time_id', 'Show', ['start_time', 'id'],
+                        postgresql_concurrently=True)
+        op.drop_index('ix_show_upcoming', table_name='Show',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_show_artist_id_start_time', table_name='Show',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_show_venue_id_start_time', table_name='Show',
+                      postgresql_concurrently=True)
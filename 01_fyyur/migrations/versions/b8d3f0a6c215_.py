@@ -0,0 +1,39 @@
+"""Show.duration_minutes and no overlapping shows per venue
+
+Revision ID: b8d3f0a6c215
+Revises: e2a7c5f19b34
+Create Date: 2026-10-18 18:02:37.914530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d3f0a6c215'
+down_revision = 'e2a7c5f19b34'
+branch_labels = None
+depends_on = None
+
+
+# Existing shows get the default two hours. Adding the constraint fails if
+# any venue already has overlapping shows; list them first with
+#   SELECT a.id, b.id FROM "Show" a JOIN "Show" b ON a.venue_id = b.venue_id
+#     AND a.id < b.id AND a.start_time < b.start_time + interval '2 hours'
+#     AND b.start_time < a.start_time + interval '2 hours';
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('duration_minutes', sa.Integer(),
+                                    server_default='120', nullable=False))
+    # gist has no integer equality operator class without btree_gist
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute(
+        'ALTER TABLE "Show" ADD CONSTRAINT ex_show_venue_overlap '
+        'EXCLUDE USING gist (venue_id WITH =, '
+        "tsrange(start_time, start_time + duration_minutes * interval '1 minute') WITH &&)")
+
+
+def downgrade():
+    op.drop_constraint('ex_show_venue_overlap', 'Show')
+    op.drop_column('Show', 'duration_minutes')
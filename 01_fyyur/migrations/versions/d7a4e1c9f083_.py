@@ -0,0 +1,46 @@
+"""genre facet counts and GIN indexes on genres
+
+Revision ID: d7a4e1c9f083
+Revises: 3e9b0d4f7a12
+Create Date: 2026-10-18 13:40:52.108934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a4e1c9f083'
+down_revision = '3e9b0d4f7a12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('GenreFacet',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('genre', sa.String(length=120), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'genre')
+    )
+    op.create_index('ix_venue_genres', 'Venue', ['genres'], postgresql_using='gin')
+    op.create_index('ix_artist_genres', 'Artist', ['genres'], postgresql_using='gin')
+    # backfill from existing rows
+    op.execute(
+        'INSERT INTO "GenreFacet" (kind, genre, count) '
+        'SELECT \'venue\', genre, count(*) FROM ('
+        'SELECT DISTINCT id, unnest(genres) AS genre FROM "Venue") AS g '
+        'GROUP BY genre'
+    )
+    op.execute(
+        'INSERT INTO "GenreFacet" (kind, genre, count) '
+        'SELECT \'artist\', genre, count(*) FROM ('
+        'SELECT DISTINCT id, unnest(genres) AS genre FROM "Artist") AS g '
+        'GROUP BY genre'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_artist_genres', table_name='Artist')
+    op.drop_index('ix_venue_genres', table_name='Venue')
+    op.drop_table('GenreFacet')
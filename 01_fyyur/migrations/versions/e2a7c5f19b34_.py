@@ -0,0 +1,30 @@
+"""add Venue/Artist.shows_changed_at for calendar feed validators
+
+Revision ID: e2a7c5f19b34
+Revises: 9c2f6e1b4d70
+Create Date: 2026-10-18 17:05:21.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a7c5f19b34'
+down_revision = '9c2f6e1b4d70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # now() is stable, so Postgres stores the default once instead of
+    # rewriting the tables
+    op.add_column('Venue', sa.Column('shows_changed_at', sa.DateTime(),
+                                     server_default=sa.func.now(), nullable=False))
+    op.add_column('Artist', sa.Column('shows_changed_at', sa.DateTime(),
+                                      server_default=sa.func.now(), nullable=False))
+
+
+def downgrade():
+    op.drop_column('Artist', 'shows_changed_at')
+    op.drop_column('Venue', 'shows_changed_at')
@@ -0,0 +1,29 @@
+"""add updated_at to Venue, Artist and Show for page validators
+
+Revision ID: f3c9a1d27e60
+Revises: b8d3f0a6c215
+Create Date: 2026-10-18 21:12:40.318552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c9a1d27e60'
+down_revision = 'b8d3f0a6c215'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # now() is stable, so Postgres stores the default once instead of
+    # rewriting the tables
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(),
+                                       server_default=sa.func.now(), nullable=False))
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_column(table, 'updated_at')
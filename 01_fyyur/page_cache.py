@@ -0,0 +1,74 @@
+"""Size-bounded, tag-invalidated cache for rendered pages.
+
+Each entry carries the tags of the entity types it was built from, so a write
+handler can drop every page that showed, say, a venue with one call. Entries
+also expire on their own after a per-entry TTL, and the least recently used
+entry is evicted once the cache is full.
+
+The cache lives in the worker process: invalidation in one worker does not
+reach the others, which is why entries always carry a TTL as well, and the
+TTL bounds how long another worker may serve a page a write has changed.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class PageCache(object):
+
+    def __init__(self, max_entries=256, default_ttl=30, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._keys_by_tag = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, tags, value = entry
+            if expires_at <= self._clock():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags=(), ttl=None):
+        ttl = self.default_ttl if ttl is None else min(ttl, self.default_ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (self._clock() + ttl, tuple(tags), value)
+            for tag in tags:
+                self._keys_by_tag[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._keys_by_tag.pop(tag, ())):
+                    self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
@@ -0,0 +1,102 @@
+"""In-process publish/subscribe hub for server-sent events.
+
+Every subscriber gets a bounded deque; publish() appends the event to each of
+them, and a subscriber that has fallen queue_size events behind loses its
+oldest ones rather than holding memory or slowing the publisher down. Events
+are numbered, and the last history_size are kept so that a client
+reconnecting with Last-Event-ID is sent what it missed.
+
+An idle subscriber is a deque and an entry in a set; waiting happens on one
+condition shared by the whole hub, so thousands of them cost little beyond
+the connections themselves (serve the stream from an async worker such as
+gevent, where each waiting connection is a greenlet, not a thread). The hub
+only sees events published in its own process.
+"""
+import collections
+import threading
+
+
+class Subscription(object):
+    __slots__ = ('queue', 'dropped', '_hub')
+
+    def __init__(self, hub, queue_size):
+        self.queue = collections.deque(maxlen=queue_size)
+        self.dropped = 0
+        self._hub = hub
+
+    def _put(self, event):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(event)
+
+    def get(self, timeout=None):
+        """Returns every pending (id, data) event, waiting up to timeout
+        seconds for one; an empty list means the wait timed out."""
+        with self._hub._changed:
+            if not self.queue:
+                self._hub._changed.wait(timeout)
+            events = list(self.queue)
+            self.queue.clear()
+        return events
+
+    def close(self):
+        self._hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Hub(object):
+
+    def __init__(self, queue_size=100, history_size=1000):
+        self.queue_size = queue_size
+        self._changed = threading.Condition()
+        self._subscribers = set()
+        self._history = collections.deque(maxlen=history_size)
+        self._last_id = 0
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    @property
+    def history_size(self):
+        return self._history.maxlen
+
+    @history_size.setter
+    def history_size(self, size):
+        with self._changed:
+            self._history = collections.deque(self._history, maxlen=size)
+
+    def subscribe(self, last_event_id=None):
+        """Returns a Subscription, holding the retained events published
+        after last_event_id when one is given."""
+        subscription = Subscription(self, self.queue_size)
+        with self._changed:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event[0] > last_event_id:
+                        subscription._put(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._changed:
+            self._subscribers.discard(subscription)
+
+    def publish(self, data):
+        """Queues data for every subscriber; returns the event id."""
+        with self._changed:
+            self._last_id += 1
+            event = (self._last_id, data)
+            self._history.append(event)
+            for subscription in self._subscribers:
+                subscription._put(event)
+            self._changed.notify_all()
+        return event[0]
@@ -0,0 +1,119 @@
+"""EXPLAIN-based check that the views read Show through its indexes.
+
+Each view in VIEWS is requested through the test client while every SELECT
+or UPDATE touching "Show" is captured with its parameters. The statements are
+then EXPLAINed (EXPLAIN on Postgres, EXPLAIN QUERY PLAN on SQLite) and each
+plan must neither fall back to a sequential scan of Show nor skip the index
+the view is expected to use.
+
+On Postgres sequential scans are disabled for the EXPLAIN session, so the
+check reports whether an index *can* serve the query even on the small
+tables of a dev or CI database, where the planner would rightly prefer a
+sequential scan.
+"""
+import contextlib
+import re
+
+from sqlalchemy import event
+
+# (url template, index the view's Show queries must use, or None for any)
+VIEWS = [
+    ('/venues', None),
+    ('/venues/{venue_id}', 'ix_show_venue_id_start_time'),
+    ('/venues/{venue_id}/calendar.ics', 'ix_show_venue_id_start_time'),
+    ('/venues/{venue_id}/free-slots', 'ix_show_venue_id_start_time'),
+    ('/artists/{artist_id}', 'ix_show_artist_id_start_time'),
+    ('/artists/{artist_id}/calendar.ics', 'ix_show_artist_id_start_time'),
+    ('/shows', 'ix_show_upcoming'),
+    ('/shows?upcoming=1', 'ix_show_upcoming'),
+    ('/api/shows?upcoming=1&fields=id,start_time', 'ix_show_upcoming'),
+    ('/api/shows/{show_id}', None),
+    ('/autocomplete?q=a', None),
+]
+
+_full_scan = re.compile(
+    r'Seq Scan on "?Show"?\b'                 # Postgres
+    r'|^SCAN (TABLE )?"?Show(_\d+)?"?\s*$'    # SQLite, no index at all
+    r'|AUTOMATIC (COVERING )?INDEX')          # SQLite, index built per query
+_index_name = re.compile(r'\b(ix_show_\w+)')
+
+
+@contextlib.contextmanager
+def capture_show_reads(engine):
+    """Collects (statement, parameters) of the statements reading Show.
+
+    UPDATEs are included for the upcoming-count refresh, which reads Show in
+    a correlated subquery; EXPLAIN without ANALYZE does not run them.
+    """
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        verb = statement.lstrip()[:6].upper()
+        if verb in ('SELECT', 'UPDATE') and '"Show"' in statement:
+            captured.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def explain(connection, statement, parameters):
+    """Returns the plan of statement as a list of lines."""
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET enable_seqscan = off')
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+    return [row[-1] for row in rows]
+
+
+def check_plan(plan, expected_index=None):
+    """Returns a problem description, or None if the plan is acceptable."""
+    for line in plan:
+        if _full_scan.search(line.strip()):
+            return 'full scan: {}'.format(line.strip())
+    used = set(_index_name.findall('\n'.join(plan)))
+    if expected_index and expected_index not in used:
+        return '{} not used (uses {})'.format(
+            expected_index, ', '.join(sorted(used)) or 'no Show index')
+    return None
+
+
+def check_views(app, db, ids, echo=print):
+    """EXPLAINs the Show queries of every view; returns the failure count.
+
+    ids supplies venue_id, artist_id and show_id for the url templates.
+    """
+    failures = 0
+    client = app.test_client(use_cookies=False)
+    cache_enabled = app.config['PAGE_CACHE_ENABLED']
+    app.config['PAGE_CACHE_ENABLED'] = False
+    try:
+        with app.app_context():
+            engine = db.engine
+        for template, expected_index in VIEWS:
+            url = template.format(**ids)
+            with capture_show_reads(engine) as captured:
+                res = client.get(url)
+                res.get_data()  # streamed views query while iterating
+                status = res.status_code
+            if status != 200:
+                echo('FAIL {} returned {}'.format(url, status))
+                failures += 1
+                continue
+            with engine.connect() as connection:
+                for statement, parameters in captured:
+                    plan = explain(connection, statement, parameters)
+                    problem = check_plan(plan, expected_index)
+                    used = sorted(set(_index_name.findall('\n'.join(plan))))
+                    echo('{} {:<45} {}'.format(
+                        'FAIL' if problem else 'ok  ', url,
+                        problem or ', '.join(used) or '-'))
+                    failures += bool(problem)
+                connection.rollback()
+    finally:
+        app.config['PAGE_CACHE_ENABLED'] = cache_enabled
+    return failures
@@ -0,0 +1,76 @@
+"""Read-replica routing for db.session.
+
+Replicas are ordinary SQLAlchemy binds named replica_0, replica_1, ... (see
+DATABASE_REPLICA_URLS in config.py). During a GET/HEAD request every read
+goes to one replica picked for that request; everything else uses the
+primary:
+
+* requests with any other method (the POST/DELETE handlers),
+* flushes and INSERT/UPDATE/DELETE statements, and every read after them in
+  the same request, so a GET that refreshes counters reads its own writes,
+* work outside a request (CLI commands, tests),
+* for REPLICA_STICKY_SECONDS after a successful write, GETs from the same
+  browser session, which would otherwise not see what they just wrote
+  until the replicas catch up.
+
+The stickiness is kept in the signed session cookie, so every worker must
+share SECRET_KEY; init_app() refuses replicas without one.
+"""
+import random
+import time
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+REPLICA_PREFIX = 'replica_'
+# session key holding the time until which this session reads the primary
+STICKY_KEY = '_db_primary_until'
+
+
+def is_sticky():
+    """True while this browser session reads the primary after a write."""
+    return session.get(STICKY_KEY, 0) > time.time()
+
+
+def reading_replica():
+    """True while the current request still reads from a replica."""
+    return bool(g.get('db_replica'))
+
+
+def replica_keys(app):
+    return sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {}
+                  if key and key.startswith(REPLICA_PREFIX))
+
+
+class RoutingSession(Session):
+    """Session that sends request reads to the replica chosen for the request."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('db_replica'):
+            if self._flushing or getattr(clause, 'is_dml', False):
+                # from here on the request reads its own writes
+                g.db_replica = None
+            else:
+                return self._db.engines[g.db_replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_app(app):
+    keys = replica_keys(app)
+    if not keys:
+        return
+    if not app.config.get('SECRET_KEY'):
+        raise RuntimeError('read replicas need SECRET_KEY set, and shared by '
+                           'every worker, to keep writers on the primary')
+
+    @app.before_request
+    def choose_replica():
+        if request.method in READ_METHODS and not is_sticky():
+            g.db_replica = random.choice(keys)
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method not in READ_METHODS and response.status_code < 400:
+            session[STICKY_KEY] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
@@ -0,0 +1,279 @@
+"""In-process indexes for searching venue and artist names.
+
+NgramIndex does case-insensitive substring search. Postgres answers name
+searches from a pg_trgm GIN index; this index plays the same role for
+SQLite/dev databases, where ILIKE '%term%' is a full scan.
+
+PrefixIndex serves as-you-type completions: a radix trie over the start of
+each word of a name, where every node caches its best k entries.
+
+The indexes are shared by a worker's request threads, so each one serializes
+its lookups and updates with a lock.
+"""
+import heapq
+import threading
+from collections import defaultdict
+
+
+def rank_key(term, name):
+    """Sort key for a lower-cased name containing term, best match first."""
+    if name == term:
+        closeness = 0
+    elif name.startswith(term):
+        closeness = 1
+    elif (' ' + term) in name:
+        closeness = 2
+    else:
+        closeness = 3
+    return (closeness, len(name), name)
+
+
+class NgramIndex(object):
+    """Inverted index from character n-grams to document ids.
+
+    Candidates for a term are the intersection of the posting sets of its
+    n-grams, which are then confirmed with a plain substring test. Terms
+    shorter than n fall back to checking every indexed name.
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self._names = {}
+        self._postings = defaultdict(set)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def _grams(self, text):
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, doc_id, name):
+        key = (name or '').lower()
+        with self._lock:
+            self.remove(doc_id)
+            self._names[doc_id] = key
+            for gram in self._grams(key):
+                self._postings[gram].add(doc_id)
+
+    def remove(self, doc_id):
+        with self._lock:
+            key = self._names.pop(doc_id, None)
+            if key is None:
+                return
+            for gram in self._grams(key):
+                postings = self._postings.get(gram)
+                if postings is not None:
+                    postings.discard(doc_id)
+                    if not postings:
+                        del self._postings[gram]
+
+    def search(self, term):
+        """Returns the ids of all names containing term, best match first."""
+        term = (term or '').strip().lower()
+        grams = self._grams(term)
+        with self._lock:
+            if grams:
+                postings = sorted((self._postings.get(g, ()) for g in grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                candidates = self._names
+            names = self._names
+            hits = [(rank_key(term, names[doc_id]), doc_id)
+                    for doc_id in candidates if term in names[doc_id]]
+        hits.sort()
+        return [doc_id for _, doc_id in hits]
+
+
+def prefix_keys(name, max_length):
+    """The lower-cased name from the start of each of its words."""
+    words = (name or '').lower().split()
+    return {' '.join(words[i:])[:max_length] for i in range(len(words))}
+
+
+class _Node(object):
+    __slots__ = ('label', 'children', 'entries', 'top')
+
+    # most nodes are leaves holding a single entry, so children and entries
+    # stay as cheap as possible: None / a small tuple until needed
+    def __init__(self, label, entries=()):
+        self.label = label      # edge text leading into this node
+        self.children = None    # first character of child label -> node
+        self.entries = entries  # entries whose key ends here
+        self.top = None         # cached best k entries below, None if stale
+
+
+class PrefixIndex(object):
+    """Top-k prefix completion over named, scored entries.
+
+    Entries are any hashable ids (e.g. ('venue', 3)) with a name and a score;
+    complete(prefix) returns the k highest-scoring entries with a name word
+    starting with prefix. Each node's top-k is rebuilt lazily from its
+    children's, and add/remove/set_score only clear the caches along the
+    paths of the keys they touch, so updates cost O(name length) and
+    lookups O(prefix length) once warm.
+    """
+
+    def __init__(self, k=10, max_key_length=64):
+        self.k = k
+        self.max_key_length = max_key_length
+        self._root = _Node('')
+        self._names = {}
+        self._scores = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, entry):
+        return entry in self._names
+
+    def name(self, entry):
+        return self._names[entry]
+
+    def score(self, entry):
+        return self._scores[entry]
+
+    def _keys(self, entry):
+        # recomputed rather than stored: keeps a set per entry out of memory
+        return prefix_keys(self._names[entry], self.max_key_length)
+
+    def _rank(self, entry):
+        return (-self._scores[entry], self._names[entry].lower(), entry)
+
+    def add(self, entry, name, score=0):
+        with self._lock:
+            self.remove(entry)
+            self._names[entry] = name
+            self._scores[entry] = score
+            for key in self._keys(entry):
+                self._insert(key, entry)
+
+    def remove(self, entry):
+        with self._lock:
+            if entry not in self._names:
+                return
+            for key in self._keys(entry):
+                self._delete(key, entry)
+            del self._names[entry]
+            del self._scores[entry]
+
+    def set_score(self, entry, score):
+        with self._lock:
+            if entry not in self._scores or self._scores[entry] == score:
+                return
+            self._scores[entry] = score
+            for key in self._keys(entry):
+                for node in self._path(key):
+                    node.top = None
+
+    def bump_score(self, entry, delta):
+        with self._lock:
+            if entry in self._scores:
+                self.set_score(entry, self._scores[entry] + delta)
+
+    def complete(self, prefix, limit=None):
+        """Returns up to limit (at most k) entries, best first."""
+        prefix = ' '.join((prefix or '').lower().split())[:self.max_key_length]
+        if not prefix:
+            return []
+        with self._lock:
+            node = self._find(prefix)
+            if node is None:
+                return []
+            return self._top(node)[:limit or self.k]
+
+    def completions(self, prefix, limit=None):
+        """Like complete(), as (entry, name, score) tuples read together, so
+        an entry removed meanwhile by another thread cannot go missing."""
+        with self._lock:
+            return [(entry, self._names[entry], self._scores[entry])
+                    for entry in self.complete(prefix, limit)]
+
+    def _insert(self, key, entry):
+        node, i, end = self._root, 0, len(key)
+        while i < end:
+            node.top = None
+            children = node.children
+            if children is None:
+                children = node.children = {}
+            child = children.get(key[i])
+            if child is None:
+                children[key[i]] = _Node(key[i:], (entry,))
+                return
+            label = child.label
+            if key.startswith(label, i):
+                node, i = child, i + len(label)
+                continue
+            # split the edge where key and label part ways
+            common, limit = 1, min(len(label), end - i)
+            while common < limit and label[common] == key[i + common]:
+                common += 1
+            middle = children[key[i]] = _Node(label[:common])
+            child.label = label[common:]
+            middle.children = {child.label[0]: child}
+            node, i = middle, i + common
+        node.top = None
+        if entry not in node.entries:
+            node.entries += (entry,)
+
+    def _path(self, key):
+        """Nodes from the root to key's node, or fewer if key is missing."""
+        node, i = self._root, 0
+        path = [node]
+        while i < len(key) and node.children:
+            child = node.children.get(key[i])
+            if child is None or not key.startswith(child.label, i):
+                break
+            node, i = child, i + len(child.label)
+            path.append(node)
+        return path
+
+    def _delete(self, key, entry):
+        path = self._path(key)
+        for node in path:
+            node.top = None
+        node = path[-1]
+        node.entries = tuple(e for e in node.entries if e != entry)
+        # drop the emptied leaf, then fold a pass-through parent into its
+        # remaining child so the trie stays compressed
+        for depth in range(len(path) - 1, 0, -1):
+            node, parent = path[depth], path[depth - 1]
+            if node.entries:
+                break
+            if not node.children:
+                del parent.children[node.label[0]]
+                if not parent.children:
+                    parent.children = None
+                continue
+            if len(node.children) == 1:
+                (child,) = node.children.values()
+                child.label = node.label + child.label
+                parent.children[child.label[0]] = child
+            break
+
+    def _find(self, prefix):
+        node, i = self._root, 0
+        while i < len(prefix):
+            child = node.children and node.children.get(prefix[i])
+            if not child:
+                return None
+            rest = prefix[i:]
+            if child.label.startswith(rest):
+                return child
+            if not rest.startswith(child.label):
+                return None
+            node, i = child, i + len(child.label)
+        return node
+
+    def _top(self, node):
+        if not node.children:
+            # leaves are cheap to rank on the fly; not caching them keeps
+            # most of the trie free of top-k lists
+            return sorted(node.entries, key=self._rank)[:self.k]
+        if node.top is None:
+            candidates = set(node.entries)
+            for child in node.children.values():
+                candidates.update(self._top(child))
+            node.top = heapq.nsmallest(self.k, candidates, key=self._rank)
+        return node.top
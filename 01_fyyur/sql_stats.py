@@ -0,0 +1,144 @@
+"""Per-request SQL statement accounting built on SQLAlchemy engine events.
+
+Every statement executed while handling a request is counted and timed. In
+debug mode the totals are returned as X-SQL-Statements / X-SQL-Time-ms
+response headers, and a warning is logged whenever one statement shape runs
+more than SQL_REPEATED_STATEMENT_LIMIT times in a single request, which is
+the signature of an N+1 query. A streamed response runs most of its
+statements after its headers are sent, so it is only reported once it is
+closed: the totals are logged at DEBUG level instead of returned.
+
+count_queries() / assert_max_queries() collect the same numbers around any
+block of code, so tests can pin a query budget per route.
+"""
+import contextlib
+import functools
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_whitespace = re.compile(r'\s+')
+# runs of bind placeholders, e.g. the expanded parameters of an IN (...)
+_placeholders = re.compile(
+    r'(?:\?|%\(\w+\)s|%s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|\$\d+|:\w+))+')
+
+_local = threading.local()
+
+
+def statement_shape(statement):
+    """Normalizes a statement so that repeats differing only in the number
+    of bound parameters compare equal."""
+    return _placeholders.sub('?', _whitespace.sub(' ', statement).strip())
+
+
+class QueryStats(object):
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, limit):
+        """Returns (shape, times) for shapes that ran more than limit times."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > limit]
+
+
+def _collectors():
+    collectors = getattr(_local, 'collectors', None)
+    if collectors is None:
+        collectors = _local.collectors = []
+    return collectors
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_started'].pop()
+    targets = list(_collectors())
+    if has_app_context() and 'sql_stats' in g:
+        targets.append(g.sql_stats)
+    for stats in targets:
+        stats.record(statement, duration)
+
+
+def _handle_error(context):
+    # a statement that raised never reaches after_cursor_execute; drop its
+    # start time so the next statement on the connection is not timed from it
+    if context.statement is not None and context.connection is not None:
+        started = context.connection.info.get('query_started')
+        if started:
+            started.pop()
+
+
+@contextlib.contextmanager
+def count_queries():
+    """Collects QueryStats for every statement run inside the block."""
+    stats = QueryStats()
+    _collectors().append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors().remove(stats)
+
+
+@contextlib.contextmanager
+def assert_max_queries(limit):
+    with count_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        raise AssertionError('{} SQL statements executed, budget is {}:\n{}'.format(
+            stats.count, limit, '\n'.join(
+                '{:>4}x {}'.format(n, shape) for shape, n in stats.shapes.most_common())))
+
+
+def init_app(app):
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def start_sql_stats():
+        g.sql_stats = QueryStats()
+
+    def warn_repeated(stats, method, path):
+        for shape, n in stats.repeated(app.config['SQL_REPEATED_STATEMENT_LIMIT']):
+            app.logger.warning('possible N+1 query on %s %s: %d executions of %s',
+                               method, path, n, shape)
+
+    def report_streamed(stats, method, path):
+        if app.debug:
+            app.logger.debug('%s %s: %d SQL statements in %.2fms', method, path,
+                             stats.count, stats.duration * 1000)
+        warn_repeated(stats, method, path)
+
+    @app.after_request
+    def report_sql_stats(response):
+        if response.is_streamed:
+            # g.sql_stats stays in place, as stream_with_context generators
+            # keep recording into it while the body is sent
+            stats = g.get('sql_stats')
+            if stats is not None:
+                response.call_on_close(functools.partial(
+                    report_streamed, stats, request.method, request.path))
+            return response
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        if app.debug:
+            response.headers['X-SQL-Statements'] = str(stats.count)
+            response.headers['X-SQL-Time-ms'] = '{:.2f}'.format(stats.duration * 1000)
+        warn_repeated(stats, request.method, request.path)
+        return response
@@ -0,0 +1,1005 @@
+import os
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import datetime
+import sqlite3
+import threading
+import time
+
+# point the app at a throwaway SQLite database before it is imported
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_path
+
+import app as fyyur
+from app import create_app, db, page_cache, Venue, Artist, Show
+from page_cache import PageCache
+import pubsub
+from search import NgramIndex, PrefixIndex
+import template_cache
+import transactions
+from sqlalchemy.exc import OperationalError
+from flask.logging import default_handler
+from sql_stats import count_queries, assert_max_queries
+
+app = create_app()
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        self.client = app.test_client
+        # loading the app for a CLI command resets debug from FLASK_DEBUG
+        app.debug = True
+        page_cache.clear()
+        fyyur.drop_autocomplete_index()
+        fyyur._genre_matchers.clear()
+        fyyur._name_indexes.clear()
+        fyyur.bookings.drop()
+        fyyur.unit_of_work.stats.clear()
+        with app.app_context():
+            # the default bind only; other test apps may add replica binds
+            db.drop_all(bind_key=None)
+            db.create_all(bind_key=None)
+
+    def tearDown(self):
+        """Executed after each test"""
+        with app.app_context():
+            db.session.remove()
+
+    def add_venue_with_shows(self, num_shows):
+        now = datetime.datetime.now()
+        with app.app_context():
+            venue = Venue(name='The Musical Hop', city='San Francisco',
+                          state='CA', genres=['Jazz'])
+            db.session.add(venue)
+            for i in range(num_shows):
+                artist = Artist(name='Artist {}'.format(i), genres=['Jazz'])
+                offset = datetime.timedelta(days=i + 1)
+                db.session.add(Show(artist=artist, venue=venue,
+                                    start_time=now + offset if i % 2 else now - offset))
+            db.session.commit()
+            return venue.id, [s.artist_id for s in sorted(venue.shows, key=lambda s: s.id)]
+
+    def count_statements(self, url):
+        with count_queries() as stats:
+            res = self.client().get(url)
+        self.assertEqual(res.status_code, 200)
+        return stats.count
+
+    def test_show_venue_query_count_is_fixed(self):
+        small_id, _ = self.add_venue_with_shows(1)
+        large_id, _ = self.add_venue_with_shows(10)
+
+        self.assertEqual(self.count_statements('/venues/{}'.format(small_id)), 1)
+        self.assertEqual(self.count_statements('/venues/{}'.format(large_id)), 1)
+
+    def test_show_artist_query_count_is_fixed(self):
+        _, artist_ids = self.add_venue_with_shows(3)
+
+        for artist_id in artist_ids:
+            self.assertEqual(self.count_statements('/artists/{}'.format(artist_id)), 1)
+
+    def test_show_venue_splits_past_and_upcoming(self):
+        venue_id, _ = self.add_venue_with_shows(4)
+
+        res = self.client().get('/venues/{}'.format(venue_id))
+        page = res.get_data(as_text=True)
+
+        self.assertIn('2 Upcoming Shows', page)
+        self.assertIn('2 Past Shows', page)
+
+    def test_shows_keyset_pagination(self):
+        self.add_venue_with_shows(5)
+        app.config['SHOWS_PER_PAGE'] = 2
+        try:
+            seen = []
+            url = '/shows'
+            while url:
+                res = self.client().get(url)
+                self.assertEqual(res.status_code, 200)
+                page = res.get_data(as_text=True)
+                seen.extend(line.strip() for line in page.splitlines()
+                            if 'href="/artists/' in line)
+                url = None
+                if 'Next page' in page:
+                    url = page.split('<a href="')[-1].split('"')[0].replace('&amp;', '&')
+        finally:
+            app.config['SHOWS_PER_PAGE'] = 50
+
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_shows_upcoming_only(self):
+        self.add_venue_with_shows(5)
+
+        res = self.client().get('/shows?upcoming=1')
+
+        self.assertEqual(res.get_data(as_text=True).count('playing at'), 2)
+
+    def test_shows_streamed(self):
+        self.add_venue_with_shows(5)
+
+        res = self.client().get('/shows?stream=1')
+
+        self.assertTrue(res.is_streamed)
+        self.assertEqual(res.get_data(as_text=True).count('playing at'), 5)
+
+    def test_shows_rejects_bad_cursor(self):
+        res = self.client().get('/shows?after=nonsense')
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_datetime_filter_accepts_datetimes_and_strings(self):
+        value = datetime.datetime(2035, 4, 1, 20, 0)
+        datetime_filter = app.jinja_env.filters['datetime']
+
+        with app.app_context():
+            self.assertEqual(datetime_filter(value, 'full'),
+                             "Sunday April, 1, 2035 at 8:00PM")
+            self.assertEqual(datetime_filter(str(value), 'full'),
+                             datetime_filter(value, 'full'))
+            self.assertEqual(datetime_filter(value), "Sun 04, 01, 2035 8:00PM")
+
+    def test_import_data_checks_show_foreign_keys(self):
+        venue_id, artist_ids = self.add_venue_with_shows(1)
+        other_venue_id, other_artist_ids = self.add_venue_with_shows(1)
+
+        def shows_changed_at():
+            with app.app_context():
+                return [db.session.get(model, entity_id).shows_changed_at
+                        for model, entity_id in ((Venue, venue_id), (Artist, artist_ids[0]),
+                                                 (Venue, other_venue_id),
+                                                 (Artist, other_artist_ids[0]))]
+
+        before = shows_changed_at()
+        records = [
+            {'venue_id': venue_id, 'artist_id': artist_ids[0],
+             'start_time': '2035-04-01T20:00:00'},
+            {'venue_id': venue_id, 'artist_id': 1000,
+             'start_time': '2035-04-08T20:00:00'},
+            # overlaps the first show, which ex_show_venue_overlap would refuse
+            {'venue_id': venue_id, 'artist_id': artist_ids[0],
+             'start_time': '2035-04-01T21:00:00'},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            f.write('\n'.join(json.dumps(r) for r in records))
+
+        try:
+            result = app.test_cli_runner().invoke(
+                args=['import-data', 'shows', f.name, '--batch-size', '1'])
+        finally:
+            os.remove(f.name)
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('imported 1 shows', result.output)
+        self.assertIn('rejected 2', result.output)
+        with app.app_context():
+            self.assertEqual(Show.query.count(), 3)
+            self.assertEqual(db.session.get(Venue, venue_id).upcoming_shows_count, 1)
+        # only the feeds of the imported show's venue and artist changed
+        after = shows_changed_at()
+        self.assertGreater(after[0], before[0])
+        self.assertGreater(after[1], before[1])
+        self.assertEqual(after[2:], before[2:])
+
+    def test_search_index_rebuilt_with_other_workers_names(self):
+        self.add_search_venues()
+        self.search_venues('music')
+        with app.app_context():
+            # written by another worker, so this one's index never saw it
+            db.session.add(Venue(name='The Dueling Pianos Bar', city='New York',
+                                 state='NY', genres=['Jazz']))
+            db.session.commit()
+
+        _, stale = self.search_venues('dueling')
+        app.config['SEARCH_INDEX_MAX_AGE'] = 0
+        try:
+            _, fresh = self.search_venues('dueling')
+        finally:
+            app.config['SEARCH_INDEX_MAX_AGE'] = 300
+
+        self.assertIn('"dueling": 1', stale)
+        self.assertIn('"dueling": 2', fresh)
+
+    def test_search_venues_links_next_page(self):
+        self.add_search_venues()
+        app.config['SEARCH_RESULTS_PER_PAGE'] = 1
+        try:
+            first, first_page = self.search_venues('music')
+            second, second_page = self.search_venues('music', page=2)
+        finally:
+            app.config['SEARCH_RESULTS_PER_PAGE'] = 20
+
+        self.assertEqual(len(first), 1)
+        self.assertIn('action="/venues/search?page=2"', first_page)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first, second)
+        self.assertNotIn('Next page', second_page)
+
+    def test_artists_page_cached_until_artist_created(self):
+        self.add_venue_with_shows(1)
+        self.client().get('/artists')
+
+        statements = self.count_statements('/artists')
+        self.client().post('/artists/create', data={
+            'name': 'Matt Quevedo', 'city': 'New York', 'state': 'NY',
+            'phone': '', 'genres': 'Jazz', 'facebook_link': '', 'image_link': ''})
+        self.client().get('/')  # consume the flashed message
+        res = self.client().get('/artists')
+
+        self.assertEqual(statements, 0)
+        self.assertIn('Matt Quevedo', res.get_data(as_text=True))
+
+    def test_page_cache_evicts_lru_and_expired_entries(self):
+        now = [0]
+        cache = PageCache(max_entries=2, default_ttl=10, clock=lambda: now[0])
+        cache.set('/a', 'a', tags=['venue'])
+        cache.set('/b', 'b', tags=['artist'], ttl=5)
+        cache.get('/a')
+        cache.set('/c', 'c', tags=['venue'])
+
+        self.assertIsNone(cache.get('/b'))
+        now[0] = 11
+        self.assertIsNone(cache.get('/a'))
+        now[0] = 0
+        cache.set('/d', 'd', tags=['artist'])
+        cache.invalidate('venue')
+        self.assertIsNone(cache.get('/c'))
+        self.assertEqual(cache.get('/d'), 'd')
+
+    def test_route_query_budgets(self):
+        venue_id, artist_ids = self.add_venue_with_shows(20)
+        show_form = {'artist_id': artist_ids[0], 'venue_id': venue_id,
+                     'start_time': '2035-04-01 20:00:00'}
+        budgets = [
+            ('GET', '/', None, 0),
+            ('GET', '/venues', None, 4),
+            ('POST', '/venues/search', {'search_term': 'hop'}, 4),
+            ('GET', '/venues/{}'.format(venue_id), None, 1),
+            ('GET', '/venues/create', None, 0),
+            ('GET', '/artists', None, 2),
+            ('POST', '/artists/search', {'search_term': 'artist'}, 3),
+            ('GET', '/artists/{}'.format(artist_ids[0]), None, 1),
+            ('GET', '/shows', None, 2),
+            ('GET', '/shows?upcoming=1', None, 2),
+            ('GET', '/shows/create', None, 0),
+            ('POST', '/shows/create', show_form, 5),
+        ]
+        for method, url, data, budget in budgets:
+            page_cache.clear()
+            with assert_max_queries(budget):
+                res = self.client().open(url, method=method, data=data)
+            self.assertEqual(res.status_code, 200, url)
+
+    def test_failed_statement_leaves_no_start_time_behind(self):
+        with app.app_context(), db.engine.connect() as connection:
+            with self.assertRaises(OperationalError):
+                connection.exec_driver_sql('SELECT * FROM no_such_table')
+            with count_queries() as stats:
+                connection.exec_driver_sql('SELECT 1')
+
+            self.assertEqual(connection.info['query_started'], [])
+        self.assertEqual(stats.count, 1)
+
+    def test_debug_responses_report_sql_statements(self):
+        venue_id, _ = self.add_venue_with_shows(2)
+
+        res = self.client().get('/venues/{}'.format(venue_id))
+
+        self.assertEqual(res.headers['X-SQL-Statements'], '1')
+        self.assertIn('X-SQL-Time-ms', res.headers)
+
+    def test_repeated_statements_are_logged(self):
+        venue_id, _ = self.add_venue_with_shows(3)
+        app.config['SQL_REPEATED_STATEMENT_LIMIT'] = 0
+        try:
+            with self.assertLogs(app.logger, 'WARNING') as logs:
+                self.client().get('/venues/{}'.format(venue_id))
+        finally:
+            app.config['SQL_REPEATED_STATEMENT_LIMIT'] = 10
+
+        self.assertIn('possible N+1 query on GET /venues/', logs.output[0])
+
+    def test_streamed_responses_reported_once_closed(self):
+        self.add_venue_with_shows(5)
+        app.config['SQL_REPEATED_STATEMENT_LIMIT'] = 0
+        try:
+            with self.assertLogs(app.logger, 'DEBUG') as logs:
+                res = self.client().get('/shows?stream=1')
+                res.get_data()
+                self.assertEqual(logs.output, [])
+                res.close()
+        finally:
+            app.config['SQL_REPEATED_STATEMENT_LIMIT'] = 10
+
+        # the view only builds the query; the body runs it while streaming
+        self.assertNotIn('X-SQL-Statements', res.headers)
+        self.assertIn('GET /shows: 1 SQL statements', logs.output[0])
+        self.assertIn('possible N+1 query on GET /shows: 1 executions of SELECT',
+                      logs.output[1])
+
+    def test_venues_filtered_by_genre_with_facet_counts(self):
+        for name, genres in (('Jazz Club', ['Jazz']),
+                             ('Folk Hall', ['Folk']),
+                             ('Both', ['Jazz', 'Folk'])):
+            self.client().post('/venues/create', data={
+                'name': name, 'city': 'San Francisco', 'state': 'CA',
+                'address': '', 'phone': '', 'genres': genres,
+                'facebook_link': '', 'image_link': ''})
+        self.client().get('/')  # consume the flashed messages
+
+        page = self.client().get('/venues?genre=Jazz&genre=Folk').get_data(as_text=True)
+        jazz = self.client().get('/venues?genre=Jazz').get_data(as_text=True)
+
+        self.assertIn('<h5>Both</h5>', page)
+        self.assertNotIn('<h5>Jazz Club</h5>', page)
+        self.assertNotIn('<h5>Folk Hall</h5>', page)
+        self.assertIn('<h5>Jazz Club</h5>', jazz)
+        self.assertIn('Jazz (2)', jazz)
+        self.assertIn('Folk (2)', jazz)
+
+    def test_delete_venue_cascades_in_the_database(self):
+        venue_id, _ = self.add_venue_with_shows(30)
+
+        with assert_max_queries(4):
+            res = self.client().delete('/venues/{}'.format(venue_id))
+
+        self.assertEqual(res.get_json()['success'], True)
+        with app.app_context():
+            self.assertIsNone(db.session.get(Venue, venue_id))
+            self.assertEqual(Show.query.count(), 0)
+
+    def test_delete_artist_releases_venue_counters(self):
+        venue_id, artist_ids = self.add_venue_with_shows(4)
+        with app.app_context():
+            fyyur.refresh_upcoming_counts()
+            self.assertEqual(db.session.get(Venue, venue_id).upcoming_shows_count, 2)
+
+        res = self.client().delete('/artists/{}'.format(artist_ids[1]))
+
+        self.assertEqual(res.status_code, 200)
+        with app.app_context():
+            self.assertEqual(db.session.get(Venue, venue_id).upcoming_shows_count, 1)
+            self.assertEqual(Show.query.count(), 3)
+
+    def test_counter_refresh_rederives_only_venues_with_started_shows(self):
+        now = datetime.datetime.now()
+        with app.app_context():
+            soon, later = (Venue(name=name, genres=['Jazz']) for name in ('Soon', 'Later'))
+            artist = Artist(name='Busy Band', genres=['Jazz'])
+            db.session.add_all([
+                Show(venue=soon, artist=artist, start_time=now + datetime.timedelta(hours=1)),
+                Show(venue=later, artist=artist, start_time=now + datetime.timedelta(days=5))])
+            db.session.commit()
+            fyyur.refresh_upcoming_counts(now)
+            later.upcoming_shows_count = 99
+            db.session.commit()
+
+            fyyur.refresh_upcoming_counts(now + datetime.timedelta(hours=2), since=now)
+
+            self.assertEqual(db.session.get(Venue, soon.id).upcoming_shows_count, 0)
+            self.assertEqual(db.session.get(Venue, later.id).upcoming_shows_count, 99)
+
+    def test_show_start_time_with_offset_stored_as_local_time(self):
+        venue_id, artist_ids = self.add_venue_with_shows(1)
+
+        self.client().post('/shows/create', data={
+            'venue_id': venue_id, 'artist_id': artist_ids[0],
+            'start_time': '2035-04-01T20:00:00.000Z'})
+
+        expected = datetime.datetime(2035, 4, 1, 20, tzinfo=datetime.timezone.utc).\
+            astimezone().replace(tzinfo=None)
+        with app.app_context():
+            self.assertEqual(Show.query.order_by(Show.id.desc()).first().start_time, expected)
+            self.assertEqual(db.session.get(Venue, venue_id).upcoming_shows_count, 1)
+
+    def add_search_venues(self):
+        with app.app_context():
+            for name in ('The Musical Hop', 'Park Square Live Music & Coffee',
+                         'The Dueling Pianos Bar'):
+                db.session.add(Venue(name=name, city='San Francisco', state='CA',
+                                     genres=['Jazz']))
+            db.session.commit()
+
+    def search_venues(self, term, page=None):
+        url = '/venues/search' if page is None else '/venues/search?page={}'.format(page)
+        res = self.client().post(url, data={'search_term': term})
+        self.assertEqual(res.status_code, 200)
+        page = res.get_data(as_text=True)
+        return [name for name in ('The Musical Hop', 'Park Square Live Music &amp; Coffee',
+                                  'The Dueling Pianos Bar') if name in page], page
+
+    def test_search_venues_by_partial_name(self):
+        self.add_search_venues()
+
+        music, page = self.search_venues('Music')
+        hop, _ = self.search_venues('hop')
+        short, _ = self.search_venues('pI')
+
+        self.assertEqual(music, ['The Musical Hop', 'Park Square Live Music &amp; Coffee'])
+        self.assertIn('"Music": 2', page)
+        self.assertEqual(hop, ['The Musical Hop'])
+        self.assertEqual(short, ['The Dueling Pianos Bar'])
+
+    def test_upcoming_show_counter_follows_shows(self):
+        venue_id, artist_ids = self.add_venue_with_shows(1)
+        start = datetime.datetime.now() + datetime.timedelta(days=1)
+
+        for days in (0, 7):
+            self.client().post('/shows/create', data={
+                'venue_id': venue_id, 'artist_id': artist_ids[0],
+                'start_time': (start + datetime.timedelta(days=days)).isoformat()})
+        with app.app_context():
+            self.assertEqual(db.session.get(Venue, venue_id).upcoming_shows_count, 2)
+            last_id = Show.query.order_by(Show.id.desc()).first().id
+        res = self.client().delete('/shows/{}'.format(last_id))
+        self.assertEqual(res.status_code, 200)
+
+        with app.app_context():
+            self.assertEqual(db.session.get(Venue, venue_id).upcoming_shows_count, 1)
+            # a day later the first show has started
+            fyyur.refresh_upcoming_counts(start + datetime.timedelta(hours=1))
+        with app.app_context():
+            self.assertEqual(db.session.get(Venue, venue_id).upcoming_shows_count, 0)
+
+    def test_404_for_missing_venue(self):
+        res = self.client().get('/venues/1000')
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_api_fields_are_projected_into_the_select(self):
+        venue_id, _ = self.add_venue_with_shows(3)
+
+        with count_queries() as stats:
+            res = self.client().get('/api/venues?fields=id,name')
+            data = json.loads(res.get_data())
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data, [{'id': venue_id, 'name': 'The Musical Hop'}])
+        statement = list(stats.shapes)[0]
+        self.assertNotIn('phone', statement)
+        self.assertNotIn('genres', statement)
+
+        res = self.client().get('/api/shows?fields=venue_name,start_time&upcoming=1')
+        data = json.loads(res.data)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(set(data[0]), {'venue_name', 'start_time'})
+
+    def test_api_errors_are_json(self):
+        res = self.client().get('/api/artists?fields=id,password')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(json.loads(res.data)['message'], 'unknown fields: password')
+
+        res = self.client().get('/api/artists/1000')
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(json.loads(res.data)['success'])
+
+    def test_prefix_index_ranks_and_updates_completions(self):
+        index = PrefixIndex(k=2)
+        index.add(('venue', 1), 'The Musical Hop', 1)
+        index.add(('venue', 2), 'Park Square Live Music & Coffee', 3)
+        index.add(('artist', 1), 'Musical Chairs', 0)
+
+        self.assertEqual(index.complete('MUS'), [('venue', 2), ('venue', 1)])
+        self.assertEqual(index.complete('the mus'), [('venue', 1)])
+        self.assertEqual(index.complete('xyz'), [])
+
+        index.set_score(('artist', 1), 5)
+        index.remove(('venue', 2))
+        self.assertEqual(index.complete('mus'), [('artist', 1), ('venue', 1)])
+        self.assertEqual(index.complete('park'), [])
+
+    def run_in_threads(self, *works, times=3000):
+        """Runs each work(i) for i in range(times) on a thread of its own;
+        returns what they raised."""
+        errors = []
+
+        def run(work):
+            try:
+                for i in range(times):
+                    work(i)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=run, args=(work,)) for work in works]
+        # switch threads as often as possible, to interleave the updates
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        return errors
+
+    def test_prefix_index_shared_by_writer_and_reader_threads(self):
+        index = PrefixIndex(k=5)
+
+        def write(i):
+            entry = ('artist', i % 50)
+            if i % 3:
+                index.add(entry, 'Music Box {}'.format(i % 7), i % 11)
+            else:
+                index.remove(entry)
+
+        def read(i):
+            for entry, name, score in index.completions('music b'):
+                self.assertTrue(name.startswith('Music Box'))
+
+        self.assertEqual(self.run_in_threads(write, write, read, read), [])
+
+    def test_ngram_index_shared_by_writer_and_reader_threads(self):
+        index = NgramIndex()
+
+        def write(i):
+            if i % 3:
+                index.add(i % 50, 'Music Box {}'.format(i % 7))
+            else:
+                index.remove(i % 50)
+
+        def read(i):
+            for doc_id in index.search('box' if i % 2 else 'x'):
+                self.assertLess(doc_id, 50)
+
+        self.assertEqual(self.run_in_threads(write, write, read, read), [])
+
+    def test_autocomplete_rebuilt_with_other_workers_names(self):
+        self.add_venue_with_shows(1)
+        self.client().get('/autocomplete?q=art')
+        with app.app_context():
+            # written by another worker, so this one's index never saw it
+            db.session.add(Artist(name='Artful Dodgers', genres=['Jazz']))
+            db.session.commit()
+
+        stale = self.client().get('/autocomplete?q=artful').json['results']
+        app.config['AUTOCOMPLETE_MAX_AGE'] = 0
+        try:
+            fresh = self.client().get('/autocomplete?q=artful').json['results']
+        finally:
+            app.config['AUTOCOMPLETE_MAX_AGE'] = 300
+
+        self.assertEqual(stale, [])
+        self.assertEqual([r['name'] for r in fresh], ['Artful Dodgers'])
+
+    def test_autocomplete_follows_bookings_without_queries(self):
+        venue_id, artist_ids = self.add_venue_with_shows(2)
+        res = self.client().get('/autocomplete?q=art')
+        self.assertEqual(res.json['results'][0]['id'], artist_ids[1])
+
+        start = datetime.datetime.now() + datetime.timedelta(days=30)
+        for day in range(2):
+            self.client().post('/shows/create', data={
+                'venue_id': venue_id, 'artist_id': artist_ids[0],
+                'start_time': (start + datetime.timedelta(days=day)).isoformat()})
+
+        with assert_max_queries(0):
+            res = self.client().get('/autocomplete?q=art')
+        self.assertEqual([r['id'] for r in res.json['results']],
+                         [artist_ids[0], artist_ids[1]])
+        self.assertEqual(res.json['results'][0]['num_upcoming_shows'], 2)
+
+    def test_view_queries_use_show_indexes(self):
+        self.add_venue_with_shows(4)
+
+        result = app.test_cli_runner().invoke(args=['check-query-plans'])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('ix_show_venue_id_start_time', result.output)
+        self.assertIn('ix_show_artist_id_start_time', result.output)
+        self.assertNotIn('FAIL', result.output)
+
+    def test_calendar_feed_answers_304_until_shows_change(self):
+        venue_id, artist_ids = self.add_venue_with_shows(2)
+        url = '/venues/{}/calendar.ics'.format(venue_id)
+
+        res = self.client().get(url)
+        feed = res.get_data(as_text=True)
+        self.assertEqual(res.mimetype, 'text/calendar')
+        self.assertEqual(feed.count('BEGIN:VEVENT'), 2)
+        self.assertIn('SUMMARY:Artist 0 at The Musical Hop', feed)
+        self.assertTrue(feed.endswith('END:VCALENDAR\r\n'))
+        with app.app_context():
+            # the streamed body gave its connection back
+            self.assertEqual(db.engine.pool.checkedout(), 0)
+
+        with count_queries() as stats:
+            unchanged = self.client().get(url, headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(stats.count, 1)
+
+        # deleting the artist removes a show from the venue's feed
+        self.client().delete('/artists/{}'.format(artist_ids[0]))
+        changed = self.client().get(url, headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.get_data(as_text=True).count('BEGIN:VEVENT'), 1)
+
+    def test_detail_pages_answer_304_until_they_change(self):
+        venue_id, artist_ids = self.add_venue_with_shows(1)
+        url = '/venues/{}'.format(venue_id)
+
+        def get(etag):
+            with count_queries() as stats:
+                res = self.client().get(url, headers={'If-None-Match': etag})
+            return res.status_code, stats.count, res.headers['ETag']
+
+        etag = self.client().get(url).headers['ETag']
+        self.assertEqual(get(etag), (304, 1, etag))
+
+        # a new show changes the page, and so does its start an instant later
+        start = datetime.datetime.now() + datetime.timedelta(seconds=0.5)
+        self.client().post('/shows/create', data={
+            'venue_id': venue_id, 'artist_id': artist_ids[0],
+            'start_time': start.isoformat()})
+        status, _, etag = get(etag)
+        self.assertEqual(status, 200)
+        self.assertEqual(get(etag)[0], 304)
+        time.sleep(max((start - datetime.datetime.now()).total_seconds(), 0) + 0.05)
+        status, _, etag = get(etag)
+        self.assertEqual(status, 200)
+        self.assertEqual(get(etag)[0], 304)
+
+    def test_date_only_revalidation_sees_changes_within_a_second(self):
+        _, artist_ids = self.add_venue_with_shows(1)
+        url = '/artists/{}'.format(artist_ids[0])
+        second = datetime.datetime(2030, 1, 1, 12, 0, 0)
+
+        def change(microsecond):
+            with app.app_context():
+                Artist.query.filter(Artist.id == artist_ids[0]).update({
+                    Artist.updated_at: second.replace(microsecond=microsecond),
+                    Artist.shows_changed_at: second}, synchronize_session=False)
+                db.session.commit()
+
+        def get(now, since=None):
+            headers = {'If-Modified-Since': since} if since else {}
+            with mock.patch.object(fyyur, 'utcnow', return_value=now):
+                res = self.client().get(url, headers=headers)
+            return res.status_code, res.headers.get('Last-Modified')
+
+        change(200000)
+        status, fetched = get(second.replace(microsecond=500000))
+        self.assertEqual(fetched, 'Tue, 01 Jan 2030 12:00:00 GMT')
+        # changed again later in the second the client's copy is from
+        change(700000)
+        self.assertEqual(get(second.replace(microsecond=800000), fetched)[0], 200)
+
+        # once the second is over, the date sent covers all of it
+        status, fetched = get(second + datetime.timedelta(seconds=1.5))
+        self.assertEqual(fetched, 'Tue, 01 Jan 2030 12:00:01 GMT')
+        self.assertEqual(get(second + datetime.timedelta(seconds=2), fetched)[0], 304)
+        self.assertEqual(get(second + datetime.timedelta(seconds=2),
+                             'Thu, 01 Jan 1970 00:00:00 GMT')[0], 200)
+
+    def test_counter_refresh_keeps_other_venues_pages_valid(self):
+        self.add_venue_with_shows(2)
+        with app.app_context():
+            quiet = Venue(name='The Dueling Pianos Bar', city='New York', state='NY',
+                          genres=['Classical'])
+            db.session.add(quiet)
+            db.session.commit()
+            url = '/venues/{}'.format(quiet.id)
+        etag = self.client().get(url).headers['ETag']
+
+        with app.app_context():
+            # as if the other venue's upcoming show had started
+            fyyur.refresh_upcoming_counts(
+                datetime.datetime.now() + datetime.timedelta(days=3))
+        res = self.client().get(url, headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_suggested_artists_ranked_by_genre_overlap(self):
+        with app.app_context():
+            venue = Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                          genres=['Jazz', 'Swing', 'Folk'], seeking_talent=True)
+            db.session.add_all([
+                venue,
+                Artist(name='Swing Trio', city='San Francisco', state='CA',
+                       genres=['Jazz', 'Swing'], seeking_venues=True),
+                Artist(name='Folk Duo', city='Oakland', state='CA',
+                       genres=['Folk', 'Rock n Roll'], seeking_venues=True),
+                Artist(name='Busy Band', city='San Francisco', state='CA',
+                       genres=['Jazz', 'Swing', 'Folk'], seeking_venues=False),
+                Artist(name='Metal Heads', city='San Francisco', state='CA',
+                       genres=['Heavy Metal'], seeking_venues=True),
+            ])
+            db.session.commit()
+            venue_id = venue.id
+        url = '/venues/{}/suggested-artists'.format(venue_id)
+
+        def names(query=''):
+            res = self.client().get(url + query)
+            self.assertEqual(res.status_code, 200)
+            return [(r['name'], r['score']) for r in json.loads(res.data)['results']]
+
+        self.assertEqual(names(), [('Swing Trio', 0.6667), ('Folk Duo', 0.25)])
+        self.assertEqual(names('?seeking=0&limit=1'), [('Busy Band', 1.0)])
+        self.assertEqual(names('?city=san francisco'), [('Swing Trio', 0.6667)])
+
+        # new artists are matched without rebuilding the bitsets
+        self.client().post('/artists/create', data={
+            'name': 'Jazz Folk', 'city': 'Oakland', 'state': 'CA', 'phone': '',
+            'genres': ['Jazz', 'Folk'], 'facebook_link': '', 'image_link': ''})
+        self.assertEqual(names('?seeking=0&city=Oakland'),
+                         [('Jazz Folk', 0.6667), ('Folk Duo', 0.25)])
+
+        res = self.client().get('/artists/1/suggested-venues')
+        self.assertEqual(json.loads(res.data)['results'][0]['name'], 'The Musical Hop')
+
+        with app.app_context():
+            # written by another worker, so this one's matcher never saw it
+            db.session.add(Artist(name='Swing Quartet', city='San Francisco', state='CA',
+                                  genres=['Jazz', 'Swing', 'Folk'], seeking_venues=True))
+            db.session.commit()
+        stale = names('?limit=1')
+        app.config['GENRE_MATCHER_MAX_AGE'] = 0
+        try:
+            fresh = names('?limit=1')
+        finally:
+            app.config['GENRE_MATCHER_MAX_AGE'] = 300
+        self.assertEqual(stale, [('Swing Trio', 0.6667)])
+        self.assertEqual(fresh, [('Swing Quartet', 1.0)])
+
+    def test_genre_matcher_shared_by_writer_and_reader_threads(self):
+        from matching import GenreMatcher
+        matcher = GenreMatcher(capacity=4)
+        genres = ['Jazz', 'Swing', 'Folk', 'Blues']
+
+        def write(i):
+            if i % 3:
+                matcher.set(i % 50, genres[i % 4:], seeking=True, city='Oakland')
+            else:
+                matcher.remove(i % 50)
+
+        def read(i):
+            for entity_id, score in matcher.match(['Jazz', 'Blues'], city='oakland'):
+                self.assertLess(entity_id, 50)
+                self.assertGreater(score, 0)
+
+        self.assertEqual(self.run_in_threads(write, write, read, read), [])
+
+    def test_overlapping_bookings_rejected_and_free_slots_listed(self):
+        venue_id, artist_ids = self.add_venue_with_shows(1)
+
+        def book(start, minutes):
+            self.client().post('/shows/create', data={
+                'venue_id': venue_id, 'artist_id': artist_ids[0],
+                'start_time': start, 'duration_minutes': minutes})
+            with app.app_context():
+                return Show.query.filter_by(venue_id=venue_id).count()
+
+        self.assertEqual(book('2035-04-01 20:00', 120), 2)
+        self.assertEqual(book('2035-04-01 21:30', 60), 2)   # overlaps the end
+        self.assertEqual(book('2035-04-01 19:00', 61), 2)   # overlaps the start
+        self.assertEqual(book('2035-04-01 22:00', 60), 3)   # starts as it ends
+        self.assertEqual(book('2035-04-01 18:00', 60), 4)
+        # outside ShowForm's 1 to 1440 minutes
+        self.assertEqual(book('2035-04-03 20:00', 0), 4)
+        self.assertEqual(book('2035-04-03 20:00', 100000), 4)
+
+        res = self.client().get('/venues/{}/free-slots?start=2035-04-01T12:00'
+                                '&days=1&duration=90'.format(venue_id))
+        self.assertEqual(res.json['slots'], [
+            {'start': '2035-04-01T12:00:00', 'end': '2035-04-01T18:00:00'},
+            {'start': '2035-04-01T23:00:00', 'end': '2035-04-02T12:00:00'}])
+        self.assertEqual(self.client().get(
+            '/venues/{}/free-slots?days=0'.format(venue_id)).status_code, 400)
+
+    def test_show_series_inserted_in_one_statement(self):
+        venue_id, artist_ids = self.add_venue_with_shows(1)
+
+        def series(start, **repeat):
+            data = {'venue_id': venue_id, 'artist_id': artist_ids[0],
+                    'start_time': start, 'repeat': 'weekly'}
+            data.update(repeat)
+            with count_queries() as stats:
+                self.client().post('/shows/create', data=data)
+            with app.app_context():
+                return (Show.query.filter_by(venue_id=venue_id).count(),
+                        sum(1 for shape in stats.shapes if shape.startswith('INSERT')))
+
+        self.assertEqual(series('2035-04-01 20:00', repeat_count=4), (5, 1))
+        # the last date is inclusive; whichever of count and date ends first wins
+        self.assertEqual(series('2035-04-02 20:00', repeat_until='2035-04-16',
+                                repeat_count=10), (8, 1))
+        # one occurrence clashing with the first series rejects the whole series
+        self.assertEqual(series('2035-03-18 21:00', repeat_count=3), (8, 0))
+        self.assertEqual(series('2035-03-18 18:00', repeat_count=3), (11, 1))
+        with app.app_context():
+            # the seeded show is in the past
+            self.assertEqual(db.session.get(Venue, venue_id).upcoming_shows_count, 10)
+
+    def test_show_events_pushed_to_subscribers(self):
+        venue_id, artist_ids = self.add_venue_with_shows(1)
+        res = self.client().get('/shows/events')
+        self.assertEqual(res.mimetype, 'text/event-stream')
+        self.assertEqual(len(fyyur.show_feed), 1)
+
+        self.client().post('/shows/create', data={
+            'artist_id': artist_ids[0], 'venue_id': venue_id,
+            'start_time': '2035-04-01 20:00:00'})
+        chunks = iter(res.response)
+        self.assertEqual(next(chunks), b': subscribed\n\n')
+        chunk = next(chunks).decode('utf-8')
+        res.close()
+
+        self.assertTrue(chunk.startswith('id: '))
+        self.assertIn('event: show', chunk)
+        event = json.loads(chunk.split('data: ', 1)[1])
+        self.assertEqual((event['venue_name'], event['artist_name'], event['start_time']),
+                         ('The Musical Hop', 'Artist 0', '2035-04-01T20:00:00'))
+        self.assertEqual(len(fyyur.show_feed), 0)
+
+    def test_show_events_resumed_after_a_gap_without_subscribers(self):
+        venue_id, artist_ids = self.add_venue_with_shows(1)
+        last_seen = fyyur.show_feed.last_id
+        self.assertEqual(len(fyyur.show_feed), 0)
+
+        self.client().post('/shows/create', data={
+            'artist_id': artist_ids[0], 'venue_id': venue_id,
+            'start_time': '2035-04-01 20:00:00'})
+        res = self.client().get('/shows/events', headers={'Last-Event-ID': str(last_seen)})
+        chunks = iter(res.response)
+        next(chunks)  # the subscribed comment
+        chunk = next(chunks).decode('utf-8')
+        res.close()
+
+        self.assertTrue(chunk.startswith('id: {}'.format(last_seen + 1)))
+        self.assertIn('"start_time":"2035-04-01T20:00:00"', chunk)
+
+    def test_hub_drops_oldest_events_of_slow_subscribers(self):
+        hub = pubsub.Hub(queue_size=2, history_size=3)
+        slow = hub.subscribe()
+        for n in range(4):
+            hub.publish(n)
+
+        self.assertEqual(slow.get(timeout=0), [(3, 2), (4, 3)])
+        self.assertEqual(slow.dropped, 2)
+        self.assertEqual(slow.get(timeout=0), [])
+        # a reconnecting client gets the retained events after its last id
+        with hub.subscribe(last_event_id=2) as resumed:
+            self.assertEqual(resumed.get(timeout=0), [(3, 2), (4, 3)])
+        self.assertEqual(len(hub), 1)
+
+    def test_templates_precompiled_into_bytecode_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cold_app = create_app({'TEMPLATE_BYTECODE_CACHE_DIR': cache_dir})
+        names = template_cache.template_names(cold_app.jinja_env)
+
+        self.assertIn('pages/show_venue.html', names)
+        self.assertEqual(len(os.listdir(cache_dir)), len(names))
+
+        # a restarted worker loads the compiled code instead of compiling
+        warm_app = create_app({'TEMPLATE_BYTECODE_CACHE_DIR': cache_dir,
+                               'TEMPLATE_PRECOMPILE': False})
+        env = warm_app.jinja_env
+        compiled = []
+        compile_templates = env.compile
+        env.compile = lambda *args, **kwargs: compiled.append(args) or \
+            compile_templates(*args, **kwargs)
+        template_cache.precompile(warm_app)
+        self.assertEqual(compiled, [])
+
+    def test_unit_of_work_retries_lock_errors_and_rolls_back(self):
+        delays = []
+        unit = transactions.UnitOfWork(db.session, sleep=delays.append,
+                                       random=lambda: 1.0)
+        attempts = []
+
+        def add_venue():
+            db.session.add(Venue(name='Venue {}'.format(len(attempts))))
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise OperationalError('INSERT', {}, sqlite3.OperationalError('database is locked'))
+
+        with app.app_context():
+            unit.run('add_venue', add_venue)
+            self.assertEqual([v.name for v in Venue.query], ['Venue 2'])
+            with self.assertRaises(ZeroDivisionError):
+                unit.run('add_venue', lambda: db.session.add(Venue(name='Lost')) or 1 / 0)
+            # the failed unit was rolled back and the session is still usable
+            self.assertEqual(Venue.query.count(), 1)
+
+        self.assertEqual(delays, [0.02, 0.04])
+        self.assertEqual(unit.stats.snapshot(), {'add_venue': {
+            'runs': 2, 'retries': 2, 'failed': 1, 'gave_up': 0}})
+
+        self.client().post('/venues/create', data={
+            'name': 'The Dueling Pianos Bar', 'city': 'New York', 'state': 'NY',
+            'address': '335 Delancey Street', 'phone': '', 'genres': ['Jazz', 'Rock'],
+            'facebook_link': '', 'image_link': ''})
+        res = self.client().get('/api/stats/transactions')
+        self.assertEqual(res.json['create_venue'], {
+            'runs': 1, 'retries': 0, 'failed': 0, 'gave_up': 0})
+
+    def test_logs_queued_as_sampled_json_lines(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        log_path = os.path.join(log_dir, 'error.log')
+        logged_app = create_app({'DEBUG': False, 'LOG_FILE': log_path,
+                                 'LOG_SAMPLE_RATES': {'INFO': 0.5}})
+        queue_handler = logged_app.logger.handlers[-1]
+        self.addCleanup(logged_app.logger.addHandler, default_handler)
+        self.addCleanup(logged_app.logger.removeHandler, queue_handler)
+        # nothing is written on the request thread
+        self.assertEqual(logged_app.logger.handlers, [queue_handler])
+
+        for _ in range(4):
+            logged_app.test_client().get('/?page=1')
+        logged_app.test_client().post('/shows/create', data={'venue_id': 'nonsense'})
+        logged_app.extensions['log_queue'].stop()
+
+        with open(log_path) as f:
+            records = [json.loads(line) for line in f]
+        # every other request line is kept; errors are never sampled
+        self.assertEqual([(r['level'], r['message']) for r in records], [
+            ('INFO', 'GET / 200'), ('INFO', 'GET / 200'),
+            ('ERROR', 'Show could not be listed')])
+        self.assertEqual(records[0]['url'], '/?page=1')
+        self.assertIn('ValueError', records[2]['exception'])
+        self.assertEqual(queue_handler.dropped, 0)
+
+    def test_reads_go_to_the_replica_except_after_a_write(self):
+        _, replica_path = tempfile.mkstemp(suffix='.db')
+        self.addCleanup(os.remove, replica_path)
+        replica_app = create_app({
+            'SQLALCHEMY_BINDS': {'replica_0': 'sqlite:///' + replica_path},
+            'SECRET_KEY': 'shared by every worker', 'PAGE_CACHE_ENABLED': False})
+        with replica_app.app_context():
+            db.metadata.create_all(db.engines['replica_0'])
+            db.session.add(Venue(name='Primary Hop', city='SF', state='CA'))
+            db.session.commit()
+            with db.engines['replica_0'].begin() as connection:
+                connection.execute(Venue.__table__.insert(),
+                                   [{'name': 'Replica Hop', 'city': 'SF', 'state': 'CA'}])
+
+        def venue_names(client):
+            res = client.get('/api/venues?fields=name')
+            return [v['name'] for v in json.loads(res.data)]
+
+        browser = replica_app.test_client()
+        self.assertEqual(venue_names(browser), ['Replica Hop'])
+
+        res = browser.post('/venues/create', data={
+            'name': 'New Hop', 'city': 'SF', 'state': 'CA', 'address': '1 Main St',
+            'phone': '555-000-0000', 'genres': ['Jazz'], 'facebook_link': '',
+            'image_link': ''})
+        self.assertEqual(res.status_code, 200)
+
+        # the writer reads its own write; everyone else still gets the replica
+        self.assertEqual(venue_names(browser), ['Primary Hop', 'New Hop'])
+        self.assertEqual(venue_names(replica_app.test_client()), ['Replica Hop'])
+
+    def test_writer_never_served_a_page_cached_from_a_replica(self):
+        _, replica_path = tempfile.mkstemp(suffix='.db')
+        self.addCleanup(os.remove, replica_path)
+        binds = {'replica_0': 'sqlite:///' + replica_path}
+        with self.assertRaises(RuntimeError):
+            create_app({'SQLALCHEMY_BINDS': binds, 'SECRET_KEY': None})
+        replica_app = create_app({'SQLALCHEMY_BINDS': binds, 'SECRET_KEY': 'shared'})
+        with replica_app.app_context():
+            db.metadata.create_all(db.engines['replica_0'])
+
+        writer = replica_app.test_client()
+        writer.post('/artists/create', data={
+            'name': 'Matt Quevedo', 'city': 'New York', 'state': 'NY',
+            'phone': '', 'genres': 'Jazz', 'facebook_link': '', 'image_link': ''})
+        writer.get('/')  # consume the flashed message
+        # another visitor refills the cache from the replica, which lags
+        self.assertNotIn('Matt Quevedo',
+                         replica_app.test_client().get('/artists').get_data(as_text=True))
+
+        self.assertIn('Matt Quevedo', writer.get('/artists').get_data(as_text=True))
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
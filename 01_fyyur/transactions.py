@@ -0,0 +1,118 @@
+"""Unit of work for the write handlers: retried transactions and savepoints.
+
+UnitOfWork.run() calls a function that makes the changes of one request and
+commits them. Whatever fails, the session is rolled back before the error is
+raised, so the scoped session a worker reuses is never left in a failed
+transaction. Serialization failures and deadlocks are not the request's
+fault: the unit is rolled back and run again, after a random delay of up to
+base_delay * 2**retry seconds (full jitter, capped at max_delay) so writers
+that collided do not collide again in step. The function is therefore called
+once per attempt and must not have side effects outside the session.
+
+savepoint() runs part of a unit in a SAVEPOINT, so that part can fail and be
+rolled back on its own. RetryStats counts runs, retries and failures per unit
+name, which shows where writers contend.
+"""
+import contextlib
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+# serialization_failure and deadlock_detected: running the transaction again
+# resolves them
+RETRYABLE_SQLSTATES = frozenset(['40001', '40P01'])
+
+
+def sqlstate(error):
+    """The SQLSTATE of a DBAPI error, or of the one a SQLAlchemy error wraps."""
+    orig = getattr(error, 'orig', error)
+    return getattr(orig, 'pgcode', None) or getattr(orig, 'sqlstate', None)
+
+
+def is_retryable(error):
+    if sqlstate(error) in RETRYABLE_SQLSTATES:
+        return True
+    # SQLite reports a writer holding the database lock as "database is locked"
+    orig = getattr(error, 'orig', None)
+    return isinstance(orig, sqlite3.OperationalError) and 'locked' in str(orig)
+
+
+class RetryStats(object):
+    """Counts per unit name of runs, retries, and failures, of which gave_up
+    are the ones still retryable after the last attempt."""
+
+    FIELDS = ('runs', 'retries', 'failed', 'gave_up')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def add(self, name, **counts):
+        with self._lock:
+            entry = self._counts.get(name)
+            if entry is None:
+                entry = self._counts[name] = dict.fromkeys(self.FIELDS, 0)
+            for field, n in counts.items():
+                entry[field] += n
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._counts.items()}
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+class UnitOfWork(object):
+
+    def __init__(self, session, max_attempts=3, base_delay=0.02, max_delay=0.5,
+                 logger=None, sleep=time.sleep, random=random.random):
+        self.session = session
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.logger = logger or logging.getLogger(__name__)
+        self.stats = RetryStats()
+        self._sleep = sleep
+        self._random = random
+
+    def backoff(self, retry):
+        """Seconds to wait before the retry-th retry (1 for the first)."""
+        return self._random() * min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+
+    def run(self, name, work, *args, **kwargs):
+        """Returns work(*args, **kwargs) once the session has committed the
+        changes it made, retrying serialization failures and deadlocks."""
+        self.stats.add(name, runs=1)
+        attempt = 1
+        while True:
+            try:
+                result = work(*args, **kwargs)
+                self.session.commit()
+                return result
+            except BaseException as error:
+                self.session.rollback()
+                retryable = isinstance(error, Exception) and is_retryable(error)
+                if not retryable or attempt >= self.max_attempts:
+                    self.stats.add(name, failed=1, gave_up=int(retryable))
+                    raise
+                delay = self.backoff(attempt)
+                self.stats.add(name, retries=1)
+                self.logger.warning(
+                    '%s: retrying after %s (attempt %d of %d)', name,
+                    sqlstate(error) or type(error).__name__, attempt + 1,
+                    self.max_attempts, extra={
+                        'unit': name, 'attempt': attempt + 1,
+                        'sqlstate': sqlstate(error),
+                        'delay_ms': round(delay * 1000, 2)})
+                self._sleep(delay)
+                attempt += 1
+
+    @contextlib.contextmanager
+    def savepoint(self):
+        """Runs the block in a SAVEPOINT, rolled back alone if it raises."""
+        with self.session.begin_nested():
+            yield